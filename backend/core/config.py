@@ -95,6 +95,61 @@ SYNC_REPO_URL = get_setting(
 SYNC_LOCAL_DIR = DATA_DIR / "hub_cache"
 SYNC_LOCAL_DIR.mkdir(parents=True, exist_ok=True)
 
+# Hub code cache (read-through cache of get_code payloads)
+HUB_CODE_CACHE_DIR = DATA_DIR / "hub_code_cache"
+HUB_CODE_CACHE_TTL = int(get_setting("FS_HUB_CODE_CACHE_TTL", "3600"))
+HUB_CODE_CACHE_MAX_BYTES = int(
+    get_setting("FS_HUB_CODE_CACHE_MAX_BYTES", str(50 * 1024 * 1024))
+)
+
+# Quality report cache (QualityGate reports keyed by code, deps, tool versions, policy)
+QUALITY_CACHE_DIR = DATA_DIR / "quality_cache"
+QUALITY_CACHE_MAX_BYTES = int(
+    get_setting("FS_QUALITY_CACHE_MAX_BYTES", str(20 * 1024 * 1024))
+)
+# Seconds each quality gate stage (ruff lint/format, bandit, safety) may take
+QUALITY_STAGE_TIMEOUT = float(get_setting("FS_QUALITY_STAGE_TIMEOUT", "30"))
+
+# Offline vulnerability snapshot used for dependency audits (Safety DB format),
+# re-downloaded once it is older than VULN_DB_REFRESH_INTERVAL seconds (0 disables)
+VULN_DB_PATH = DATA_DIR / "vuln_db" / "insecure_full.json"
+VULN_DB_URL = get_setting(
+    "FS_VULN_DB_URL",
+    "https://raw.githubusercontent.com/pyupio/safety-db/master/data/insecure_full.json",
+)
+VULN_DB_REFRESH_INTERVAL = int(get_setting("FS_VULN_DB_REFRESH_INTERVAL", "86400"))
+
+# Store maintenance: seconds between embedding compaction + CHECKPOINT runs (0 disables)
+COMPACTION_INTERVAL = int(get_setting("FS_COMPACTION_INTERVAL", "21600"))
+
+# Background worker lanes -> threads per lane (io: embedding/network, cpu: lint and
+# AST analysis, test: test execution, db: store maintenance)
+WORKER_LANES = {
+    "io": int(get_setting("FS_WORKER_IO_CONCURRENCY", "4")),
+    "cpu": int(get_setting("FS_WORKER_CPU_CONCURRENCY", str(os.cpu_count() or 2))),
+    "test": int(get_setting("FS_WORKER_TEST_CONCURRENCY", "2")),
+    "db": int(get_setting("FS_WORKER_DB_CONCURRENCY", "1")),
+}
+# Threads per lane that may run bulk (recovery/batch/maintenance) tasks at once
+WORKER_BULK_CONCURRENCY = int(get_setting("FS_WORKER_BULK_CONCURRENCY", "1"))
+# Seconds between background worker stats log lines (0 disables)
+WORKER_STATS_LOG_INTERVAL = int(get_setting("FS_WORKER_STATS_LOG_INTERVAL", "300"))
+# Seconds the server waits for background tasks and buffered writes on shutdown
+SHUTDOWN_TIMEOUT = float(get_setting("FS_SHUTDOWN_TIMEOUT", "20"))
+
+# Durable task queue: start attempts before a persisted task is given up on, and
+# rows re-queued per batch when replaying tasks left over from a previous run
+TASK_MAX_ATTEMPTS = int(get_setting("FS_TASK_MAX_ATTEMPTS", "3"))
+TASK_REPLAY_BATCH = int(get_setting("FS_TASK_REPLAY_BATCH", "200"))
+
+# Threads available to async MCP tool handlers for blocking DuckDB/embedding work
+DB_EXECUTOR_WORKERS = int(get_setting("FS_DB_EXECUTOR_WORKERS", "4"))
+
+# smart_search_and_get: seconds before settling for the best available candidate,
+# and how many top candidates have their code prefetched while reranking
+SMART_GET_BUDGET = float(get_setting("FS_SMART_GET_BUDGET", "8.0"))
+SMART_GET_PREFETCH = int(get_setting("FS_SMART_GET_PREFETCH", "3"))
+
 # Execution Runtime Config
 # Options: "auto" (local venv), "docker" (containerized), "cloud" (managed)
 EXECUTION_MODE = get_setting("FS_EXECUTION_MODE", "auto")
@@ -1,11 +1,17 @@
+import hashlib
 import json
 import logging
 import os
+import queue
 import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Optional
 
 import duckdb
 from core import config
 from core.embedding import embedding_service
+from core.progress import OperationCancelled
 
 try:
     import msvcrt
@@ -21,6 +27,55 @@ logger = logging.getLogger(__name__)
 LOCK_PATH = config.DATA_DIR / "functions.duckdb.lock"
 _inner_lock = threading.Lock()
 
+TIMESTAMP_COLUMNS = ("created_at", "updated_at", "last_called_at")
+
+# One vector per (function, model): re-saves overwrite in place instead of appending.
+EMBEDDINGS_SCHEMA = """
+    function_name VARCHAR,
+    model_name VARCHAR,
+    vector FLOAT[],
+    dimension INTEGER,
+    encoded_at TIMESTAMP,
+    PRIMARY KEY (function_name, model_name)
+"""
+
+
+# Code bodies live once in `code_blobs`; `functions.code` is only kept for rows
+# written before the migration. Readers go through these fragments.
+CODE_SQL = "COALESCE(b.code, f.code)"
+CODE_JOIN_SQL = "LEFT JOIN code_blobs b ON f.code_hash = b.code_hash"
+
+
+def normalize_code(code: str) -> str:
+    """
+    Canonical form used for content addressing: line endings and leading/trailing
+    blank lines only. Whitespace inside lines is kept, since it can be significant
+    (e.g. in triple-quoted strings).
+    """
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return "\n".join(lines) + "\n"
+
+
+def compute_code_hash(code: str) -> str:
+    return hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest()
+
+
+def store_code_blob(conn, code: str) -> str:
+    """
+    Stores a code body once and returns its content hash. The first saved
+    variant is kept verbatim; later line-ending-only variants share it.
+    """
+    code_hash = compute_code_hash(code)
+    conn.execute(
+        "INSERT OR IGNORE INTO code_blobs (code_hash, code, created_at) VALUES (?, ?, ?)",
+        (code_hash, code, datetime.now()),
+    )
+    return code_hash
+
 
 class DBWriteLock:
     def __init__(self, timeout: float = 10.0):
@@ -78,18 +133,131 @@ def get_db_connection(read_only=False):
         except (duckdb.IOException, duckdb.Error) as e:
             last_err = e
             msg = str(e).lower()
-            if any(x in msg for x in ["access", "in use", "locked", "open"]):
+            if any(
+                x in msg for x in ["access", "in use", "locked", "open", "attached"]
+            ):
                 time.sleep(retry_delay * (1.5**attempt))
                 continue
             raise
     raise last_err
 
 
+class DBWriter:
+    """
+    Single writer thread for the local store. Mutations are queued as callables
+    taking a connection; everything queued by the time the writer wakes up is
+    applied in one transaction (one DBWriteLock handoff and one commit per tick).
+    Operations must not commit themselves. Bulk operations go through the writer
+    too; while anything else holds the lock the writer waits, it never drops writes.
+    """
+
+    def __init__(self, max_batch: int = 256):
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, op: Callable[[Any], Any]) -> Future:
+        """Queues a write; the future resolves to the op's return value once committed."""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((op, future))
+        return future
+
+    def execute(self, op: Callable[[Any], Any], timeout: Optional[float] = 30.0) -> Any:
+        """
+        Queues a write and waits for it to be committed (timeout None: no limit).
+        A timeout does not cancel the write; it may still commit afterwards.
+        """
+        return self.submit(op).result(timeout=timeout)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Waits until every write queued so far has been committed (or failed)."""
+        if self._thread is None:
+            return True
+        try:
+            self.execute(lambda conn: None, timeout=timeout)
+            return True
+        except Exception as e:
+            logger.error(f"DBWriter: Flush did not complete: {e}")
+            return False
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run_loop, daemon=True)
+                self._thread.start()
+
+    def _run_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(batch)
+            except Exception as e:
+                logger.error(f"DBWriter: Batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    @staticmethod
+    def _acquire_lock():
+        """Takes DBWriteLock, retrying for as long as another holder keeps it."""
+        while True:
+            lock = DBWriteLock()
+            try:
+                lock.__enter__()
+                return lock
+            except TimeoutError:
+                logger.warning("DBWriter: Write lock busy, still waiting.")
+
+    def _apply(self, batch):
+        lock = self._acquire_lock()
+        try:
+            conn = get_db_connection()
+            try:
+                try:
+                    conn.execute("BEGIN TRANSACTION")
+                    results = [op(conn) for op, _ in batch]
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    if len(batch) == 1:
+                        raise
+                    # Replay one by one so a single bad write does not fail its neighbours.
+                    for item in batch:
+                        self._apply_single(conn, *item)
+                    return
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            finally:
+                conn.close()
+        finally:
+            lock.__exit__(None, None, None)
+
+    @staticmethod
+    def _apply_single(conn, op, future):
+        try:
+            conn.execute("BEGIN TRANSACTION")
+            result = op(conn)
+            conn.execute("COMMIT")
+            future.set_result(result)
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            future.set_exception(e)
+
+
+db_writer = DBWriter()
+
+
 def init_db():
     with DBWriteLock():
         conn = get_db_connection()
         try:
-            conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_emb_id START 1")
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS functions (
                     name VARCHAR PRIMARY KEY,
@@ -100,19 +268,37 @@ def init_db():
                     status VARCHAR DEFAULT 'active',
                     test_cases VARCHAR,
                     call_count INTEGER DEFAULT 0,
-                    last_called_at VARCHAR,
-                    created_at VARCHAR,
-                    updated_at VARCHAR
+                    last_called_at TIMESTAMP,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP,
+                    code_hash VARCHAR,
+                    content_fingerprint VARCHAR
                 )
             """)
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS embeddings (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_emb_id'),
-                    function_name VARCHAR,
-                    vector FLOAT[],
-                    model_name VARCHAR,
-                    dimension INTEGER,
-                    encoded_at VARCHAR
+                CREATE TABLE IF NOT EXISTS code_blobs (
+                    code_hash VARCHAR PRIMARY KEY,
+                    code VARCHAR,
+                    quality_report VARCHAR,
+                    verified_status VARCHAR,
+                    verified_tests_hash VARCHAR,
+                    created_at TIMESTAMP
+                )
+            """)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS embeddings ({EMBEDDINGS_SCHEMA})")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_queue (
+                    id VARCHAR PRIMARY KEY,
+                    task VARCHAR,
+                    payload VARCHAR,
+                    lane VARCHAR,
+                    coalesce_key VARCHAR,
+                    order_key VARCHAR,
+                    state VARCHAR DEFAULT 'queued',
+                    attempts INTEGER DEFAULT 0,
+                    last_error VARCHAR,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP
                 )
             """)
             conn.execute("""
@@ -127,6 +313,23 @@ def init_db():
             cols = [r[0] for r in columns_res]
             if "function_id" in cols and "function_name" not in cols:
                 conn.execute("ALTER TABLE embeddings ADD COLUMN function_name VARCHAR")
+            if "id" in cols:
+                _migrate_embeddings_key_internal(conn)
+
+            _migrate_timestamps_internal(conn)
+            conn.execute(
+                "ALTER TABLE functions ADD COLUMN IF NOT EXISTS code_hash VARCHAR"
+            )
+            conn.execute(
+                "ALTER TABLE functions ADD COLUMN IF NOT EXISTS content_fingerprint VARCHAR"
+            )
+            migrate_code_blobs_internal(conn)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_functions_last_called_at ON functions (last_called_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_functions_updated_at ON functions (updated_at)"
+            )
 
             _check_model_version_internal(conn)
             recover_embeddings_internal(conn)
@@ -134,36 +337,169 @@ def init_db():
             conn.close()
 
 
-def recover_embeddings_internal(conn):
+def _legacy_timestamp_sql(col: str) -> str:
+    """SQL expression parsing a legacy VARCHAR timestamp, NULL if unparsable."""
+    # Old rows mix ISO strings ("T" separator) with CURRENT_TIMESTAMP output
+    # ("+00" suffix); normalise both before casting.
+    return f"""TRY_CAST(regexp_replace(
+        replace({col}, 'T', ' '),
+        '(\\d{{2}}:\\d{{2}}:\\d{{2}}(\\.\\d+)?)[+-]\\d{{2}}(:?\\d{{2}})?$',
+        '\\1'
+    ) AS TIMESTAMP)"""
+
+
+def _migrate_timestamps_internal(conn):
+    """Converts legacy VARCHAR timestamp columns of `functions` to native TIMESTAMP."""
+    rows = conn.execute(
+        """
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_name = 'functions'
+    """
+    ).fetchall()
+    types = {r[0]: r[1] for r in rows}
+    for col in TIMESTAMP_COLUMNS:
+        if types.get(col) != "VARCHAR":
+            continue
+        conn.execute(f"""
+            ALTER TABLE functions ALTER COLUMN {col} SET DATA TYPE TIMESTAMP
+            USING {_legacy_timestamp_sql(col)}
+        """)
+        logger.info(f"Migration: functions.{col} converted to TIMESTAMP.")
+    conn.commit()
+
+
+def _migrate_embeddings_key_internal(conn):
+    """
+    Rebuilds the legacy surrogate-key embeddings table on (function_name, model_name),
+    keeping only the most recent vector of each pair.
+    """
+    types = dict(
+        conn.execute(
+            """
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_name = 'embeddings'
+        """
+        ).fetchall()
+    )
+    encoded_at = "encoded_at"
+    if types.get("encoded_at") == "VARCHAR":
+        encoded_at = _legacy_timestamp_sql("encoded_at")
+
+    before = conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute(f"CREATE TABLE embeddings_v2 ({EMBEDDINGS_SCHEMA})")
+        conn.execute(f"""
+            INSERT INTO embeddings_v2 (function_name, model_name, vector, dimension, encoded_at)
+            SELECT function_name, COALESCE(model_name, 'unknown'), vector, dimension, {encoded_at}
+            FROM embeddings
+            WHERE function_name IS NOT NULL
+            QUALIFY row_number() OVER (
+                PARTITION BY function_name, COALESCE(model_name, 'unknown') ORDER BY id DESC
+            ) = 1
+        """)
+        conn.execute("DROP TABLE embeddings")
+        conn.execute("ALTER TABLE embeddings_v2 RENAME TO embeddings")
+        conn.execute("DROP SEQUENCE IF EXISTS seq_emb_id")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    after = conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+    logger.info(
+        f"Migration: embeddings keyed on (function_name, model_name), removed {before - after} duplicates."
+    )
+    conn.execute("CHECKPOINT")
+
+
+def migrate_code_blobs_internal(conn):
+    """
+    Moves inline `functions.code` bodies into the content-addressed `code_blobs` table.
+    Does not commit, so callers can run it inside their own transaction.
+    """
+    rows = conn.execute(
+        "SELECT name, code FROM functions WHERE code IS NOT NULL"
+    ).fetchall()
+    if not rows:
+        return
+    conn.execute(
+        "CREATE TEMP TABLE _code_migration (name VARCHAR, code_hash VARCHAR, code VARCHAR)"
+    )
     try:
-        current_model = embedding_service.model_name
-        expected_dim = embedding_service.get_model_info()["dimension"]
-        rows = conn.execute(
+        conn.executemany(
+            "INSERT INTO _code_migration VALUES (?, ?, ?)",
+            [(name, compute_code_hash(code), code) for name, code in rows],
+        )
+        conn.execute(
             """
-            SELECT f.name, f.description, f.tags, f.metadata, f.code
-            FROM functions f
-            LEFT JOIN embeddings e ON f.name = e.function_name
-            WHERE e.model_name != ? OR e.dimension != ? OR e.function_name IS NULL
+            INSERT OR IGNORE INTO code_blobs (code_hash, code, created_at)
+            SELECT code_hash, any_value(code), ? FROM _code_migration GROUP BY code_hash
         """,
-            (current_model, expected_dim),
-        ).fetchall()
-        for row in rows:
-            name, desc, tags_j, meta_j, code = row
-            tags = json.loads(tags_j) if tags_j else []
-            meta = json.loads(meta_j) if meta_j else {}
-            deps = meta.get("dependencies", [])
-            text = f"Name: {name}\nDesc: {desc}\nTags: {tags}\nDeps: {deps}\nCode:\n{code[:500]}"
-            emb = embedding_service.get_embedding(text)
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO embeddings (function_name, vector, model_name, dimension, encoded_at)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """,
-                (name, emb, current_model, len(emb)),
-            )
+            (datetime.now(),),
+        )
+        conn.execute("""
+            UPDATE functions SET code_hash = m.code_hash, code = NULL
+            FROM _code_migration m WHERE functions.name = m.name
+        """)
+    finally:
+        conn.execute("DROP TABLE _code_migration")
+    logger.info(f"Migration: moved {len(rows)} code bodies into code_blobs.")
+
+
+# Re-embedded vectors written per db_writer transaction by recover_embeddings
+RECOVERY_CHUNK_SIZE = 32
+
+EMBEDDING_UPSERT_SQL = """
+    INSERT OR REPLACE INTO embeddings (function_name, vector, model_name, dimension, encoded_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def _rows_missing_embeddings(conn) -> list:
+    """Functions with no vector (or a wrong-sized one) for the current model."""
+    return conn.execute(
+        f"""
+        SELECT f.name, f.description, f.tags, f.metadata, {CODE_SQL}
+        FROM functions f
+        {CODE_JOIN_SQL}
+        LEFT JOIN embeddings e ON f.name = e.function_name AND e.model_name = ?
+        WHERE e.function_name IS NULL OR e.dimension != ?
+    """,
+        (
+            embedding_service.model_name,
+            embedding_service.get_model_info()["dimension"],
+        ),
+    ).fetchall()
+
+
+def _embedding_row(row) -> tuple:
+    """Embeds one _rows_missing_embeddings row; returns the embeddings upsert parameters."""
+    name, desc, tags_j, meta_j, code = row
+    tags = json.loads(tags_j) if tags_j else []
+    meta = json.loads(meta_j) if meta_j else {}
+    deps = meta.get("dependencies", [])
+    text = (
+        f"Name: {name}\nDesc: {desc}\nTags: {tags}\nDeps: {deps}\nCode:\n{code[:500]}"
+    )
+    emb = embedding_service.get_embedding(text)
+    return (name, emb, embedding_service.model_name, len(emb), datetime.now())
+
+
+def recover_embeddings_internal(conn) -> int:
+    """
+    Embeds functions that have no vector for the current model on a connection
+    the caller already holds the write lock for (startup). Returns the number of
+    functions re-embedded.
+    """
+    done = 0
+    try:
+        for row in _rows_missing_embeddings(conn):
+            conn.execute(EMBEDDING_UPSERT_SQL, _embedding_row(row))
+            done += 1
         conn.commit()
     except Exception as e:
         logger.error(f"Recovery failed: {e}")
+    return done
 
 
 def _check_model_version_internal(conn):
@@ -183,10 +519,81 @@ def _check_model_version_internal(conn):
         logger.error(f"Model version check failed: {e}")
 
 
-def recover_embeddings():
+def recover_embeddings(progress=None) -> str:
+    """
+    Embeds functions that have no vector for the current model. Embeddings are
+    computed without holding DBWriteLock and written through db_writer in chunks
+    of RECOVERY_CHUNK_SIZE, so saves and other writes keep going during a long
+    run and a cancelled run keeps the chunks already written.
+    """
+    conn = get_db_connection()
+    try:
+        rows = _rows_missing_embeddings(conn)
+    finally:
+        conn.close()
+
+    done = 0
+    pending = []
+
+    def _write_pending():
+        nonlocal done
+        if not pending:
+            return
+        chunk = list(pending)
+        pending.clear()
+        db_writer.execute(lambda c: c.executemany(EMBEDDING_UPSERT_SQL, chunk))
+        done += len(chunk)
+
+    try:
+        for i, row in enumerate(rows):
+            if progress:
+                progress.check_cancelled()
+                progress.report("recover", i, len(rows))
+            pending.append(_embedding_row(row))
+            if len(pending) >= RECOVERY_CHUNK_SIZE:
+                _write_pending()
+        _write_pending()
+    except OperationCancelled:
+        _write_pending()
+        logger.warning(f"Recovery cancelled after {done} functions.")
+        raise
+    except Exception as e:
+        logger.error(f"Recovery failed: {e}")
+    return f"SUCCESS: Re-embedded {done} functions."
+
+
+def checkpoint_store() -> None:
+    """Folds the WAL into the database file so the next start does not replay it."""
     with DBWriteLock():
         conn = get_db_connection()
         try:
-            recover_embeddings_internal(conn)
+            conn.execute("CHECKPOINT")
         finally:
             conn.close()
+
+
+def compact_store() -> str:
+    """
+    Drops orphaned code blobs and orphaned or stale-model embeddings, then checkpoints the database
+    so the freed blocks are reclaimed from the WAL.
+    """
+
+    def _compact(conn):
+        orphans = conn.execute(
+            "DELETE FROM embeddings WHERE function_name NOT IN (SELECT name FROM functions)"
+        ).fetchone()[0]
+        stale = conn.execute(
+            "DELETE FROM embeddings WHERE model_name != ?",
+            (embedding_service.model_name,),
+        ).fetchone()[0]
+        conn.execute(
+            "DELETE FROM code_blobs WHERE code_hash NOT IN (SELECT code_hash FROM functions WHERE code_hash IS NOT NULL)"
+        )
+        return orphans, stale
+
+    orphans, stale = db_writer.execute(_compact, timeout=None)
+    checkpoint_store()
+    logger.info(
+        f"Compaction: removed {orphans} orphaned and {stale} stale-model embeddings."
+    )
+    return f"SUCCESS: Compacted store ({orphans} orphaned, {stale} stale embeddings removed)."
@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DiskLRU:
+    """
+    Size-bounded directory of JSON files. Writes go through a unique temp file
+    and an atomic rename, reads refresh the file mtime, and eviction drops the
+    least recently used files. The directory is only rescanned once the bytes
+    written since the last scan may have pushed it over `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, label: str = "DiskLRU"):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.label = label
+        self._approx_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def read(self, path: Path) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def write(self, path: Path, data: Dict) -> bool:
+        tmp = None
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.cache_dir, suffix=".tmp", delete=False
+            ) as f:
+                tmp = f.name
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            size = path.stat().st_size
+        except OSError as e:
+            logger.warning(f"{self.label}: Failed to write {path.name}: {e}")
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += size
+            if self._approx_bytes is None or self._approx_bytes > self.max_bytes:
+                self._approx_bytes = self._evict()
+        return True
+
+    def _evict(self) -> int:
+        """Drops least recently used files until under max_bytes; returns the total kept."""
+        files = []
+        total = 0
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in sorted(files):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            logger.info(f"{self.label}: Evicted {path.name}")
+            if total <= self.max_bytes:
+                break
+        return total
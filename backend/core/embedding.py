@@ -20,6 +20,9 @@ class GeminiEmbeddingService:
     Cloud Embedding Service using Google Gemini (1536D).
     """
 
+    # Max texts per embed_content call
+    BATCH_LIMIT = 100
+
     def __init__(self):
         self.model_name = (
             "models/text-embedding-004"  # Latest recommended for embeddings
@@ -65,6 +68,33 @@ class GeminiEmbeddingService:
             logger.error(f"GeminiEmbeddingService: Inference Failed - {e}")
             return [0.0] * 1536
 
+    def get_embeddings(
+        self, texts: List[str], is_query: bool = False
+    ) -> List[List[float]]:
+        """Embeds many texts with one request per BATCH_LIMIT texts."""
+        self._ensure_initialized()
+        if not self._client:
+            return [[0.0] * 1536 for _ in texts]
+
+        vectors = []
+        for start in range(0, len(texts), self.BATCH_LIMIT):
+            chunk = texts[start : start + self.BATCH_LIMIT]
+            try:
+                result = self._client.models.embed_content(
+                    model=self.model_name,
+                    contents=chunk,
+                    config={
+                        "task_type": "RETRIEVAL_QUERY"
+                        if is_query
+                        else "RETRIEVAL_DOCUMENT"
+                    },
+                )
+                vectors.extend(list(e.values) for e in result.embeddings)
+            except Exception as e:
+                logger.error(f"GeminiEmbeddingService: Batch Inference Failed - {e}")
+                vectors.extend([0.0] * 1536 for _ in chunk)
+        return vectors
+
     def get_model_info(self) -> dict:
         return {
             "model_name": self.model_name,
@@ -98,6 +128,24 @@ class OllamaEmbeddingService:
             logger.error(f"OllamaEmbeddingService: Inference Failed - {e}")
             return [0.0] * 1024
 
+    def get_embeddings(
+        self, texts: List[str], is_query: bool = False
+    ) -> List[List[float]]:
+        """Embeds many texts in one /api/embed request."""
+        try:
+            import httpx
+
+            resp = httpx.post(
+                f"{self.base_url}/api/embed",
+                json={"model": self.model_name, "input": texts},
+                timeout=120.0,
+            )
+            resp.raise_for_status()
+            return [list(v) for v in resp.json()["embeddings"]]
+        except Exception as e:
+            logger.error(f"OllamaEmbeddingService: Batch Inference Failed - {e}")
+            return [[0.0] * 1024 for _ in texts]
+
     def get_model_info(self) -> dict:
         return {
             "model_name": self.model_name,
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OperationCancelled(Exception):
+    """Raised inside long-running work once the client has cancelled the request."""
+
+
+class ProgressTracker:
+    """
+    Progress + cancellation handle for a long-running operation.
+
+    `report()` may be called from worker threads; notifications are forwarded to
+    the MCP Context on the event loop that created the tracker. The reported
+    progress is `stage index + done/total` out of `len(stages)`, so it only ever
+    grows, and the message carries the stage, item counts and elapsed time.
+    Blocking code calls `check_cancelled()` between items to stop early.
+    """
+
+    def __init__(self, ctx=None, stages: Optional[List[str]] = None):
+        self.ctx = ctx
+        self.stages = stages or []
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self._last = 0.0
+        self._inflight = set()
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def report(self, stage: str, done: int = 0, total: Optional[int] = None) -> None:
+        if total:
+            message = f"{stage}: {done}/{total} ({self.elapsed():.1f}s)"
+        else:
+            message = f"{stage} ({self.elapsed():.1f}s)"
+        logger.debug(f"Progress: {message}")
+
+        idx = self.stages.index(stage) if stage in self.stages else len(self.stages)
+        fraction = min(done / total, 1.0) if total else 0.0
+        self._last = max(self._last, idx + fraction)
+
+        if self.ctx is None or self._loop is None or self._loop.is_closed():
+            return
+        coro = self.ctx.report_progress(
+            self._last, float(len(self.stages)) or None, message
+        )
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            task = self._loop.create_task(coro)
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def check_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise OperationCancelled(f"Cancelled after {self.elapsed():.1f}s")
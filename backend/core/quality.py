@@ -1,15 +1,75 @@
+import hashlib
 import json
 import logging
 import os
+import re
 import shutil
 import subprocess
 import tempfile
-from typing import Any, Dict, List, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from core import config
+
+from .disk_cache import DiskLRU
 from .security_audit import SecurityAuditService
+from .vuln_db import vuln_db
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the scoring in QualityGate._build_report changes, so cached
+# reports computed under the old rules are not served.
+POLICY_VERSION = 1
+
+# Seconds a probed set of tool versions is trusted before checking again
+TOOL_VERSION_TTL = 300
+
+# Stages per check: lint, format check, Bandit and Safety
+STAGE_COUNT = 4
+
+# The stages are independent and run side by side on this pool. It has room for
+# every stage of one check per worker thread that scores code (the cpu lane for
+# plain checks, the test lane for checks with tests and batch maintenance) plus
+# one check scored inline, so stages rarely queue behind other checks.
+_stage_pool = ThreadPoolExecutor(
+    max_workers=(config.WORKER_LANES["cpu"] + config.WORKER_LANES["test"] + 1)
+    * STAGE_COUNT,
+    thread_name_prefix="quality-stage",
+)
+
+# File names used for batch runs; tool output is mapped back to items through them.
+BATCH_FILE_RE = re.compile(r"lh_(\d+)\.py")
+
+
+# Name Ruff is given for snippets piped through stdin (never written to disk)
+STDIN_FILENAME = os.path.join(tempfile.gettempdir(), "logichive_snippet.py")
+
+
+def _failed_stages(results: Dict[str, Any]) -> List[str]:
+    """Stages whose tool raised or could not run, judged from their results."""
+    failed = []
+    if any(e.startswith("Ruff Lint Exception") for e in results["lint"][1]):
+        failed.append("lint")
+    if str(results["format"][1]).startswith("Ruff Format Exception"):
+        failed.append("format")
+    failed += [name for name in ("bandit", "safety") if results[name].get("error")]
+    return failed
+
+
+def batch_file_name(index: int) -> str:
+    return f"lh_{index}.py"
+
+
+def batch_index(path: str) -> int:
+    """Item index for a batch file path, -1 if it is not one."""
+    match = BATCH_FILE_RE.search(os.path.basename(path))
+    return int(match.group(1)) if match else -1
+
 
 class RuffProcessor:
     @staticmethod
@@ -44,30 +104,62 @@ class RuffProcessor:
         return "ruff"  # Final fallback to PATH search anyway
 
     @staticmethod
-    def lint(code: str) -> Tuple[bool, List[str]]:
-        """Checks code using Ruff Linter via temporary file."""
+    def _lint_error(item: Dict) -> str:
+        code_id = item.get("code", "UNKNOWN")
+        message = item.get("message", "Unknown error")
+        row = item.get("location", {}).get("row", "?")
+        return f"Line {row} [{code_id}]: {message}"
+
+    @staticmethod
+    def _run(
+        args: List[str], code: str, timeout: Optional[float]
+    ) -> subprocess.CompletedProcess:
+        """
+        Runs `ruff <args>` on a code snippet. The snippet is piped through stdin
+        under a name in the temp dir, so config discovery matches a temp file.
+        """
+        ruff_bin = RuffProcessor._get_ruff_bin()
+        if os.name != "nt":
+            return subprocess.run(
+                [ruff_bin, *args, "--stdin-filename", STDIN_FILENAME, "-"],
+                input=code,
+                capture_output=True,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                timeout=timeout,
+            )
+
+        # Use temp file instead of stdin to avoid Windows pipe hangs
         tmp_path = None
         try:
-            ruff_bin = RuffProcessor._get_ruff_bin()
-
-            # Use temp file instead of stdin to avoid Windows pipe hangs
             with tempfile.NamedTemporaryFile(
                 suffix=".py", delete=False, mode="w", encoding="utf-8"
             ) as tmp:
                 tmp.write(code)
                 tmp_path = tmp.name
 
-            result = subprocess.run(
-                [
-                    ruff_bin,
-                    "check",
-                    tmp_path,
-                    "--output-format=json",
-                ],
+            return subprocess.run(
+                [ruff_bin, *args, tmp_path],
                 capture_output=True,
                 text=True,
                 encoding="utf-8",
                 errors="replace",
+                timeout=timeout,
+            )
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except Exception:
+                    pass
+
+    @staticmethod
+    def lint(code: str, timeout: Optional[float] = None) -> Tuple[bool, List[str]]:
+        """Checks code using Ruff Linter (stdin; temporary file on Windows)."""
+        try:
+            result = RuffProcessor._run(
+                ["check", "--output-format=json"], code, timeout
             )
 
             if result.returncode == 0:
@@ -80,11 +172,7 @@ class RuffProcessor:
                         errors.append(f"Ruff Error: {result.stderr.strip()}")
                 else:
                     data = json.loads(result.stdout)
-                    for item in data:
-                        code_id = item.get("code", "UNKNOWN")
-                        message = item.get("message", "Unknown error")
-                        row = item.get("location", {}).get("row", "?")
-                        errors.append(f"Line {row} [{code_id}]: {message}")
+                    errors.extend(RuffProcessor._lint_error(item) for item in data)
             except json.JSONDecodeError:
                 lines = [
                     line.strip() for line in result.stdout.splitlines() if line.strip()
@@ -95,33 +183,12 @@ class RuffProcessor:
 
         except Exception as e:
             return False, [f"Ruff Lint Exception: {str(e)}"]
-        finally:
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
 
     @staticmethod
-    def format_check(code: str) -> Tuple[bool, str]:
-        """Checks code formatting using Ruff Formatter via temporary file."""
-        tmp_path = None
+    def format_check(code: str, timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """Checks code formatting using Ruff Formatter (stdin; temporary file on Windows)."""
         try:
-            ruff_bin = RuffProcessor._get_ruff_bin()
-
-            with tempfile.NamedTemporaryFile(
-                suffix=".py", delete=False, mode="w", encoding="utf-8"
-            ) as tmp:
-                tmp.write(code)
-                tmp_path = tmp.name
-
-            result = subprocess.run(
-                [ruff_bin, "format", "--check", tmp_path],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-            )
+            result = RuffProcessor._run(["format", "--check"], code, timeout)
 
             if result.returncode == 0:
                 return True, "Code is formatted correctly (Ruff)."
@@ -130,18 +197,139 @@ class RuffProcessor:
 
         except Exception as e:
             return False, f"Ruff Format Exception: {str(e)}"
-        finally:
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
+
+    @staticmethod
+    def lint_dir(path: str) -> Dict[int, List[str]]:
+        """Lints every batch file under `path` in one Ruff run; errors keyed by item index."""
+        result = subprocess.run(
+            [RuffProcessor._get_ruff_bin(), "check", path, "--output-format=json"],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        errors: Dict[int, List[str]] = {}
+        if result.returncode == 0:
+            return errors
+        if not result.stdout.strip():
+            raise RuntimeError(f"Ruff Error: {result.stderr.strip()}")
+        for item in json.loads(result.stdout):
+            idx = batch_index(item.get("filename", ""))
+            errors.setdefault(idx, []).append(RuffProcessor._lint_error(item))
+        return errors
+
+    @staticmethod
+    def format_check_dir(path: str) -> Set[int]:
+        """Indexes of the batch files under `path` Ruff would reformat (or cannot parse)."""
+        result = subprocess.run(
+            [RuffProcessor._get_ruff_bin(), "format", "--check", path],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        if result.returncode == 0:
+            return set()
+        # Older Ruff prints "Would reformat: <path>", newer versions a diagnostic
+        # with a "--> <path>:row:col" pointer; parse failures go to stderr.
+        failed = set()
+        for line in (result.stdout + "\n" + result.stderr).splitlines():
+            if "Would reformat" in line or "-->" in line or "Failed to parse" in line:
+                match = BATCH_FILE_RE.search(line)
+                if match:
+                    failed.add(int(match.group(1)))
+        return failed
+
+
+class QualityReportCache:
+    """
+    Disk-backed QualityGate reports, one JSON file per report key under DATA_DIR.
+    The key covers the code, its dependencies, the tool versions and the scoring
+    policy, so entries never need invalidating: an upgraded tool simply produces
+    new keys and old entries age out of the size-bounded, mtime-ordered LRU.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 20 << 20):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hit_count = 0
+        self.miss_count = 0
+        self._store = DiskLRU(self.cache_dir, max_bytes, label="QualityReportCache")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        report = self._store.read(self._path(key))
+        if report is None:
+            self.miss_count += 1
+        else:
+            self.hit_count += 1
+        return report
+
+    def put(self, key: str, report: Dict[str, Any]) -> None:
+        self._store.write(self._path(key), report)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hit_count": self.hit_count, "miss_count": self.miss_count}
 
 
 class QualityGate:
-    def __init__(self):
+    def __init__(self, cache: Optional[QualityReportCache] = None):
         self.processor = RuffProcessor()
         self.security_auditor = SecurityAuditService()
+        self.cache = cache
+        self._versions: Optional[Dict[str, str]] = None
+        self._versions_at = 0.0
+
+    def tool_versions(self) -> Dict[str, str]:
+        """Installed ruff/bandit/safety and vulnerability snapshot versions, re-probed every TOOL_VERSION_TTL seconds."""
+        if (
+            self._versions is None
+            or time.monotonic() - self._versions_at > TOOL_VERSION_TTL
+        ):
+            versions = {}
+            try:
+                out = subprocess.run(
+                    [self.processor._get_ruff_bin(), "--version"],
+                    capture_output=True,
+                    text=True,
+                    timeout=10,
+                )
+                versions["ruff"] = out.stdout.strip() or "unknown"
+            except Exception:
+                versions["ruff"] = "missing"
+            for tool in ("bandit", "safety"):
+                try:
+                    versions[tool] = metadata.version(tool)
+                except metadata.PackageNotFoundError:
+                    versions[tool] = "missing"
+            versions["vulndb"] = vuln_db.version()
+            self._versions = versions
+            self._versions_at = time.monotonic()
+        return self._versions
+
+    def report_key(self, code: str, dependencies: Optional[List[str]] = None) -> str:
+        """Identifies a report: code, dependency list, tool versions and scoring policy."""
+        raw = json.dumps(
+            [
+                hashlib.sha256(code.encode("utf-8")).hexdigest(),
+                sorted(dependencies or []),
+                self.tool_versions(),
+                POLICY_VERSION,
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_complete(report: Dict[str, Any]) -> bool:
+        """
+        False when a stage timed out or its tool failed to run. Such reports
+        carry a fallback result for that stage, so they are returned but never
+        cached (or stored by callers).
+        """
+        return not report.get("timed_out") and not report.get("tool_errors")
 
     def check_score_only(
         self,
@@ -152,20 +340,211 @@ class QualityGate:
     ) -> Dict[str, Any]:
         """
         Ultra-fast quality check using ONLY Ruff.
+        With a cache, a known report is returned before any tool is launched.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.report_key(code, dependencies)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        report = self._check(code, dependencies)
+        if key is not None and self.is_complete(report):
+            self.cache.put(key, report)
+        return report
+
+    def _check(self, code: str, dependencies: Optional[List[str]]) -> Dict[str, Any]:
+        timeout = config.QUALITY_STAGE_TIMEOUT
+        stages = {
+            # 1. Linter, 2. Formatter
+            "lint": lambda: self.processor.lint(code, timeout=timeout),
+            "format": lambda: self.processor.format_check(code, timeout=timeout),
+            # 3. Security Audit
+            "bandit": lambda: self.security_auditor.run_bandit(code, timeout=timeout),
+            "safety": lambda: self.security_auditor.run_safety(
+                dependencies or [], timeout=timeout
+            ),
+        }
+        # Used when a stage does not finish in time; matches how each stage
+        # reports a tool failure (Ruff penalises, the security audits skip).
+        fallbacks = {
+            "lint": (False, [f"Ruff Lint Exception: timed out after {timeout}s"]),
+            "format": (False, f"Ruff Format Exception: timed out after {timeout}s"),
+            "bandit": {"passed": True, "findings": [], "score_penalty": 0},
+            "safety": {"passed": True, "findings": [], "score_penalty": 0},
+        }
+        results, timings, timed_out, raised = self._run_stages(
+            stages, fallbacks, timeout
+        )
+
+        l_pass, l_errs = results["lint"]
+        f_pass, f_msg = results["format"]
+        report = self._build_report(
+            code, l_pass, l_errs, f_pass, f_msg, results["bandit"], results["safety"]
+        )
+        report["timings_ms"] = timings
+        if timed_out:
+            report["timed_out"] = timed_out
+        tool_errors = raised + [
+            name for name in _failed_stages(results) if name not in timed_out + raised
+        ]
+        if tool_errors:
+            report["tool_errors"] = tool_errors
+        return report
+
+    @staticmethod
+    def _run_stages(stages: Dict, fallbacks: Dict, timeout: float):
+        """
+        Runs every stage concurrently. Each stage gets `timeout` seconds from the
+        moment it starts running, so time spent queued behind other checks does
+        not count against it. Queue wait is capped by one shared deadline set at
+        submit time, so a check takes at most about twice `timeout` overall.
+        Returns (results, timings in ms, names of stages that timed out, names of
+        stages that raised). Stages that time out or raise get their fallback
+        result.
+        """
+
+        begun = {name: threading.Event() for name in stages}
+        begun_at = {}
+
+        def _timed(name, func):
+            begun_at[name] = time.monotonic()
+            begun[name].set()
+            started = time.perf_counter()
+            result = func()
+            return result, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        queue_deadline = time.monotonic() + timeout
+        futures = {
+            name: _stage_pool.submit(_timed, name, func)
+            for name, func in stages.items()
+        }
+        results, timings, timed_out, raised = {}, {}, [], []
+        for name, future in futures.items():
+            try:
+                if not begun[name].wait(max(0.0, queue_deadline - time.monotonic())):
+                    raise FutureTimeout()
+                results[name], elapsed = future.result(
+                    timeout=max(0.0, begun_at[name] + timeout - time.monotonic())
+                )
+                timings[name] = round(elapsed, 1)
+            except FutureTimeout:
+                future.cancel()
+                logger.warning(
+                    f"QualityGate: Stage '{name}' timed out after {timeout}s"
+                )
+                results[name] = fallbacks[name]
+                timings[name] = None
+                timed_out.append(name)
+            except Exception as e:
+                logger.error(f"QualityGate: Stage '{name}' failed: {e}")
+                results[name] = fallbacks[name]
+                timings[name] = None
+                raised.append(name)
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        return results, timings, timed_out, raised
+
+    def check_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
+        Scores many functions with one run of each tool. items are dicts with
+        "code" and optional "dependencies"; reports come back in the same order
+        and match what check_score_only would return for each item. Items with
+        a cached report are left out of the tool runs.
+        """
+        reports: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        keys: List[Optional[str]] = [None] * len(items)
+        if self.cache is not None:
+            for i, item in enumerate(items):
+                keys[i] = self.report_key(item["code"], item.get("dependencies"))
+                reports[i] = self.cache.get(keys[i])
+        todo = [i for i, report in enumerate(reports) if report is None]
+        if todo:
+            fresh = self._check_batch([items[i] for i in todo])
+            for i, report in zip(todo, fresh):
+                reports[i] = report
+                if keys[i] is not None and self.is_complete(report):
+                    self.cache.put(keys[i], report)
+        return reports
+
+    def _check_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with tempfile.TemporaryDirectory(prefix="logichive_qg_") as tmp_dir:
+            for i, item in enumerate(items):
+                with open(
+                    os.path.join(tmp_dir, batch_file_name(i)), "w", encoding="utf-8"
+                ) as f:
+                    f.write(item["code"])
+
+            failed = []
+            try:
+                lint_errors = self.processor.lint_dir(tmp_dir)
+            except Exception as e:
+                lint_errors = {
+                    i: [f"Ruff Lint Exception: {e}"] for i in range(len(items))
+                }
+                failed.append("lint")
+            try:
+                unformatted = self.processor.format_check_dir(tmp_dir)
+            except Exception as e:
+                logger.error(f"QualityGate: Batch format check failed: {e}")
+                unformatted = set(range(len(items)))
+                failed.append("format")
+            bandit = {
+                batch_index(name): result
+                for name, result in self.security_auditor.run_bandit_dir(
+                    tmp_dir
+                ).items()
+            }
+
+        safety = self.security_auditor.run_safety_batch(
+            [item.get("dependencies") or [] for item in items]
+        )
+
+        reports = []
+        for i, item in enumerate(items):
+            l_errs = lint_errors.get(i, [])
+            f_pass = i not in unformatted
+            f_msg = (
+                "Code is formatted correctly (Ruff)."
+                if f_pass
+                else "Code requires formatting (Ruff)."
+            )
+            s_bandit = bandit.get(i) or self.security_auditor.score_bandit([])
+            report = self._build_report(
+                item["code"], not l_errs, l_errs, f_pass, f_msg, s_bandit, safety[i]
+            )
+            tool_errors = failed + [
+                name
+                for name, result in (("bandit", s_bandit), ("safety", safety[i]))
+                if result.get("error")
+            ]
+            if tool_errors:
+                report["tool_errors"] = tool_errors
+            reports.append(report)
+        logger.info(f"QualityGate: Scored {len(items)} functions in one batch.")
+        return reports
+
+    @staticmethod
+    def _build_report(
+        code: str,
+        l_pass: bool,
+        l_errs: List[str],
+        f_pass: bool,
+        f_msg: str,
+        s_bandit: Dict[str, Any],
+        s_safety: Dict[str, Any],
+    ) -> Dict[str, Any]:
         report = {
             "status": "evaluated",
             "final_score": 100,
             "reliability": "high",
-            "linter": {"passed": True, "errors": []},
-            "formatter": {"passed": True, "feedback": ""},
+            "linter": {"passed": l_pass, "errors": l_errs},
+            "formatter": {"passed": f_pass, "feedback": f_msg},
             "metadata": {"quality_feedback": ""},
         }
 
-        # 1. Linter (Normalized by Error Density: errors / lines)
-        l_pass, l_errs = self.processor.lint(code)
-        report["linter"] = {"passed": l_pass, "errors": l_errs}
-
+        # Linter (Normalized by Error Density: errors / lines)
         # Calculate line count (min 1 to avoid ZeroDivision)
         line_count = max(code.count("\n") + 1, 1)
         error_density = len(l_errs) / line_count
@@ -173,15 +552,9 @@ class QualityGate:
         # Linter Penalty: Density-based scaling (max 70 points)
         linter_penalty = min(error_density * 500, 70)
 
-        # 2. Formatter (Flat 30 points penalty if fails)
-        f_pass, f_msg = self.processor.format_check(code)
-        report["formatter"] = {"passed": f_pass, "feedback": f_msg}
+        # Formatter (Flat 30 points penalty if fails)
         formatter_penalty = 0 if f_pass else 30
 
-        # 3. Security Audit
-        s_bandit = self.security_auditor.run_bandit(code)
-        s_safety = self.security_auditor.run_safety(dependencies or [])
-
         report["security"] = {"bandit": s_bandit, "safety": s_safety}
         security_penalty = s_bandit["score_penalty"] + s_safety["score_penalty"]
 
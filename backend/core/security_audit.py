@@ -4,16 +4,36 @@ import os
 import shutil
 import subprocess
 import tempfile
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional
+
+from core.vuln_db import vuln_db
+
+try:
+    from bandit.core import config as bandit_config
+    from bandit.core import manager as bandit_manager
+
+    _HAS_BANDIT_API = True
+except ImportError:
+    _HAS_BANDIT_API = False
 
 logger = logging.getLogger(__name__)
 
+# In-process Bandit runs here so a caller's timeout can be enforced (a run that
+# overstays is abandoned, not interrupted).
+_bandit_pool = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 2, thread_name_prefix="bandit"
+)
+
 
 class SecurityAuditService:
     """
     Security Audit Service using Bandit (static) and Safety (dependency check).
     """
 
+    _bandit_config = None
+
     @staticmethod
     def _get_bin(name: str) -> str:
         """Find the binary for a tool."""
@@ -35,9 +55,131 @@ class SecurityAuditService:
 
         return name
 
+    @staticmethod
+    def score_bandit(findings: List[Dict]) -> Dict[str, Any]:
+        """Turns Bandit JSON results into findings and a score penalty."""
+        result = {"passed": True, "findings": [], "score_penalty": 0}
+        for f in findings:
+            severity = f.get("issue_severity", "LOW")
+            msg = f.get("issue_text", "Unknown issue")
+            line = f.get("line_number", "?")
+
+            result["findings"].append(f"Line {line} [{severity}]: {msg}")
+
+            # Penalty based on severity
+            if severity == "HIGH":
+                result["score_penalty"] += 40
+            elif severity == "MEDIUM":
+                result["score_penalty"] += 20
+            else:
+                result["score_penalty"] += 5
+
+        if result["score_penalty"] > 0:
+            result["passed"] = False
+            result["score_penalty"] = min(result["score_penalty"], 80)  # Max 80 penalty
+        return result
+
+    @staticmethod
+    def _tool_failed(tool: str, e: Exception) -> Dict[str, Any]:
+        """
+        Result for an audit that could not run: no penalty. Unless the tool is
+        simply not installed (tool versions are part of report cache keys), the
+        error is recorded so the report is neither cached nor stored.
+        """
+        logger.warning(f"{tool} execution failed or not installed: {e}")
+        result = {"passed": True, "findings": [], "score_penalty": 0}
+        if not isinstance(e, FileNotFoundError):
+            result["error"] = f"{tool}: {e}"
+        return result
+
+    @classmethod
+    def run_bandit_dir(cls, path: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Runs Bandit once over every file under `path`; results keyed by file
+        name. Files without findings are absent.
+        """
+        if _HAS_BANDIT_API:
+            try:
+                mgr = cls._bandit_scan([path], recursive=True)
+            except Exception as e:
+                failed = cls._tool_failed("Bandit", e)
+                return {name: failed for name in os.listdir(path)}
+            by_file: Dict[str, List[Dict]] = {}
+            for issue in mgr.get_issue_list():
+                found = issue.as_dict()
+                by_file.setdefault(os.path.basename(found["filename"]), []).append(
+                    found
+                )
+            return {name: cls.score_bandit(found) for name, found in by_file.items()}
+        try:
+            process = subprocess.run(
+                [cls._get_bin("bandit"), "-r", path, "-f", "json", "-q"],
+                capture_output=True,
+                text=True,
+                encoding="utf-8",
+                shell=os.name == "nt",
+            )
+            if not process.stdout.strip():
+                return {}
+            by_file: Dict[str, List[Dict]] = {}
+            for f in json.loads(process.stdout).get("results", []):
+                name = os.path.basename(f.get("filename", ""))
+                by_file.setdefault(name, []).append(f)
+            return {idx: cls.score_bandit(found) for idx, found in by_file.items()}
+        except Exception as e:
+            failed = cls._tool_failed("Bandit", e)
+            return (
+                {name: failed for name in os.listdir(path)} if "error" in failed else {}
+            )
+
+    @classmethod
+    def run_bandit(cls, code: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Runs Bandit static analysis on a code snippet, in-process through
+        BanditManager when bandit is importable, otherwise through the CLI.
+        """
+        if not _HAS_BANDIT_API:
+            return cls._run_bandit_cli(code, timeout)
+        if timeout is None:
+            return cls._run_bandit_api(code)
+        try:
+            return _bandit_pool.submit(cls._run_bandit_api, code).result(timeout)
+        except FutureTimeout:
+            return cls._tool_failed(
+                "Bandit", TimeoutError(f"timed out after {timeout}s")
+            )
+
+    @classmethod
+    def _bandit_scan(cls, targets: List[str], recursive: bool = False):
+        """Runs BanditManager's file pass (what the CLI does) over `targets`."""
+        if cls._bandit_config is None:
+            cls._bandit_config = bandit_config.BanditConfig()
+        mgr = bandit_manager.BanditManager(cls._bandit_config, "file", quiet=True)
+        mgr.discover_files(targets, recursive)
+        mgr.run_tests()
+        return mgr
+
     @classmethod
-    def run_bandit(cls, code: str) -> Dict[str, Any]:
-        """Runs Bandit static analysis on a code snippet."""
+    def _run_bandit_api(cls, code: str) -> Dict[str, Any]:
+        with tempfile.NamedTemporaryFile(
+            suffix=".py", delete=False, mode="w", encoding="utf-8"
+        ) as tmp:
+            tmp.write(code)
+            tmp_path = tmp.name
+        try:
+            mgr = cls._bandit_scan([tmp_path])
+            return cls.score_bandit([issue.as_dict() for issue in mgr.get_issue_list()])
+        except Exception as e:
+            # Do not penalize if the tool itself fails to run
+            return cls._tool_failed("Bandit", e)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def _run_bandit_cli(
+        cls, code: str, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
         result = {"passed": True, "findings": [], "score_penalty": 0}
 
         with tempfile.NamedTemporaryFile(
@@ -57,6 +199,7 @@ class SecurityAuditService:
                 text=True,
                 encoding="utf-8",
                 shell=os.name == "nt",
+                timeout=timeout,
             )
 
             # Bandit returns non-zero if findings are found (with different levels)
@@ -64,31 +207,11 @@ class SecurityAuditService:
                 return result
 
             data = json.loads(process.stdout)
-            findings = data.get("results", [])
-            for f in findings:
-                severity = f.get("issue_severity", "LOW")
-                msg = f.get("issue_text", "Unknown issue")
-                line = f.get("line_number", "?")
-
-                result["findings"].append(f"Line {line} [{severity}]: {msg}")
-
-                # Penalty based on severity
-                if severity == "HIGH":
-                    result["score_penalty"] += 40
-                elif severity == "MEDIUM":
-                    result["score_penalty"] += 20
-                else:
-                    result["score_penalty"] += 5
-
-            if result["score_penalty"] > 0:
-                result["passed"] = False
-                result["score_penalty"] = min(
-                    result["score_penalty"], 80
-                )  # Max 80 penalty
+            result = cls.score_bandit(data.get("results", []))
 
         except Exception as e:
-            logger.error(f"Bandit execution failed: {e}")
             # Do not penalize if the tool itself fails to run
+            result = cls._tool_failed("Bandit", e)
         finally:
             if os.path.exists(tmp_path):
                 os.remove(tmp_path)
@@ -96,12 +219,27 @@ class SecurityAuditService:
         return result
 
     @classmethod
-    def run_safety(cls, dependencies: List[str]) -> Dict[str, Any]:
-        """Runs Safety check on a list of dependencies."""
-        result = {"passed": True, "findings": [], "score_penalty": 0}
-        if not dependencies:
-            return result
+    def _safety_findings(
+        cls, dependencies: List[str], timeout: Optional[float] = None
+    ) -> List[tuple]:
+        """
+        Audits the dependency specs; returns (package, finding) pairs. Uses the
+        offline vulnerability snapshot when one has been downloaded, otherwise
+        falls back to the `safety check` CLI.
+        """
+        if vuln_db.available():
+            return [finding for dep in dependencies for finding in vuln_db.check(dep)]
+        return cls._safety_cli_findings(dependencies, timeout)
 
+    @classmethod
+    def _safety_cli_findings(
+        cls, dependencies: List[str], timeout: Optional[float] = None
+    ) -> List[tuple]:
+        """
+        Runs `safety check` over the dependency specs; returns (package, finding)
+        pairs. Raises when Safety cannot run (missing, needs auth, bad output).
+        """
+        findings = []
         # Create a temporary requirements.txt
         with tempfile.NamedTemporaryFile(
             suffix=".txt", delete=False, mode="w", encoding="utf-8"
@@ -121,10 +259,11 @@ class SecurityAuditService:
                 text=True,
                 encoding="utf-8",
                 shell=os.name == "nt",
+                timeout=timeout,
             )
 
             if not process.stdout.strip():
-                return result
+                return findings
 
             # Safety output format can vary, but usually it's a list or dict
             data = json.loads(process.stdout)
@@ -143,19 +282,52 @@ class SecurityAuditService:
                     v_id = v[4]
                     msg = v[3]
 
-                result["findings"].append(f"Dependency [{pkg}] (ID: {v_id}): {msg}")
-                result["score_penalty"] += 30  # Harsh penalty for vulnerable deps
-
-            if result["score_penalty"] > 0:
-                result["passed"] = False
-                result["score_penalty"] = min(result["score_penalty"], 90)
-
-        except Exception as e:
-            # Safety might not be installed or need auth in 2.0+
-            # We treat failure to run as a skip for now
-            logger.warning(f"Safety execution failed or not installed: {e}")
+                findings.append(
+                    (str(pkg).lower(), f"Dependency [{pkg}] (ID: {v_id}): {msg}")
+                )
         finally:
             if os.path.exists(tmp_path):
                 os.remove(tmp_path)
 
-        return result
+        return findings
+
+    @staticmethod
+    def _score_safety(findings: List[str]) -> Dict[str, Any]:
+        # Harsh penalty for vulnerable deps (30 each, max 90)
+        return {
+            "passed": not findings,
+            "findings": list(findings),
+            "score_penalty": min(30 * len(findings), 90),
+        }
+
+    @classmethod
+    def run_safety(
+        cls, dependencies: List[str], timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Runs Safety check on a list of dependencies."""
+        if not dependencies:
+            return cls._score_safety([])
+        try:
+            findings = cls._safety_findings(dependencies, timeout)
+        except Exception as e:
+            # Safety might not be installed or need auth in 2.0+; skip without penalty
+            return cls._tool_failed("Safety", e)
+        return cls._score_safety([msg for _, msg in findings])
+
+    @classmethod
+    def run_safety_batch(
+        cls, dependency_lists: List[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Audits each dependency list on its own, so every item gets exactly what
+        run_safety would report for it. Identical lists are audited once, and
+        snapshot lookups are memoised per spec.
+        """
+        audited: Dict[tuple, Dict[str, Any]] = {}
+        results = []
+        for deps in dependency_lists:
+            key = tuple(sorted(deps))
+            if key not in audited:
+                audited[key] = cls.run_safety(list(key))
+            results.append({**audited[key], "findings": list(audited[key]["findings"])})
+        return results
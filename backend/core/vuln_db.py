@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+
+class VulnerabilityDB:
+    """
+    Offline snapshot of the public Safety vulnerability database
+    (`insecure_full.json`: package -> advisories with vulnerable version specs),
+    stored under DATA_DIR and refreshed periodically. Lookups are in-process and
+    memoised per (package, version spec) until the next refresh.
+
+    Like `safety check -r`, only pinned requirements (`==`/`===`) are audited;
+    an open range says nothing about the version that will be installed.
+    """
+
+    def __init__(self, path: Path, url: str, max_age: int = 86400):
+        self.path = Path(path)
+        self.url = url
+        self.max_age = max_age
+        self._index: Optional[Dict[str, List[Dict]]] = None
+        self._version = "none"
+        self._memo: Dict[Tuple[str, str], List[str]] = {}
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+
+    def available(self) -> bool:
+        return self._load() is not None
+
+    def version(self) -> str:
+        """Identifies the loaded snapshot (part of quality report cache keys)."""
+        self._load()
+        return self._version
+
+    def is_stale(self) -> bool:
+        try:
+            return time.time() - self.path.stat().st_mtime > self.max_age
+        except OSError:
+            return True
+
+    def refresh(self, client: Optional[httpx.Client] = None) -> str:
+        """Downloads a new snapshot and swaps it in atomically."""
+        if client is None:
+            with httpx.Client(timeout=60.0, follow_redirects=True) as own_client:
+                return self.refresh(own_client)
+        try:
+            resp = client.get(self.url)
+            resp.raise_for_status()
+            data = resp.json()
+            if not isinstance(data, dict):
+                raise ValueError("unexpected snapshot format")
+        except Exception as e:
+            logger.warning(
+                f"VulnerabilityDB: Refresh failed, keeping old snapshot: {e}"
+            )
+            return f"ERROR: Vulnerability DB refresh failed: {e}"
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+        self._load(force=True)
+        count = len(self._index or {})
+        logger.info(f"VulnerabilityDB: Snapshot refreshed ({count} packages).")
+        return f"SUCCESS: Vulnerability DB refreshed ({count} packages)."
+
+    def check(self, requirement: str) -> List[Tuple[str, str]]:
+        """
+        Returns (package, finding) pairs for one requirement spec, e.g.
+        'django==1.11.0'. Unparsable or unpinned specs yield no findings.
+        """
+        try:
+            req = Requirement(requirement)
+        except InvalidRequirement:
+            return []
+        name = canonicalize_name(req.name)
+        key = (name, str(req.specifier))
+        pkg = req.name.lower()
+        with self._lock:
+            if self._load_locked() is None:
+                return []
+            findings = self._memo.get(key)
+            if findings is None:
+                findings = self._lookup(name, req.specifier)
+                self._memo[key] = findings
+        return [(pkg, finding) for finding in findings]
+
+    def _lookup(self, name: str, specifier: SpecifierSet) -> List[str]:
+        pinned = [
+            s.version
+            for s in specifier
+            if s.operator in ("==", "===") and "*" not in s.version
+        ]
+        if len(pinned) != 1:
+            return []
+        try:
+            version = Version(pinned[0])
+        except InvalidVersion:
+            return []
+
+        findings = []
+        for advisory in self._index.get(name, []):
+            specs = advisory.get("specs") or [advisory.get("v", "")]
+            for spec in specs:
+                try:
+                    vulnerable = version in SpecifierSet(spec, prereleases=True)
+                except InvalidSpecifier:
+                    continue
+                if vulnerable:
+                    v_id = advisory.get("id") or advisory.get("cve") or "unknown"
+                    msg = advisory.get("advisory", "Security vulnerability detected")
+                    findings.append(f"Dependency [{name}] (ID: {v_id}): {msg}")
+                    break
+        return findings
+
+    def _load(self, force: bool = False) -> Optional[Dict[str, List[Dict]]]:
+        with self._lock:
+            return self._load_locked(force)
+
+    def _load_locked(self, force: bool = False) -> Optional[Dict[str, List[Dict]]]:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return self._index
+        if not force and self._index is not None and mtime == self._loaded_mtime:
+            return self._index
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"VulnerabilityDB: Could not read snapshot: {e}")
+            return self._index
+
+        meta = data.pop("$meta", {}) or {}
+        self._index = {
+            canonicalize_name(pkg): advisories for pkg, advisories in data.items()
+        }
+        self._version = str(meta.get("timestamp") or meta.get("last_updated") or mtime)
+        self._loaded_mtime = mtime
+        self._memo.clear()
+        return self._index
+
+
+# Global Instance
+vuln_db = VulnerabilityDB(
+    config.VULN_DB_PATH,
+    config.VULN_DB_URL,
+    max_age=config.VULN_DB_REFRESH_INTERVAL,
+)
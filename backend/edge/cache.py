@@ -1,9 +1,12 @@
 import hashlib
 import logging
 import time
-from collections import Counter
+from collections import Counter, OrderedDict
+from pathlib import Path
 from typing import Dict, List, Optional
 
+from core.disk_cache import DiskLRU
+
 logger = logging.getLogger(__name__)
 
 
@@ -68,3 +71,108 @@ class PopularQueryCache:
             "hit_rate": f"{hit_rate:.2f}%",
             "total_queries": len(self.query_frequency),
         }
+
+
+class BundleCache:
+    """
+    Assembled dependency bundles keyed by a fingerprint of their members'
+    code versions. A changed member yields a new fingerprint, so stale
+    bundles are never served and simply age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @staticmethod
+    def fingerprint(members: List[tuple]) -> str:
+        """members: ordered (name, code_hash) pairs."""
+        raw = "|".join(f"{name}:{code_hash or ''}" for name, code_hash in members)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        bundle = self._entries.get(key)
+        if bundle is None:
+            self.miss_count += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hit_count += 1
+        return bundle
+
+    def put(self, key: str, bundle: str) -> None:
+        self._entries[key] = bundle
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        return {
+            "cache_size": len(self._entries),
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+        }
+
+
+class HubCodeCache:
+    """
+    Disk-backed read-through cache of Hub `get_code` payloads, one JSON file per
+    function under DATA_DIR. Entries carry the Hub's ETag and version so a stale
+    entry can be revalidated cheaply; file mtimes double as LRU order for the
+    size-bounded eviction.
+    """
+
+    def __init__(self, cache_dir: Path, ttl: int = 3600, max_bytes: int = 50 << 20):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hit_count = 0
+        self.miss_count = 0
+        self.stale_served = 0
+        self._store = DiskLRU(self.cache_dir, max_bytes, label="HubCodeCache")
+
+    def _path(self, name: str) -> Path:
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Returns the cached entry (fresh or not) or None."""
+        entry = self._store.read(self._path(name))
+        return entry if entry and entry.get("name") == name else None
+
+    def is_fresh(self, entry: Dict, version: Optional[str] = None) -> bool:
+        if version is not None and str(entry.get("version")) != str(version):
+            return False
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def put(
+        self,
+        name: str,
+        payload: Dict,
+        etag: Optional[str] = None,
+        version: Optional[str] = None,
+    ) -> None:
+        entry = {
+            "name": name,
+            "payload": payload,
+            "etag": etag,
+            "version": version
+            if version is not None
+            else payload.get("version") or payload.get("updated_at"),
+            "fetched_at": time.time(),
+        }
+        self._store.write(self._path(name), entry)
+
+    def touch(self, name: str) -> None:
+        """Marks an entry as revalidated (Hub answered 304 Not Modified)."""
+        entry = self.get(name)
+        if entry is not None:
+            self.put(name, entry["payload"], entry.get("etag"), entry.get("version"))
+
+    def get_stats(self) -> Dict:
+        return {
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "stale_served": self.stale_served,
+        }
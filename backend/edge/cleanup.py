@@ -1,6 +1,6 @@
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from core.database import get_db_connection
 from hub.orchestrator import do_archive_impl
@@ -30,18 +30,10 @@ class RetentionScorer:
         # A draft (calls=0, qs=10) will quickly drop below 0.5.
         return (usage_frequency * 5.0) + (quality * 1.0)
 
-    def _days_since(self, date_str: str) -> int:
-        if not date_str:
-            return 0
-        try:
-            # Handle both ISO format and simple space format
-            date_clean = date_str.replace(" ", "T")
-            dt = datetime.fromisoformat(date_clean)
-            delta = datetime.now() - dt
-            return max(0, delta.days)
-        except Exception as e:
-            logger.debug(f"Scorer: Date parse failed for '{date_str}': {e}")
+    def _days_since(self, dt: datetime) -> int:
+        if not dt:
             return 0
+        return max(0, (datetime.now() - dt).days)
 
 
 def run_forget_cleanup() -> str:
@@ -53,14 +45,20 @@ def run_forget_cleanup() -> str:
     logger.info("Forget Logic: Starting cleanup cycle...")
 
     candidates = []
+    now = datetime.now()
     conn = get_db_connection(read_only=True)
     try:
-        # Load all functions for evaluation
-        rows = conn.execute("""
-            SELECT name, created_at, last_called_at, call_count, tags, metadata 
-            FROM functions 
+        # Only functions idle past the grace period are worth scoring, so the
+        # age filter runs inside DuckDB on the native TIMESTAMP columns.
+        rows = conn.execute(
+            """
+            SELECT name, created_at, last_called_at, call_count, tags, metadata
+            FROM functions
             WHERE status NOT IN ('deleted', 'archived')
-        """).fetchall()
+              AND COALESCE(last_called_at, created_at) <= ?
+        """,
+            (now - timedelta(days=scorer.grace_days),),
+        ).fetchall()
 
         for r in rows:
             name, created, last_call, calls, tags_json, meta_json = r
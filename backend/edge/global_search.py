@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import httpx
 from typing import List, Dict, Optional
 from core import config
+from edge.cache import HubCodeCache
 
 logger = logging.getLogger(__name__)
 
@@ -14,50 +16,97 @@ class GlobalSearchEngine:
 
     def __init__(self):
         self.hub_url = config.HUB_URL.rstrip("/")
+        self.code_cache = HubCodeCache(
+            config.HUB_CODE_CACHE_DIR,
+            ttl=config.HUB_CODE_CACHE_TTL,
+            max_bytes=config.HUB_CODE_CACHE_MAX_BYTES,
+        )
 
-    async def search(self, query: str, limit: int = 5) -> List[Dict]:
+    async def _post(
+        self,
+        url: str,
+        payload: Dict,
+        client: Optional[httpx.AsyncClient],
+        headers: Optional[Dict] = None,
+    ) -> httpx.Response:
+        """Posts on the caller's client when given so a pipeline reuses one connection pool."""
+        if client is not None:
+            return await client.post(url, json=payload, headers=headers)
+        async with httpx.AsyncClient(timeout=20.0) as own_client:
+            return await own_client.post(url, json=payload, headers=headers)
+
+    async def search(
+        self, query: str, limit: int = 5, client: Optional[httpx.AsyncClient] = None
+    ) -> List[Dict]:
         """Performs semantic search on the Hub (Metadata only)."""
         url = f"{self.hub_url}/api/v1/functions/search"
         payload = {"query": query, "match_count": limit}
 
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                resp = await client.post(url, json=payload)
-                if resp.status_code == 200:
-                    return resp.json()
-                elif resp.status_code == 429:
-                    logger.warning("GlobalSearch: Rate limited by Hub.")
-                    return []
-                else:
-                    logger.error(
-                        f"GlobalSearch: Search failed ({resp.status_code}): {resp.text}"
-                    )
-                    return []
+            resp = await self._post(url, payload, client)
+            if resp.status_code == 200:
+                return resp.json()
+            elif resp.status_code == 429:
+                logger.warning("GlobalSearch: Rate limited by Hub.")
+                return []
+            else:
+                logger.error(
+                    f"GlobalSearch: Search failed ({resp.status_code}): {resp.text}"
+                )
+                return []
         except Exception as e:
             logger.error(f"GlobalSearch: Connection error during search: {e}")
             return []
 
-    async def get_details(self, name: str) -> Optional[Dict]:
-        """Retrieves full function details (including code) from the Hub."""
+    async def get_details(
+        self,
+        name: str,
+        client: Optional[httpx.AsyncClient] = None,
+        version: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """
+        Retrieves full function details (including code) from the Hub.
+        Read-through: a fresh cached copy is returned without a request, a stale
+        one is revalidated with its ETag, and any cached copy is served when the
+        Hub is rate-limiting or unreachable. Cache file IO runs off the event loop.
+        """
+        cached = await asyncio.to_thread(self.code_cache.get, name)
+        if cached and self.code_cache.is_fresh(cached, version):
+            self.code_cache.hit_count += 1
+            return cached["payload"]
+        self.code_cache.miss_count += 1
+
         url = f"{self.hub_url}/api/v1/functions/get_code"
         payload = {"name": name}
+        headers = (
+            {"If-None-Match": cached["etag"]} if cached and cached.get("etag") else None
+        )
 
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                resp = await client.post(url, json=payload)
-                if resp.status_code == 200:
-                    return resp.json()
-                elif resp.status_code == 429:
-                    logger.warning("GlobalSearch: Rate limited for code retrieval.")
-                    return None
-                else:
-                    logger.error(
-                        f"GlobalSearch: Retrieval failed ({resp.status_code}): {resp.text}"
-                    )
-                    return None
+            resp = await self._post(url, payload, client, headers)
+            if resp.status_code == 304 and cached:
+                await asyncio.to_thread(self.code_cache.touch, name)
+                return cached["payload"]
+            if resp.status_code == 200:
+                data = resp.json()
+                await asyncio.to_thread(
+                    self.code_cache.put, name, data, resp.headers.get("ETag"), version
+                )
+                return data
+            elif resp.status_code == 429:
+                logger.warning("GlobalSearch: Rate limited for code retrieval.")
+            else:
+                logger.error(
+                    f"GlobalSearch: Retrieval failed ({resp.status_code}): {resp.text}"
+                )
         except Exception as e:
             logger.error(f"GlobalSearch: Connection error during retrieval: {e}")
-            return None
+
+        if cached:
+            logger.info(f"GlobalSearch: Serving cached code for '{name}'.")
+            self.code_cache.stale_served += 1
+            return cached["payload"]
+        return None
 
 
 # Singleton
@@ -2,21 +2,42 @@ import argparse
 import json
 import logging
 import os
+import signal
 import sys
+import threading
+import time
 import ctypes
 from pathlib import Path
 
-from mcp.server.fastmcp import FastMCP
-from core.config import TRANSPORT
+from mcp.server.fastmcp import Context, FastMCP
+from core.config import (
+    COMPACTION_INTERVAL,
+    SHUTDOWN_TIMEOUT,
+    TRANSPORT,
+    VULN_DB_REFRESH_INTERVAL,
+    WORKER_STATS_LOG_INTERVAL,
+)
+from core.database import checkpoint_store, compact_store, db_writer, init_db
+from core.database import recover_embeddings as do_recover_embeddings
+from core.progress import OperationCancelled, ProgressTracker
+from core.vuln_db import vuln_db
 from edge.orchestrator import (
+    do_save_batch_impl,
     do_save_impl,
     do_search_impl,
     do_get_impl,
     do_get_details_impl,
     do_delete_impl,
     do_list_impl,
-    do_smart_get_impl,
+    do_smart_get_async,
+    run_blocking,
+    run_with_progress,
+    SMART_GET_STAGES,
 )
+from edge.snapshot import export_store as do_export_store
+from edge.snapshot import import_store as do_import_store
+from edge.sync import SYNC_PULL_STAGES, sync_engine
+from edge.worker import task_worker
 
 
 def setup_logging(is_frozen: bool, project_root: Path):
@@ -34,6 +55,70 @@ def setup_logging(is_frozen: bool, project_root: Path):
         logging.info(f"Logging initialized. Log file: {log_file}")
 
 
+def start_compaction_scheduler(interval: int):
+    """Periodically queues store compaction on the background worker."""
+    if interval <= 0:
+        return
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            task_worker.add_task(compact_store, lane="db", priority="bulk")
+
+    threading.Thread(target=_loop, daemon=True).start()
+
+
+def start_worker_stats_logger(interval: int):
+    """Periodically logs a summary of the background worker's queues."""
+    if interval <= 0:
+        return
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            task_worker.log_stats()
+
+    threading.Thread(target=_loop, daemon=True).start()
+
+
+def start_vuln_db_refresher(interval: int):
+    """
+    Queues a vulnerability snapshot download whenever the local copy is missing
+    or older than `interval` seconds (checked at startup, then hourly at most).
+    """
+    if interval <= 0:
+        return
+
+    def _loop():
+        while True:
+            if vuln_db.is_stale():
+                task_worker.add_task(
+                    vuln_db.refresh,
+                    lane="io",
+                    priority="bulk",
+                    coalesce_key="vuln_db_refresh",
+                )
+            time.sleep(min(interval, 3600))
+
+    threading.Thread(target=_loop, daemon=True).start()
+
+
+def shutdown_background_work(timeout: float):
+    """
+    Stops worker intake, lets in-flight tasks finish within `timeout`, then
+    flushes queued writes and checkpoints the store. Unfinished durable tasks
+    stay in task_queue and are replayed on the next start.
+    """
+    deadline = time.monotonic() + timeout
+    task_worker.shutdown(timeout)
+    db_writer.flush(max(1.0, deadline - time.monotonic()))
+    try:
+        checkpoint_store()
+    except Exception as e:
+        logging.error(f"Shutdown: Checkpoint failed: {e}")
+    logging.info("Shutdown: Background work stopped.")
+
+
 # Initialize FastMCP
 mcp = FastMCP("LogicHive", dependencies=["duckdb", "fastembed"])
 
@@ -43,22 +128,26 @@ mcp = FastMCP("LogicHive", dependencies=["duckdb", "fastembed"])
 
 
 @mcp.tool()
-def list_functions(limit: int = 100) -> list[dict]:
+async def list_functions(limit: int = 100) -> list[dict]:
     """Lists all stored functions from the local store."""
-    return do_list_impl(limit=limit)
+    return await run_blocking(do_list_impl, limit=limit)
 
 
 @mcp.tool()
-def search_functions(query: str, limit: int = 5) -> list[dict]:
+async def search_functions(
+    query: str, limit: int = 5, explain: bool = False
+) -> list[dict] | dict:
     """
     [EXPLORATION TOOL] Catalog search for reusable functions.
     Searches local DuckDB/Qdrant.
+    explain=True returns {"results", "explain"} with per-stage timings,
+    candidate counts and cache hits.
     """
-    return do_search_impl(query=query, limit=limit)
+    return await run_blocking(do_search_impl, query=query, limit=limit, explain=explain)
 
 
 @mcp.tool()
-def save_function(
+async def save_function(
     name: str,
     code: str,
     description: str = "",
@@ -70,7 +159,8 @@ def save_function(
     """
     Saves or updates a Python function in the local persistent store.
     """
-    return do_save_impl(
+    return await run_blocking(
+        do_save_impl,
         asset_name=name,
         code=code,
         description=description,
@@ -82,30 +172,89 @@ def save_function(
 
 
 @mcp.tool()
-def delete_function(name: str) -> str:
+async def save_functions_batch(functions: list[dict]) -> list[dict]:
+    """
+    Saves many functions in one call (e.g. when migrating a module).
+    Each item takes the same fields as save_function: name, code, description,
+    tags, dependencies, test_cases, skip_test. Returns one result per item.
+    """
+    return await run_blocking(do_save_batch_impl, functions=functions)
+
+
+@mcp.tool()
+async def delete_function(name: str) -> str:
     """Permanently deletes a function from the local store."""
-    return do_delete_impl(asset_name=name)
+    return await run_blocking(do_delete_impl, asset_name=name)
 
 
 @mcp.tool()
-def get_function(name: str, integrate_dependencies: bool = False) -> str:
+async def get_function(name: str, integrate_dependencies: bool = False) -> str:
     """Retrieves the raw source code of a specific function from local store."""
-    return do_get_impl(asset_name=name, integrate_dependencies=integrate_dependencies)
+    return await run_blocking(
+        do_get_impl, asset_name=name, integrate_dependencies=integrate_dependencies
+    )
 
 
 @mcp.tool()
-def get_function_details(name: str) -> dict:
+async def get_function_details(name: str) -> dict:
     """Retrieves full metadata for a local function."""
-    return do_get_details_impl(name=name)
+    return await run_blocking(do_get_details_impl, name=name)
 
 
 @mcp.tool()
-def smart_search_and_get(query: str, target_dir: str = "./") -> dict:
+async def smart_search_and_get(
+    query: str, target_dir: str = "./", ctx: Context | None = None
+) -> dict:
     """
     [PRIMARY AI PROTOCOL] Intent-based Search -> Selection -> Injection.
     Uses local search + Hub-based reranking.
     """
-    return do_smart_get_impl(query=query, target_dir=target_dir)
+    progress = ProgressTracker(ctx, SMART_GET_STAGES)
+    return await do_smart_get_async(
+        query=query, target_dir=target_dir, progress=progress
+    )
+
+
+@mcp.tool()
+async def sync_pull(ctx: Context | None = None) -> str:
+    """Pulls the latest functions from the public Hub repository into the local store."""
+    progress = ProgressTracker(ctx, SYNC_PULL_STAGES)
+    try:
+        count = await run_with_progress(progress, sync_engine.pull)
+    except OperationCancelled as e:
+        return f"ERROR: Sync pull cancelled: {e}"
+    return f"SUCCESS: Pulled {count} updated functions from the Hub."
+
+
+@mcp.tool()
+async def recover_embeddings(ctx: Context | None = None) -> str:
+    """Re-embeds every function that has no vector for the current embedding model."""
+    progress = ProgressTracker(ctx, ["recover"])
+    try:
+        return await run_with_progress(progress, do_recover_embeddings)
+    except OperationCancelled as e:
+        return f"ERROR: Recovery cancelled: {e}"
+
+
+@mcp.tool()
+async def export_store(target_dir: str) -> str:
+    """Exports the whole local store (functions + vectors) to Parquet files."""
+    return await run_blocking(do_export_store, target_dir=target_dir)
+
+
+@mcp.tool()
+async def import_store(source_dir: str) -> str:
+    """Bulk-imports a Parquet store snapshot created by export_store."""
+    return await run_blocking(do_import_store, source_dir=source_dir)
+
+
+@mcp.tool()
+async def get_worker_stats() -> dict:
+    """
+    Reports background worker load: queue depth per lane, wait/run time
+    histograms and failure counts per task type, and the tasks running now.
+    """
+    return task_worker.get_stats()
 
 
 def main():
@@ -132,8 +281,26 @@ def main():
             action="store_true",
             help="Generate Cursor/Gemini Desktop config",
         )
+        parser.add_argument(
+            "--export-store",
+            metavar="DIR",
+            help="Export the local store to Parquet files in DIR and exit",
+        )
+        parser.add_argument(
+            "--import-store",
+            metavar="DIR",
+            help="Import a Parquet store snapshot from DIR and exit",
+        )
         args = parser.parse_args()
 
+        if args.export_store or args.import_store:
+            init_db()
+            if args.export_store:
+                print(do_export_store(args.export_store))
+            if args.import_store:
+                print(do_import_store(args.import_store))
+            return
+
         config_file = project_root / "mcp_config_logic_hive.json"
         config = {}
         if config_file.exists():
@@ -184,8 +351,19 @@ def main():
             if args.generate_mcp_config:
                 return
 
+        init_db()
+        task_worker.replay_persisted()
+        start_compaction_scheduler(COMPACTION_INTERVAL)
+        start_worker_stats_logger(WORKER_STATS_LOG_INTERVAL)
+        start_vuln_db_refresher(VULN_DB_REFRESH_INTERVAL)
+
+        # SIGTERM exits through the finally below instead of killing the worker mid-task.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
         logging.info("Starting FastMCP server loop...")
-        mcp.run(transport=TRANSPORT)
+        try:
+            mcp.run(transport=TRANSPORT)
+        finally:
+            shutdown_background_work(SHUTDOWN_TIMEOUT)
 
     except Exception as e:
         logging.exception("A fatal error occurred during execution:")
@@ -1,14 +1,35 @@
+import asyncio
+import functools
+import hashlib
+import heapq
 import json
 import logging
 import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, List, Set
+from typing import Callable, Dict, List, Optional
 
-from core.database import DBWriteLock, get_db_connection
+from core.config import (
+    DB_EXECUTOR_WORKERS,
+    QUALITY_CACHE_DIR,
+    QUALITY_CACHE_MAX_BYTES,
+    SMART_GET_BUDGET,
+    SMART_GET_PREFETCH,
+)
+from core.database import (
+    CODE_JOIN_SQL,
+    CODE_SQL,
+    compute_code_hash,
+    db_writer,
+    get_db_connection,
+    store_code_blob,
+)
 from edge.vector_db import get_vector_db
 from core.embedding import embedding_service
-from edge.cache import PopularQueryCache
-from core.quality import QualityGate
+from core.progress import ProgressTracker
+from edge.cache import BundleCache, PopularQueryCache
+from core.quality import QualityGate, QualityReportCache
 from core.sanitizer import DataSanitizer
 from edge.worker import task_worker
 import httpx
@@ -20,35 +41,66 @@ HUB_URL = os.getenv(
     "LOGICHIVE_HUB_URL", "https://function-store-hub-wqrdbid6cq-an.a.run.app"
 )
 
-quality_gate = QualityGate()
+VERIFIED_BOOST = 1.2  # 20% boost for verified functions
+
+quality_gate = QualityGate(
+    cache=QualityReportCache(QUALITY_CACHE_DIR, max_bytes=QUALITY_CACHE_MAX_BYTES)
+)
 popular_cache = PopularQueryCache()
+bundle_cache = BundleCache()
+
+SMART_GET_STAGES = ["search", "rerank", "fetch", "inject"]
+
+# Bounded pool for blocking DuckDB/embedding work awaited by async tool handlers,
+# so a slow call never blocks the event loop and concurrency stays capped.
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="logichive-db"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking impl on the bounded executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        db_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_with_progress(progress: ProgressTracker, func, *args, **kwargs):
+    """
+    run_blocking for work that accepts a `progress` tracker. If the request is
+    cancelled, the tracker is flagged so the thread stops at its next checkpoint.
+    """
+    try:
+        return await run_blocking(func, *args, progress=progress, **kwargs)
+    except asyncio.CancelledError:
+        progress.cancel()
+        raise
 
 
 def _record_usage(name: str):
-    """Internal helper to track function usage in DuckDB."""
-    with DBWriteLock():
-        conn = get_db_connection()
-        try:
-            now = datetime.now().isoformat()
-            conn.execute(
-                "UPDATE functions SET call_count = call_count + 1, last_called_at = ?, updated_at = ? WHERE name = ?",
-                (now, now, name),
-            )
-            conn.commit()
-        finally:
-            conn.close()
+    """Internal helper to track function usage in DuckDB (fire-and-forget)."""
+    now = datetime.now()
 
+    def _write(conn):
+        conn.execute(
+            "UPDATE functions SET call_count = call_count + 1, last_called_at = ?, updated_at = ? WHERE name = ?",
+            (now, now, name),
+        )
 
-def do_save_impl(
+    db_writer.submit(_write)
+
+
+def _prepare_save(
     asset_name: str,
     code: str,
-    description: str = "",
-    tags: List[str] = [],
-    dependencies: List[str] = [],
-    test_cases: List[Dict] = [],
-    skip_test: bool = False,
-) -> str:
-    """Stateful saving to local DuckDB and VectorDB."""
+    description: str,
+    tags: List[str],
+    dependencies: List[str],
+    test_cases: List[Dict],
+    skip_test: bool,
+) -> Dict:
+    """Sanitises and validates one save request; "rejected" holds the reason if refused."""
     if not description.strip():
         now_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         description = f"Draft automatically saved by AI on {now_date}"
@@ -61,187 +113,903 @@ def do_save_impl(
         sanitized["tags"],
     )
 
-    with DBWriteLock():
-        conn = get_db_connection()
+    is_syntax_valid = True
+    try:
+        import ast
+
+        ast.parse(code)
+    except SyntaxError:
+        is_syntax_valid = False
+
+    from core.security import _contains_secrets
+
+    has_secret, _ = _contains_secrets(code)
+    now = datetime.now()
+
+    return {
+        "name": asset_name,
+        "code": code,
+        "description": description,
+        "tags": tags,
+        "dependencies": dependencies,
+        "test_cases": test_cases,
+        "skip_test": skip_test,
+        "is_syntax_valid": is_syntax_valid,
+        "rejected": "REJECTED: Secret detected in code." if has_secret else None,
+        "now": now,
+        "metadata": {
+            "dependencies": dependencies,
+            "saved_at": now.isoformat(),
+            "quality_score": 0 if not is_syntax_valid else 50,
+        },
+        "fingerprint": _content_fingerprint(
+            asset_name, code, description, tags, dependencies, test_cases, skip_test
+        ),
+    }
+
+
+def _write_save(conn, item: Dict) -> Optional[bool]:
+    """None: identical content already processed; else whether checks still hold."""
+    row = conn.execute(
+        "SELECT content_fingerprint, status, metadata FROM functions WHERE name = ?",
+        (item["name"],),
+    ).fetchone()
+    stored = row[0] if row else None
+    settled = row is not None and row[1] != "pending"
+    if settled and stored == item["fingerprint"]:
+        return None
+
+    # Code, tests and deps unchanged: keep the verdict, only the vector is stale.
+    checks_unchanged = (
+        settled
+        and item["is_syntax_valid"]
+        and _checks_part(stored) == _checks_part(item["fingerprint"])
+    )
+    status = "pending" if item["is_syntax_valid"] else "broken"
+    metadata = dict(item["metadata"])
+    if checks_unchanged:
+        status = row[1]
+        old_meta = json.loads(row[2]) if row[2] else {}
+        metadata["quality_score"] = old_meta.get(
+            "quality_score", metadata["quality_score"]
+        )
+
+    code_hash = store_code_blob(conn, item["code"])
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO functions (name, code_hash, description, tags, metadata, test_cases, status, created_at, updated_at, content_fingerprint) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+        (
+            item["name"],
+            code_hash,
+            item["description"],
+            json.dumps(item["tags"]),
+            json.dumps(metadata),
+            json.dumps(item["test_cases"]),
+            status,
+            item["now"],
+            item["now"],
+            stored,
+        ),
+    )
+    return checks_unchanged
+
+
+def _saved_at(item: Dict) -> str:
+    """Identifies one save of a function; a later save of the same name changes it."""
+    return item["metadata"]["saved_at"]
+
+
+def _current_saves(names: List[str]) -> Dict[str, Optional[str]]:
+    """name -> saved_at of the save each function row currently holds."""
+    if not names:
+        return {}
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT name, json_extract_string(metadata, '$.saved_at') FROM functions "
+            "WHERE name IN (SELECT unnest(?::VARCHAR[]))",
+            (list(names),),
+        ).fetchall()
+    finally:
+        conn.close()
+    return dict(rows)
+
+
+def _maintenance_args(item: Dict) -> tuple:
+    return (
+        item["name"],
+        item["code"],
+        item["description"],
+        item["tags"],
+        item["dependencies"],
+        item["test_cases"],
+        item["skip_test"],
+    )
+
+
+def _schedule_when_committed(future: Future, schedule: Callable) -> None:
+    """
+    Calls schedule(result) once a queued save commits, whether or not the caller
+    is still waiting for it, so a committed save always gets its maintenance.
+    """
+
+    def _done(f: Future) -> None:
+        if f.exception() is not None:
+            return
         try:
-            is_syntax_valid = True
-            try:
-                import ast
+            schedule(f.result())
+        except Exception as e:
+            logger.error(f"Edge: Scheduling maintenance failed: {e}")
+
+    future.add_done_callback(_done)
+
+
+def do_save_impl(
+    asset_name: str,
+    code: str,
+    description: str = "",
+    tags: List[str] = [],
+    dependencies: List[str] = [],
+    test_cases: List[Dict] = [],
+    skip_test: bool = False,
+) -> str:
+    """Stateful saving to local DuckDB and VectorDB."""
+    item = _prepare_save(
+        asset_name, code, description, tags, dependencies, test_cases, skip_test
+    )
+    if item["rejected"]:
+        return item["rejected"]
+    asset_name = item["name"]
 
-                ast.parse(code)
-            except SyntaxError:
-                is_syntax_valid = False
+    def _schedule(checks_unchanged):
+        if checks_unchanged is not None:
+            _schedule_maintenance(item, checks_unchanged)
 
-            from core.security import _contains_secrets
+    future = db_writer.submit(lambda conn: _write_save(conn, item))
+    _schedule_when_committed(future, _schedule)
+    if not wait([future], timeout=30.0).done:
+        return (
+            f"SUCCESS: '{asset_name}' queued for saving. "
+            "Background verification starts once it is written."
+        )
+    checks_unchanged = future.result()
+    if checks_unchanged is None:
+        return f"SUCCESS: '{asset_name}' is unchanged. Nothing to re-verify."
 
-            has_secret, _ = _contains_secrets(code)
-            if has_secret:
-                return "REJECTED: Secret detected in code."
+    if checks_unchanged:
+        return f"SUCCESS: '{asset_name}' saved locally. Re-indexing started."
+    return f"SUCCESS: '{asset_name}' saved locally. Background verification started."
 
-            initial_status = "pending" if is_syntax_valid else "broken"
-            now = datetime.now().isoformat()
 
-            metadata = {
-                "dependencies": dependencies,
-                "saved_at": now,
-                "quality_score": 0 if not is_syntax_valid else 50,
+def do_save_batch_impl(functions: List[Dict]) -> List[Dict]:
+    """
+    Saves many functions at once: every item is validated up front, all accepted
+    items are written in one transaction, and a single background task embeds
+    them in one request and runs their verification as a group.
+    Returns one {"name", "status", "message"} entry per input item, in order.
+    """
+    results: List[Optional[Dict]] = [None] * len(functions)
+    accepted = {}  # name -> (index, item); a later duplicate supersedes an earlier one
+    for i, raw in enumerate(functions):
+        if not raw.get("name") or not raw.get("code"):
+            results[i] = {
+                "name": raw.get("name"),
+                "status": "rejected",
+                "message": "ERROR: 'name' and 'code' are required.",
+            }
+            continue
+        item = _prepare_save(
+            raw["name"],
+            raw["code"],
+            raw.get("description") or "",
+            raw.get("tags") or [],
+            raw.get("dependencies") or [],
+            raw.get("test_cases") or [],
+            bool(raw.get("skip_test", False)),
+        )
+        if item["rejected"]:
+            results[i] = {
+                "name": item["name"],
+                "status": "rejected",
+                "message": item["rejected"],
             }
+            continue
+        if item["name"] in accepted:
+            prev = accepted[item["name"]][0]
+            results[prev] = {
+                "name": item["name"],
+                "status": "superseded",
+                "message": f"Superseded by item {i} in the same batch.",
+            }
+        accepted[item["name"]] = (i, item)
+
+    batch = list(accepted.values())
+    if batch:
+
+        def _schedule(outcomes):
+            jobs = [
+                (*_maintenance_args(item), checks_unchanged, _saved_at(item))
+                for (_, item), checks_unchanged in zip(batch, outcomes)
+                if checks_unchanged is not None
+            ]
+            if jobs:
+                task_worker.add_task(
+                    run_batch_maintenance, jobs, lane="test", priority="bulk"
+                )
+
+        future = db_writer.submit(
+            lambda conn: [_write_save(conn, item) for _, item in batch]
+        )
+        _schedule_when_committed(future, _schedule)
+        if not wait([future], timeout=300.0).done:
+            logger.warning("Edge: Batch save still queued behind other writes.")
+            for i, item in batch:
+                results[i] = {
+                    "name": item["name"],
+                    "status": "queued",
+                    "message": f"SUCCESS: '{item['name']}' queued for saving.",
+                }
+            return results
+        try:
+            outcomes = future.result()
+        except Exception as e:
+            logger.error(f"Edge: Batch save failed: {e}")
+            for i, item in batch:
+                results[i] = {
+                    "name": item["name"],
+                    "status": "error",
+                    "message": f"ERROR: Batch save failed: {e}",
+                }
+            return results
+
+        for (i, item), checks_unchanged in zip(batch, outcomes):
+            name = item["name"]
+            if checks_unchanged is None:
+                results[i] = {
+                    "name": name,
+                    "status": "unchanged",
+                    "message": f"SUCCESS: '{name}' is unchanged. Nothing to re-verify.",
+                }
+                continue
+            results[i] = {
+                "name": name,
+                "status": "reindexing" if checks_unchanged else "saved",
+                "message": f"SUCCESS: '{name}' saved locally.",
+            }
+
+    logger.info(f"Edge: Batch save accepted {len(batch)}/{len(functions)} functions.")
+    return results
+
+
+def _embedding_text(f_name: str, f_desc: str, f_tags: List[str], f_code: str) -> str:
+    return f"Name: {f_name}\nDesc: {f_desc}\nTags: {f_tags}\nCode:\n{f_code[:500]}"
+
+
+def _content_fingerprint(
+    f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify
+) -> str:
+    """
+    "<embedding part>:<checks part>". The first half covers the embedded text,
+    the second everything the quality gate and tests depend on, so a save can
+    tell "nothing changed" apart from "only description/tags changed".
+    """
+    embed_part = hashlib.sha256(
+        _embedding_text(f_name, f_desc, f_tags, f_code).encode("utf-8")
+    ).hexdigest()[:32]
+    checks = json.dumps(
+        [compute_code_hash(f_code), f_deps, f_tests, bool(skip_verify)],
+        sort_keys=True,
+    )
+    checks_part = hashlib.sha256(checks.encode("utf-8")).hexdigest()[:32]
+    return f"{embed_part}:{checks_part}"
+
+
+def _checks_part(fingerprint: Optional[str]) -> Optional[str]:
+    return fingerprint.split(":", 1)[1] if fingerprint else None
+
+
+def _tests_hash(test_cases: List[Dict]) -> str:
+    return hashlib.sha256(
+        json.dumps(test_cases, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _load_code_blob(code_hash: str) -> Optional[Dict]:
+    """Cached analysis results shared by every function with the same code body."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT quality_report, verified_status, verified_tests_hash FROM code_blobs WHERE code_hash = ?",
+            (code_hash,),
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "quality_report": json.loads(row[0]) if row[0] else None,
+            "verified_status": row[1],
+            "verified_tests_hash": row[2],
+        }
+    finally:
+        conn.close()
+
+
+def _find_twin_vector(
+    f_name: str, code_hash: str, f_desc: str, f_tags: List[str]
+) -> Optional[list]:
+    """
+    Returns the vector of another function with the same code, description and tags.
+    Only the name line of the embedded text differs, so its vector is reused as-is.
+    """
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            """
+            SELECT e.vector FROM functions f
+            JOIN embeddings e ON e.function_name = f.name AND e.model_name = ?
+            WHERE f.code_hash = ? AND f.name != ? AND f.description = ? AND f.tags = ?
+            LIMIT 1
+        """,
+            (
+                embedding_service.model_name,
+                code_hash,
+                f_name,
+                f_desc,
+                json.dumps(f_tags),
+            ),
+        ).fetchone()
+        return list(row[0]) if row else None
+    finally:
+        conn.close()
+
+
+def _run_verification(
+    f_name: str,
+    f_code: str,
+    f_tests: List[Dict],
+    client: Optional[httpx.Client] = None,
+) -> str:
+    """Runs the test cases on the local execution server and returns the new status."""
+    logger.info(f"Running verification tests for '{f_name}'...")
+    if client is None:
+        with httpx.Client(timeout=35.0) as own_client:
+            return _run_verification(f_name, f_code, f_tests, own_client)
+    try:
+        # Assuming main.py is running on 8080 locally for verification
+        exec_url = "http://localhost:8080/execute"
+        # Note: In a real deploy, orchestration might point to a specific internal URL
+
+        resp = client.post(
+            exec_url,
+            json={"code": f_code, "test_cases": f_tests},
+            headers={
+                "X-API-Key": "PRO-MOCK-KEY-123"
+            },  # Mock key for local verification
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            if data.get("status") == "success":
+                logger.info(f"Tests passed for '{f_name}'.")
+                return "verified"
+            logger.warning(f"Tests failed for '{f_name}': {data.get('error')}")
+            return "failed"
+        logger.error(f"Execution server error ({resp.status_code}) for '{f_name}'")
+        return "error_internal"
+    except Exception as e:
+        logger.error(f"Failed to call execution server: {e}")
+        return "error_internal"
 
+
+def _fingerprint_write(
+    f_name: str, fingerprint: str, code_hash: str, saved_at: Optional[str] = None
+) -> Callable:
+    def _write(conn):
+        if not _holds_save(conn, f_name, code_hash, saved_at):
+            return
+        conn.execute(
+            "UPDATE functions SET content_fingerprint = ? WHERE name = ? AND code_hash = ?",
+            (fingerprint, f_name, code_hash),
+        )
+
+    return _write
+
+
+def _holds_save(conn, f_name: str, code_hash: str, saved_at: Optional[str]) -> bool:
+    """
+    Whether the row still holds the code (and, if given, the save) a result was
+    computed for. A newer save has its own maintenance; a stale result must not land.
+    """
+    row = conn.execute(
+        "SELECT json_extract_string(metadata, '$.saved_at') FROM functions "
+        "WHERE name = ? AND code_hash = ?",
+        (f_name, code_hash),
+    ).fetchone()
+    if row is None or (saved_at is not None and row[0] != saved_at):
+        logger.info(
+            f"Skipping stale result for '{f_name}': superseded by a newer save."
+        )
+        return False
+    return True
+
+
+def _stored_report(blob: Dict, f_code: str, f_deps) -> Optional[Dict]:
+    """
+    The quality report recorded for a code body, if it was computed for this exact
+    code and dependency list with the current tool versions and scoring policy.
+    """
+    report = blob.get("quality_report")
+    if not report or report.get("dependencies") != f_deps:
+        return None
+    if not quality_gate.is_complete(report):
+        return None
+    if report.get("report_key") != quality_gate.report_key(f_code, f_deps):
+        return None
+    return report
+
+
+def _check_content(
+    f_name,
+    f_code,
+    f_desc,
+    f_deps,
+    f_tests,
+    skip_verify,
+    code_hash: str,
+    fingerprint: Optional[str],
+    client: Optional[httpx.Client] = None,
+    report: Optional[Dict] = None,
+    saved_at: Optional[str] = None,
+) -> Callable:
+    """
+    Quality gate + tests for one function; returns the DB write recording the verdict.
+    A report computed up front (batch scoring) is used as-is. The verdict is only
+    recorded on the function row while it still holds this code (and save).
+    """
+    blob = _load_code_blob(code_hash) or {}
+
+    # 2. Quality Gate (safety findings depend on the dependency list too)
+    if report is None:
+        report = _stored_report(blob, f_code, f_deps)
+    if report is None:
+        report = quality_gate.check_score_only(f_name, f_code, f_desc, f_deps)
+        report["dependencies"] = f_deps
+        report["report_key"] = quality_gate.report_key(f_code, f_deps)
+
+    # 3. Test Execution (Phase 2: Verified-First Enforcement)
+    status = "verified"
+    verification = None  # (status, tests_hash) to remember for this code body
+    if f_tests and not skip_verify:
+        tests_hash = _tests_hash(f_tests)
+        if blob.get("verified_tests_hash") == tests_hash and blob.get(
+            "verified_status"
+        ) in ("verified", "failed"):
+            logger.info(f"Reusing verification result for '{f_name}'.")
+            status = blob["verified_status"]
+        else:
+            status = _run_verification(f_name, f_code, f_tests, client)
+            if status in ("verified", "failed"):
+                verification = (status, tests_hash)
+    elif not f_tests and not skip_verify:
+        # If no tests provided, we can't fully "verify" in the new policy, but let's mark as pending_tests
+        status = "pending_tests"
+
+    if status == "error_internal" or not quality_gate.is_complete(report):
+        # Not a verdict on the content; leave it eligible for a retry on re-save.
+        fingerprint = None
+
+    # 4. Update DuckDB Status
+    def _write(conn):
+        if _holds_save(conn, f_name, code_hash, saved_at):
+            row = conn.execute(
+                "SELECT metadata FROM functions WHERE name = ?", (f_name,)
+            ).fetchone()
+            metadata = json.loads(row[0]) if row and row[0] else {}
+            metadata["quality_score"] = report["final_score"]
             conn.execute(
-                """
-                INSERT OR REPLACE INTO functions (name, code, description, tags, metadata, test_cases, status, created_at, updated_at) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+                "UPDATE functions SET status = ?, metadata = ?, updated_at = ?, content_fingerprint = ? "
+                "WHERE name = ? AND code_hash = ?",
                 (
-                    asset_name,
-                    code,
-                    description,
-                    json.dumps(tags),
+                    status,
                     json.dumps(metadata),
-                    json.dumps(test_cases),
-                    initial_status,
-                    now,
-                    now,
+                    datetime.now(),
+                    fingerprint,
+                    f_name,
+                    code_hash,
                 ),
             )
-            conn.commit()
-        finally:
-            conn.close()
+        # Results keyed by code body stay valid whoever holds that body now.
+        if quality_gate.is_complete(report):
+            # A timed-out or failed stage scored with its fallback; never reuse that.
+            conn.execute(
+                "UPDATE code_blobs SET quality_report = ? WHERE code_hash = ?",
+                (json.dumps(report), code_hash),
+            )
+        if verification:
+            conn.execute(
+                "UPDATE code_blobs SET verified_status = ?, verified_tests_hash = ? WHERE code_hash = ?",
+                (*verification, code_hash),
+            )
 
-    task_worker.add_task(
-        run_background_maintenance,
-        asset_name,
-        code,
-        description,
-        tags,
-        dependencies,
-        test_cases,
-        skip_test,
-    )
-    return f"SUCCESS: '{asset_name}' saved locally. Background verification started."
+    return _write
 
 
-def run_background_maintenance(
-    f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify
+@task_worker.register_durable
+def run_index_maintenance(f_name, f_code, f_desc, f_tags, fingerprint=None):
+    """
+    IO lane: embeds the function and upserts its vector. A fingerprint is only
+    passed for re-embed-only saves, whose stored verdict is otherwise kept.
+    """
+    try:
+        code_hash = compute_code_hash(f_code)
+        v_list = _find_twin_vector(f_name, code_hash, f_desc, f_tags)
+        if v_list is None:
+            txt = _embedding_text(f_name, f_desc, f_tags, f_code)
+            emb = embedding_service.get_embedding(txt)
+            v_list = emb.tolist()
+        get_vector_db().upsert_function(
+            f_name,
+            v_list,
+            {"name": f_name, "model_name": embedding_service.model_name},
+        )
+        if fingerprint:
+            db_writer.execute(_fingerprint_write(f_name, fingerprint, code_hash))
+    except Exception as e:
+        logger.error(f"Background Indexing Error for '{f_name}': {e}")
+
+
+@task_worker.register_durable
+def run_check_maintenance(
+    f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify, saved_at=None
 ):
-    """Local indexing + background tasks (Test Execution)."""
+    """
+    CPU/test lane: Quality Gate + Test Execution, then records the verdict.
+    Results already recorded for the same code body are reused instead of recomputed.
+    """
     try:
-        # 1. Vector Database Indexing
-        txt = f"Name: {f_name}\nDesc: {f_desc}\nTags: {f_tags}\nCode:\n{f_code[:500]}"
-        emb = embedding_service.get_embedding(txt)
-        v_list = emb.tolist()
-        get_vector_db().upsert_function(f_name, v_list, {"name": f_name})
-
-        # 2. Test Execution (Phase 2: Verified-First Enforcement)
-        status = "verified"
-        if f_tests and not skip_verify:
-            logger.info(f"Running verification tests for '{f_name}'...")
+        code_hash = compute_code_hash(f_code)
+        fingerprint = _content_fingerprint(
+            f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify
+        )
+        db_writer.execute(
+            _check_content(
+                f_name,
+                f_code,
+                f_desc,
+                f_deps,
+                f_tests,
+                skip_verify,
+                code_hash,
+                fingerprint,
+                saved_at=saved_at,
+            )
+        )
+    except Exception as e:
+        logger.error(f"Background Maintenance Error for '{f_name}': {e}")
+
+
+@task_worker.register_durable
+def run_background_maintenance(
+    f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify, reembed_only=False
+):
+    """
+    Local indexing + background tasks (Quality Gate, Test Execution) in sequence.
+    With reembed_only, only the vector is refreshed and the stored verdict is kept.
+    Saves schedule the two stages on separate worker lanes instead.
+    """
+    fingerprint = None
+    if reembed_only:
+        fingerprint = _content_fingerprint(
+            f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify
+        )
+    run_index_maintenance(f_name, f_code, f_desc, f_tags, fingerprint)
+    if not reembed_only:
+        run_check_maintenance(
+            f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify
+        )
+
+
+def _schedule_maintenance(item: Dict, reembed_only: bool) -> None:
+    """
+    Indexing goes to the IO lane and checks to the test lane (CPU lane when no
+    tests will run). Each stream is latest-wins and ordered per function.
+    """
+    name = item["name"]
+    task_worker.add_task(
+        run_index_maintenance,
+        name,
+        item["code"],
+        item["description"],
+        item["tags"],
+        item["fingerprint"] if reembed_only else None,
+        lane="io",
+        coalesce_key=f"index:{name}",
+    )
+    if reembed_only:
+        return
+    runs_tests = bool(item["test_cases"]) and not item["skip_test"]
+    task_worker.add_task(
+        run_check_maintenance,
+        *_maintenance_args(item),
+        _saved_at(item),
+        lane="test" if runs_tests else "cpu",
+        coalesce_key=f"checks:{name}",
+    )
+
+
+@task_worker.register_durable
+def run_batch_maintenance(jobs: List[tuple]):
+    """
+    Maintenance for a batch save. jobs are run_background_maintenance argument
+    tuples followed by reembed_only and the save's saved_at. Vectors come from
+    one embedding request, the checks share one execution-server client, and all
+    verdicts land in one write. Functions saved again since the batch are skipped;
+    their newer save scheduled its own maintenance.
+    """
+    current = _current_saves([job[0] for job in jobs])
+    superseded = [job[0] for job in jobs if current.get(job[0]) != job[8]]
+    if superseded:
+        logger.info(
+            f"Batch Maintenance: Skipping {len(superseded)} functions saved again since."
+        )
+        jobs = [job for job in jobs if current.get(job[0]) == job[8]]
+
+    vector_db = get_vector_db()
+    keyed = []
+    texts, pending = [], []
+    for job in jobs:
+        f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify = job[:7]
+        code_hash = compute_code_hash(f_code)
+        fingerprint = _content_fingerprint(
+            f_name, f_code, f_desc, f_tags, f_deps, f_tests, skip_verify
+        )
+        keyed.append((job, code_hash, fingerprint))
+        twin = _find_twin_vector(f_name, code_hash, f_desc, f_tags)
+        if twin is not None:
+            vector_db.upsert_function(
+                f_name,
+                twin,
+                {"name": f_name, "model_name": embedding_service.model_name},
+            )
+        else:
+            texts.append(_embedding_text(f_name, f_desc, f_tags, f_code))
+            pending.append(f_name)
+
+    # 1. Vector Database Indexing (one request for the whole batch)
+    if texts:
+        try:
+            vectors = embedding_service.get_embeddings(texts)
+            for f_name, vector in zip(pending, vectors):
+                vector_db.upsert_function(
+                    f_name,
+                    [float(x) for x in vector],
+                    {"name": f_name, "model_name": embedding_service.model_name},
+                )
+        except Exception as e:
+            logger.error(f"Batch Maintenance: Embedding failed: {e}")
+
+    # 2. Quality Gate: one run of each tool for every body without a usable report
+    reports = {}
+    unscored = []
+    for job, code_hash, _ in keyed:
+        f_name, f_code, f_deps, reembed = job[0], job[1], job[4], job[7]
+        if reembed:
+            continue
+        report = _stored_report(_load_code_blob(code_hash) or {}, f_code, f_deps)
+        if report is None:
+            unscored.append((f_name, {"code": f_code, "dependencies": f_deps}))
+        else:
+            reports[f_name] = report
+    if unscored:
+        try:
+            scored = quality_gate.check_batch([item for _, item in unscored])
+            for (f_name, item), report in zip(unscored, scored):
+                report["dependencies"] = item["dependencies"]
+                report["report_key"] = quality_gate.report_key(
+                    item["code"], item["dependencies"]
+                )
+                reports[f_name] = report
+        except Exception as e:
+            # Falls back to scoring one by one in _check_content.
+            logger.error(f"Batch Maintenance: Batch quality check failed: {e}")
+
+    # 3-4. Grouped checks, one write for every verdict
+    writes = []
+    with httpx.Client(timeout=35.0) as client:
+        for job, code_hash, fingerprint in keyed:
+            (
+                f_name,
+                f_code,
+                f_desc,
+                f_tags,
+                f_deps,
+                f_tests,
+                skip_verify,
+                reembed,
+                saved_at,
+            ) = job
             try:
-                # Assuming main.py is running on 8080 locally for verification
-                exec_url = "http://localhost:8080/execute"
-                # Note: In a real deploy, orchestration might point to a specific internal URL
-
-                with httpx.Client(timeout=35.0) as client:
-                    resp = client.post(
-                        exec_url,
-                        json={"code": f_code, "test_cases": f_tests},
-                        headers={
-                            "X-API-Key": "PRO-MOCK-KEY-123"
-                        },  # Mock key for local verification
+                if reembed:
+                    writes.append(
+                        _fingerprint_write(f_name, fingerprint, code_hash, saved_at)
                     )
-                    if resp.status_code == 200:
-                        data = resp.json()
-                        if data.get("status") == "success":
-                            logger.info(f"Tests passed for '{f_name}'.")
-                            status = "verified"
-                        else:
-                            logger.warning(
-                                f"Tests failed for '{f_name}': {data.get('error')}"
-                            )
-                            status = "failed"
-                    else:
-                        logger.error(
-                            f"Execution server error ({resp.status_code}) for '{f_name}'"
+                else:
+                    writes.append(
+                        _check_content(
+                            f_name,
+                            f_code,
+                            f_desc,
+                            f_deps,
+                            f_tests,
+                            skip_verify,
+                            code_hash,
+                            fingerprint,
+                            client,
+                            reports.get(f_name),
+                            saved_at,
                         )
-                        status = "error_internal"
+                    )
             except Exception as e:
-                logger.error(f"Failed to call execution server: {e}")
-                status = "error_internal"
-        elif not f_tests and not skip_verify:
-            # If no tests provided, we can't fully "verify" in the new policy, but let's mark as pending_tests
-            status = "pending_tests"
-
-        # 3. Update DuckDB Status
-        with DBWriteLock():
-            conn = get_db_connection()
-            try:
-                conn.execute(
-                    "UPDATE functions SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE name = ?",
-                    (status, f_name),
-                )
-                conn.commit()
-            finally:
-                conn.close()
+                logger.error(f"Background Maintenance Error for '{f_name}': {e}")
 
+    def _write_all(conn):
+        for write in writes:
+            write(conn)
+
+    try:
+        db_writer.execute(_write_all, timeout=300.0)
     except Exception as e:
-        logger.error(f"Background Maintenance Error for '{f_name}': {e}")
+        logger.error(f"Batch Maintenance: Writing results failed: {e}")
+    logger.info(f"Batch Maintenance: Processed {len(jobs)} functions.")
+
 
+def do_search_impl(query: str, limit: int = 5, explain: bool = False):
+    """
+    Pure local search with 'Verified' boosting (one DB round trip).
+    With explain=True, returns {"results", "explain"} where explain holds
+    per-stage timings, candidate counts and which cache layers hit.
+    """
+    search_start = time.perf_counter()
+    # Keyed by model so a model switch never serves vectors of the wrong space.
+    cache_key = f"{embedding_service.model_name}:{query}"
+    start = time.perf_counter()
+    emb = popular_cache.get_embedding_cache(cache_key)
+    cache_lookup_ms = _elapsed_ms(start)
+    embedding_cached = emb is not None
 
-def do_search_impl(query: str, limit: int = 5) -> List[Dict]:
-    """Pure local search with 'Verified' boosting."""
-    emb = embedding_service.get_embedding(query).tolist()
-    search_results = get_vector_db().search(emb, limit=limit)
+    start = time.perf_counter()
+    if emb is None:
+        emb = embedding_service.get_embedding(query).tolist()
+        popular_cache.cache_embedding_if_popular(cache_key, emb)
+    embed_ms = _elapsed_ms(start)
+
+    db_explain = {} if explain else None
+    start = time.perf_counter()
+    search_results = get_vector_db().search(
+        emb, limit=limit, verified_boost=VERIFIED_BOOST, explain=db_explain
+    )
+    db_ms = _elapsed_ms(start)
 
     results = []
-    conn = get_db_connection()
-    try:
-        for point in search_results:
-            p = point.payload
-            name = p.get("name")
+    for point in search_results:
+        p = point.payload
+        results.append(
+            {
+                "name": p["name"],
+                "score": float(point.score),
+                "status": p.get("status") or "unknown",
+                "description": p.get("description", ""),
+                "quality_score": p.get("quality_score"),
+                "call_count": p.get("call_count", 0),
+                "tags": json.loads(p["tags"]) if p.get("tags") else [],
+            }
+        )
+    if not explain:
+        return results
 
-            # Fetch status for badge/boosting
-            row = conn.execute(
-                "SELECT status FROM functions WHERE name = ?", (name,)
-            ).fetchone()
-            status = row[0] if row else "unknown"
+    stages = db_explain.get("stages", {})
+    candidates = db_explain.get("candidates", {})
+    return {
+        "results": results,
+        "explain": {
+            "timings_ms": {
+                "cache_lookup": cache_lookup_ms,
+                "embed": embed_ms,
+                "connect": db_explain.get("connect_ms"),
+                "vector_scan": stages.get("vector_scan_ms"),
+                "join": stages.get("join_ms"),
+                "rerank": stages.get("rerank_ms"),
+                "db_other": stages.get("other_ms"),
+                "db_total": db_ms,
+                "total": _elapsed_ms(search_start),
+            },
+            "candidates": {
+                "scanned": candidates.get("scanned"),
+                "joined": candidates.get("joined"),
+                "returned": len(results),
+            },
+            "cache_hits": {"query_embedding": embedding_cached},
+        },
+    }
 
-            # Boost score if verified
-            score = float(point.score)
-            if status == "verified":
-                score *= 1.2  # 20% boost for verified functions
 
-            results.append(
-                {
-                    "name": name,
-                    "score": score,
-                    "status": status,
-                    "description": p.get("description", ""),
-                }
-            )
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
 
-        # Re-sort based on boosted score
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:limit]
-    finally:
-        conn.close()
 
+# Transitive closure over metadata.internal_dependencies. UNION (not UNION ALL)
+# keeps each function once, so the walk is linear in the reachable graph even
+# with shared dependencies and stops on cycles.
+_BUNDLE_MEMBERS_SQL = """
+    WITH RECURSIVE closure(name) AS (
+        SELECT ?::VARCHAR
+        UNION
+        SELECT unnest(json_extract_string(f.metadata, '$.internal_dependencies[*]'))
+        FROM closure c JOIN functions f ON f.name = c.name
+    )
+    SELECT f.name, f.code_hash,
+           json_extract_string(f.metadata, '$.internal_dependencies[*]')
+    FROM closure c JOIN functions f ON f.name = c.name
+"""
 
-def _resolve_bundle(name: str, visited: Set[str], codes: List[str]):
-    """Local bottom-up dependency resolution."""
-    if name in visited:
-        return
-    visited.add(name)
+
+def _dependency_order(deps: Dict[str, List[str]]) -> List[str]:
+    """
+    Orders functions so every dependency precedes the functions that need it
+    (Kahn's algorithm, ties by name). A cycle is broken at its smallest name.
+    """
+    deps = {n: {d for d in ds if d in deps and d != n} for n, ds in deps.items()}
+    dependents: Dict[str, List[str]] = {n: [] for n in deps}
+    for n, ds in deps.items():
+        for d in ds:
+            dependents[d].append(n)
+    waiting = {n: len(ds) for n, ds in deps.items()}
+    ready = [n for n, count in waiting.items() if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while len(order) < len(deps):
+        if not ready:
+            # Only cycles remain; release the smallest name still waiting.
+            stuck = min(n for n, count in waiting.items() if count > 0)
+            waiting[stuck] = 0
+            heapq.heappush(ready, stuck)
+        n = heapq.heappop(ready)
+        waiting[n] = -1
+        order.append(n)
+        for m in dependents[n]:
+            if waiting[m] > 0:
+                waiting[m] -= 1
+                if waiting[m] == 0:
+                    heapq.heappush(ready, m)
+    return order
+
+
+def _resolve_bundle(name: str) -> str:
+    """Local bottom-up dependency resolution (one connection, cached by member versions)."""
     conn = get_db_connection()
     try:
-        row = conn.execute(
-            "SELECT code, metadata FROM functions WHERE name = ?", (name,)
-        ).fetchone()
-        if row:
-            code, meta_json = row
-            meta = json.loads(meta_json)
-            for dep in meta.get("internal_dependencies", []):
-                _resolve_bundle(dep, visited, codes)
-            codes.append(f"# --- {name} ---\n{code}")
+        rows = conn.execute(_BUNDLE_MEMBERS_SQL, (name,)).fetchall()
+        if not rows:
+            return ""
+        code_hashes = {r[0]: r[1] for r in rows}
+        order = _dependency_order({r[0]: r[2] or [] for r in rows})
+        members = [(n, code_hashes[n]) for n in order]
+
+        key = BundleCache.fingerprint(members)
+        bundle = bundle_cache.get(key)
+        if bundle is not None:
+            return bundle
+
+        names = [m[0] for m in members]
+        codes = dict(
+            conn.execute(
+                f"SELECT f.name, {CODE_SQL} FROM functions f {CODE_JOIN_SQL} WHERE list_contains(?, f.name)",
+                (names,),
+            ).fetchall()
+        )
+        bundle = "\n\n".join(f"# --- {n} ---\n{codes[n]}" for n in names)
+        bundle_cache.put(key, bundle)
+        return bundle
     finally:
         conn.close()
 
@@ -249,15 +1017,13 @@ def _resolve_bundle(name: str, visited: Set[str], codes: List[str]):
 def do_get_impl(asset_name: str, integrate_dependencies: bool = False) -> str:
     """Local retrieval."""
     if integrate_dependencies:
-        visited = set()
-        codes = []
-        _resolve_bundle(asset_name, visited, codes)
-        return "\n\n".join(codes) if codes else "Not found."
+        return _resolve_bundle(asset_name) or "Not found."
 
     conn = get_db_connection()
     try:
         row = conn.execute(
-            "SELECT code FROM functions WHERE name = ?", (asset_name,)
+            f"SELECT {CODE_SQL} FROM functions f {CODE_JOIN_SQL} WHERE f.name = ?",
+            (asset_name,),
         ).fetchone()
         return row[0] if row else f"Function '{asset_name}' not found."
     finally:
@@ -268,7 +1034,10 @@ def do_get_details_impl(name: str) -> Dict:
     """Gets full metadata for a local function."""
     conn = get_db_connection()
     try:
-        sql = "SELECT name, status, description, tags, call_count, last_called_at, code, metadata FROM functions WHERE name = ?"
+        sql = f"""
+            SELECT f.name, f.status, f.description, f.tags, f.call_count, f.last_called_at, {CODE_SQL}, f.metadata
+            FROM functions f {CODE_JOIN_SQL} WHERE f.name = ?
+        """
         row = conn.execute(sql, [name]).fetchone()
         if not row:
             return {"error": f"Function '{name}' not found"}
@@ -278,7 +1047,7 @@ def do_get_details_impl(name: str) -> Dict:
             "description": row[2],
             "tags": json.loads(row[3]) if row[3] else [],
             "call_count": row[4],
-            "last_called_at": row[5],
+            "last_called_at": row[5].isoformat() if row[5] else None,
             "code": row[6],
             "metadata": json.loads(row[7]) if row[7] else {},
         }
@@ -288,97 +1057,180 @@ def do_get_details_impl(name: str) -> Dict:
 
 def do_delete_impl(asset_name: str) -> str:
     """Local deletion."""
-    with DBWriteLock():
-        conn = get_db_connection()
-        try:
-            conn.execute(
-                "DELETE FROM embeddings WHERE function_name = ?", (asset_name,)
-            )
-            conn.execute("DELETE FROM functions WHERE name = ?", (asset_name,))
-            get_vector_db().delete(asset_name)
-            conn.commit()
-            return f"SUCCESS: Function '{asset_name}' deleted locally."
-        finally:
-            conn.close()
+
+    def _write(conn):
+        conn.execute("DELETE FROM embeddings WHERE function_name = ?", (asset_name,))
+        conn.execute("DELETE FROM functions WHERE name = ?", (asset_name,))
+
+    db_writer.execute(_write)
+    return f"SUCCESS: Function '{asset_name}' deleted locally."
 
 
 def do_list_impl(limit: int = 100) -> List[Dict]:
-    """Local listing."""
+    """Local listing, most recently updated first."""
     conn = get_db_connection()
     try:
         rows = conn.execute(
-            "SELECT name, status, description FROM functions LIMIT ?", (limit,)
+            "SELECT name, status, description FROM functions ORDER BY updated_at DESC NULLS LAST LIMIT ?",
+            (limit,),
         ).fetchall()
         return [{"name": r[0], "status": r[1], "description": r[2]} for r in rows]
     finally:
         conn.close()
 
 
-def do_smart_get_impl(query: str, target_dir: str = "./") -> Dict:
-    """Hybrid: Global Search -> Hub Rerank -> Local Injection."""
-    import asyncio
-
-    loop = asyncio.get_event_loop()
-
-    # 1. Global Semantic Search (Metadata Only)
-    candidates = loop.run_until_complete(global_search.search(query, limit=5))
-    if not candidates:
-        logger.warning("Edge: No global candidates found. Trying local...")
-        candidates = do_search_impl(query, limit=5)
-
-    if not candidates:
-        return {"status": "error", "message": "No candidates found (Global or Local)."}
-
-    selected_name = candidates[0]["name"]
-    # 2. Hub Rerank
+async def _hub_rerank(
+    query: str, candidates: List[Dict], client: httpx.AsyncClient
+) -> Optional[str]:
+    """Asks the Hub to pick the best candidate; None if it cannot decide."""
     try:
         hub_rerank_url = f"{HUB_URL.rstrip('/')}/api/v1/intelligence/rerank/direct"
-        with httpx.Client(timeout=30.0) as client:
-            resp = client.post(
-                hub_rerank_url,
-                json={
-                    "query": query,
-                    "candidates": [
-                        {
-                            "name": c["name"],
-                            "description": c.get("description", ""),
-                            "tags": c.get("tags", []),
-                        }
-                        for c in candidates
-                    ],
-                },
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("selected_name"):
-                    selected_name = data["selected_name"]
-            elif resp.status_code == 429:
-                logger.warning("Edge: Hub reranker rate limited.")
+        resp = await client.post(
+            hub_rerank_url,
+            json={
+                "query": query,
+                "candidates": [
+                    {
+                        "name": c["name"],
+                        "description": c.get("description", ""),
+                        "tags": c.get("tags", []),
+                    }
+                    for c in candidates
+                ],
+            },
+        )
+        if resp.status_code == 200:
+            return resp.json().get("selected_name")
+        elif resp.status_code == 429:
+            logger.warning("Edge: Hub reranker rate limited.")
     except Exception as e:
         logger.warning(f"Edge: Hub Rerank failed: {e}")
+    return None
 
-    # 3. Retrieve FULL CODE (New Step for Security Masking)
-    full_data = loop.run_until_complete(global_search.get_details(selected_name))
-    if not full_data or "code" not in full_data:
-        # Check local if hub fails
-        code = do_get_impl(selected_name)
-    else:
-        code = full_data["code"]
 
+async def _fetch_code(
+    name: str, client: httpx.AsyncClient, version: Optional[str] = None
+) -> Optional[str]:
+    """Full code for a candidate from the Hub, falling back to the local store."""
+    full_data = await global_search.get_details(name, client=client, version=version)
+    if full_data and full_data.get("code"):
+        return full_data["code"]
+    try:
+        code = await run_blocking(do_get_impl, name)
+    except Exception as e:
+        logger.warning(f"Edge: Local lookup for '{name}' failed: {e}")
+        return None
     if not code or "not found" in str(code).lower():
-        return {
-            "status": "error",
-            "message": f"Could not retrieve code for '{selected_name}'",
-        }
+        return None
+    return code
+
+
+async def do_smart_get_async(
+    query: str, target_dir: str = "./", progress: Optional[ProgressTracker] = None
+) -> Dict:
+    """
+    Hybrid: Global Search -> Hub Rerank -> Local Injection.
+    Global and local search run concurrently and code for the top candidates is
+    prefetched while the rerank is in flight. Once SMART_GET_BUDGET seconds have
+    passed, the best-ranked candidate whose code is already in hand is used.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SMART_GET_BUDGET
+
+    def remaining() -> float:
+        return max(0.0, deadline - loop.time())
+
+    tasks = []
+    progress = progress or ProgressTracker(stages=SMART_GET_STAGES)
+
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        tasks.append(task)
+        return task
+
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        try:
+            # 1. Global (metadata only) and local search side by side
+            progress.report("search")
+            global_task = spawn(global_search.search(query, limit=5, client=client))
+            local_task = spawn(run_blocking(do_search_impl, query, limit=5))
+
+            await asyncio.wait({global_task}, timeout=remaining())
+            candidates = global_task.result() if global_task.done() else []
+            if not candidates:
+                logger.warning("Edge: No global candidates found. Trying local...")
+                candidates = await local_task
+
+            if not candidates:
+                return {
+                    "status": "error",
+                    "message": "No candidates found (Global or Local).",
+                }
+
+            # 2. Hub Rerank, with the top candidates' code fetched speculatively
+            progress.report("rerank", 0, len(candidates))
+            ranked = [c["name"] for c in candidates]
+            versions = {c["name"]: c.get("version") for c in candidates}
+            fetches = {
+                name: spawn(_fetch_code(name, client, versions[name]))
+                for name in ranked[:SMART_GET_PREFETCH]
+            }
+            rerank_task = spawn(_hub_rerank(query, candidates, client))
+
+            await asyncio.wait({rerank_task}, timeout=remaining())
+            selected_name = rerank_task.result() if rerank_task.done() else None
+            if not rerank_task.done():
+                logger.warning("Edge: Rerank exceeded latency budget, using top hit.")
+            if selected_name not in ranked:
+                selected_name = ranked[0]
+            if selected_name not in fetches:
+                fetches[selected_name] = spawn(
+                    _fetch_code(selected_name, client, versions[selected_name])
+                )
+
+            # 3. Retrieve FULL CODE: the selection if it lands within budget,
+            # otherwise the best-ranked candidate that is already available.
+            order = [selected_name] + [n for n in ranked if n != selected_name]
+            progress.report("fetch", 0, len(fetches))
+            await asyncio.wait({fetches[selected_name]}, timeout=remaining())
+            chosen, code = None, None
+            for name in order:
+                task = fetches.get(name)
+                if task is not None and task.done() and task.result():
+                    chosen, code = name, task.result()
+                    break
+            if chosen is None:
+                for name in order:
+                    if name in fetches and (code := await fetches[name]):
+                        chosen = name
+                        break
+
+            if not code:
+                return {
+                    "status": "error",
+                    "message": f"Could not retrieve code for '{selected_name}'",
+                }
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
 
     from edge.generator import PackageGenerator
 
-    inject_res = PackageGenerator.inject_package(
-        target_dir, [{"name": selected_name, "code": code}]
+    progress.report("inject")
+    inject_res = await run_blocking(
+        PackageGenerator.inject_package,
+        target_dir,
+        [{"name": chosen, "code": code}],
     )
 
     return {
         "status": "success",
-        "selected_function": selected_name,
+        "selected_function": chosen,
         "injection_summary": inject_res,
     }
+
+
+def do_smart_get_impl(query: str, target_dir: str = "./") -> Dict:
+    """Blocking entry point for callers that are not running an event loop."""
+    return asyncio.run(do_smart_get_async(query, target_dir))
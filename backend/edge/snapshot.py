@@ -0,0 +1,130 @@
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from core.database import (
+    CODE_JOIN_SQL,
+    CODE_SQL,
+    db_writer,
+    get_db_connection,
+    migrate_code_blobs_internal,
+)
+from core.embedding import embedding_service
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+FUNCTIONS_FILE = "functions.parquet"
+EMBEDDINGS_FILE = "embeddings.parquet"
+EMBEDDING_COLUMNS = "function_name, vector, model_name, dimension, encoded_at"
+
+
+def _sql_path(path: Path) -> str:
+    """Quotes a filesystem path for use as a DuckDB string literal."""
+    return "'" + str(path).replace("\\", "/").replace("'", "''") + "'"
+
+
+def export_store(target_dir: str) -> str:
+    """
+    Dumps the `functions` and `embeddings` tables to Parquet files.
+    Vectors are exported as-is so an import does not need to re-embed.
+    """
+    out = Path(target_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    conn = get_db_connection()
+    try:
+        # COPY streams row groups straight from DuckDB, nothing is materialised in Python.
+        # Code bodies are inlined so a snapshot is self-contained.
+        conn.execute(
+            f"COPY (SELECT f.* REPLACE ({CODE_SQL} AS code) FROM functions f {CODE_JOIN_SQL}) "
+            f"TO {_sql_path(out / FUNCTIONS_FILE)} (FORMAT PARQUET)"
+        )
+        conn.execute(
+            f"COPY (SELECT {EMBEDDING_COLUMNS} FROM embeddings) "
+            f"TO {_sql_path(out / EMBEDDINGS_FILE)} (FORMAT PARQUET)"
+        )
+        n_funcs = conn.execute("SELECT count(*) FROM functions").fetchone()[0]
+        n_embs = conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+    finally:
+        conn.close()
+
+    manifest = {
+        "exported_at": datetime.now().isoformat(),
+        "embedding_model": embedding_service.model_name,
+        "functions": n_funcs,
+        "embeddings": n_embs,
+    }
+    with open(out / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Snapshot: Exported {n_funcs} functions to {out}.")
+    return f"SUCCESS: Exported {n_funcs} functions and {n_embs} embeddings to '{out}'."
+
+
+def import_store(source_dir: str) -> str:
+    """
+    Merges a Parquet snapshot produced by `export_store` into the local store
+    in a single writer transaction. Existing functions with the same name are
+    replaced.
+    """
+    src = Path(source_dir)
+    funcs_path = src / FUNCTIONS_FILE
+    embs_path = src / EMBEDDINGS_FILE
+    if not funcs_path.exists():
+        return f"ERROR: '{funcs_path}' not found."
+
+    manifest = {}
+    if (src / MANIFEST_NAME).exists():
+        with open(src / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    # Vectors from another model are useless here; recovery will re-embed instead.
+    source_model = manifest.get("embedding_model", embedding_service.model_name)
+    import_vectors = embs_path.exists() and source_model == embedding_service.model_name
+    if embs_path.exists() and not import_vectors:
+        logger.warning(
+            f"Snapshot: Embedding model mismatch ({source_model}), skipping vectors."
+        )
+
+    def _import(conn):
+        conn.execute(
+            f"INSERT OR REPLACE INTO functions BY NAME "
+            f"SELECT * FROM read_parquet({_sql_path(funcs_path)})"
+        )
+        n_funcs = conn.execute(
+            f"SELECT count(*) FROM read_parquet({_sql_path(funcs_path)})"
+        ).fetchone()[0]
+        migrate_code_blobs_internal(conn)
+
+        n_embs = 0
+        if import_vectors:
+            conn.execute(
+                f"""
+                DELETE FROM embeddings WHERE function_name IN (
+                    SELECT function_name FROM read_parquet({_sql_path(embs_path)})
+                )
+            """
+            )
+            conn.execute(
+                f"INSERT INTO embeddings ({EMBEDDING_COLUMNS}) "
+                f"SELECT {EMBEDDING_COLUMNS} FROM read_parquet({_sql_path(embs_path)})"
+            )
+            n_embs = conn.execute(
+                f"SELECT count(*) FROM read_parquet({_sql_path(embs_path)})"
+            ).fetchone()[0]
+        return n_funcs, n_embs
+
+    # Through the writer, so fire-and-forget writes queue behind the import
+    # instead of timing out on the lock it would otherwise hold.
+    try:
+        n_funcs, n_embs = db_writer.execute(_import, timeout=None)
+    except Exception as e:
+        logger.error(f"Snapshot: Import from {src} failed: {e}")
+        return f"ERROR: Import failed: {e}"
+
+    logger.info(f"Snapshot: Imported {n_funcs} functions from {src}.")
+    return (
+        f"SUCCESS: Imported {n_funcs} functions and {n_embs} embeddings from '{src}'."
+    )
@@ -6,10 +6,19 @@ from typing import Dict, Optional
 import httpx
 import git
 from core import config
-from core.database import DBWriteLock, get_db_connection
+from core.database import (
+    CODE_JOIN_SQL,
+    CODE_SQL,
+    db_writer,
+    get_db_connection,
+    normalize_code,
+    store_code_blob,
+)
 
 logger = logging.getLogger(__name__)
 
+SYNC_PULL_STAGES = ["pull", "parse", "merge"]
+
 
 class GitHubSyncEngine:
     """
@@ -50,12 +59,18 @@ class GitHubSyncEngine:
             logger.error(f"Sync: Unexpected error during repo init: {e}")
             return False
 
-    def pull(self) -> int:
-        """Fetch latest from Hub and merge into local DB."""
+    def pull(self, progress=None) -> int:
+        """
+        Fetch latest from Hub and merge into local DB.
+        With a progress tracker, reports the pull/parse/merge stages and stops at
+        the next file if cancelled; the merge is all-or-nothing.
+        """
         if not self.ensure_repo():
             return 0
 
         logger.info("Sync: Pulling latest changes from Hub...")
+        if progress:
+            progress.report("pull")
         try:
             origin = self._repo.remotes.origin
             origin.pull()
@@ -63,51 +78,58 @@ class GitHubSyncEngine:
             logger.warning(f"Sync: Pull failed (likely conflict or network error): {e}")
             # Continue to parse whatever we have locally
 
-        count = 0
         if not self.functions_dir.exists():
             return 0
 
-        with DBWriteLock():
-            conn = get_db_connection()
+        incoming = []
+        json_files = list(self.functions_dir.glob("*.json"))
+        for i, json_file in enumerate(json_files):
+            if progress:
+                progress.check_cancelled()
+                progress.report("parse", i, len(json_files))
             try:
-                for json_file in self.functions_dir.glob("*.json"):
-                    try:
-                        with open(json_file, "r", encoding="utf-8") as f:
-                            data = json.load(f)
-
-                        name = data.get("name")
-                        if not name:
-                            continue
-
-                        # If code or description changed, update
-                        res = conn.execute(
-                            "SELECT code, description FROM functions WHERE name = ?",
-                            (name,),
-                        ).fetchone()
-                        if (
-                            not res
-                            or res[0] != data.get("code")
-                            or res[1] != data.get("description")
-                        ):
-                            logger.info(f"Sync: Updating '{name}' (detected changes)")
-                            self._upsert_function(conn, data)
-                            count += 1
-                    except Exception as fe:
-                        logger.error(f"Sync: Failed to parse {json_file.name}: {fe}")
-                conn.commit()
-            finally:
-                conn.close()
+                with open(json_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("name"):
+                    incoming.append(data)
+            except Exception as fe:
+                logger.error(f"Sync: Failed to parse {json_file.name}: {fe}")
+
+        def _merge(conn) -> int:
+            updated = 0
+            for i, data in enumerate(incoming):
+                if progress:
+                    progress.check_cancelled()
+                    progress.report("merge", i, len(incoming))
+                name = data["name"]
+                # If code or description changed, update
+                res = conn.execute(
+                    f"SELECT {CODE_SQL}, f.description FROM functions f {CODE_JOIN_SQL} WHERE f.name = ?",
+                    (name,),
+                ).fetchone()
+                if (
+                    not res
+                    or normalize_code(res[0] or "")
+                    != normalize_code(data.get("code") or "")
+                    or res[1] != data.get("description")
+                ):
+                    logger.info(f"Sync: Updating '{name}' (detected changes)")
+                    self._upsert_function(conn, data)
+                    updated += 1
+            return updated
+
+        count = db_writer.execute(_merge, timeout=300.0)
 
         logger.info(f"Sync: Pull complete. Updated {count} functions.")
         return count
 
     def _upsert_function(self, conn, data: Dict):
         """Helper to upsert function data into DuckDB."""
-        now = datetime.now().isoformat()
+        now = datetime.now()
 
         # Check if exists
         row = conn.execute(
-            "SELECT id FROM functions WHERE name = ?", (data["name"],)
+            "SELECT name FROM functions WHERE name = ?", (data["name"],)
         ).fetchone()
 
         tags_json = json.dumps(data.get("tags", []))
@@ -117,34 +139,34 @@ class GitHubSyncEngine:
             "sync_source": "github-hub",
         }
         meta_json = json.dumps(metadata)
+        code_hash = store_code_blob(conn, data["code"])
 
         if row:
-            fid = row[0]
             conn.execute(
                 """
                 UPDATE functions SET 
-                    code = ?, description = ?, 
+                    code = NULL, code_hash = ?, description = ?, 
                     tags = ?, metadata = ?, updated_at = ?
-                WHERE id = ?
+                WHERE name = ?
             """,
                 (
-                    data["code"],
+                    code_hash,
                     data.get("description", ""),
                     tags_json,
                     meta_json,
                     now,
-                    fid,
+                    data["name"],
                 ),
             )
         else:
             conn.execute(
                 """
-                INSERT INTO functions (name, code, description, tags, metadata, created_at, updated_at)
+                INSERT INTO functions (name, code_hash, description, tags, metadata, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
                 (
                     data["name"],
-                    data["code"],
+                    code_hash,
                     data.get("description", ""),
                     tags_json,
                     meta_json,
@@ -215,9 +237,9 @@ class GitHubSyncEngine:
     def _export_to_cache(self, conn, name: str) -> bool:
         """Helper to export a single function to the local cache dir."""
         row = conn.execute(
-            """
-            SELECT name, code, description, tags, metadata, test_cases 
-            FROM functions WHERE name = ?
+            f"""
+            SELECT f.name, {CODE_SQL}, f.description, f.tags, f.metadata, f.test_cases
+            FROM functions f {CODE_JOIN_SQL} WHERE f.name = ?
         """,
             (name,),
         ).fetchone()
@@ -12,7 +12,7 @@ from pydantic import BaseModel
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from core.config import HOST, PORT
-from hub.orchestrator import (
+from edge.orchestrator import (
     do_delete_impl,
     do_get_details_impl,
     do_list_impl,
@@ -2,7 +2,7 @@ import json
 import logging
 from typing import Dict, List, Optional
 
-from core.database import get_db_connection
+from core.database import CODE_JOIN_SQL, CODE_SQL, get_db_connection
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +41,7 @@ class TriageEngine:
         conn = get_db_connection(read_only=False)
         try:
             # Extract quality_score from metadata JSON column
-            query = "SELECT code, status, CAST(json_extract(metadata, '$.quality_score') AS INTEGER) as qs, metadata FROM functions WHERE name = ?"
+            query = f"SELECT {CODE_SQL}, f.status, CAST(json_extract(f.metadata, '$.quality_score') AS INTEGER) as qs, f.metadata FROM functions f {CODE_JOIN_SQL} WHERE f.name = ?"
             row = conn.execute(query, (name,)).fetchone()
 
             if not row:
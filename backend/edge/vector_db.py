@@ -1,39 +1,104 @@
+import json
 import logging
+import time
+from datetime import datetime
+from typing import Optional
 
-from core.database import get_db_connection
+from core.database import db_writer, get_db_connection
+from core.embedding import embedding_service
 
 logger = logging.getLogger(__name__)
 
 TABLE_NAME = "embeddings"
 
 
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def _profile_breakdown(conn) -> dict:
+    """
+    Buckets DuckDB's per-operator timings for the last query into search stages:
+    vector scan (embeddings scan + similarity projection), join (functions scan +
+    join) and rerank (boosted top-N ordering), plus candidate counts.
+    """
+    tree = json.loads(conn.get_profiling_information(format="json"))
+    stages = {"vector_scan_ms": 0.0, "join_ms": 0.0, "rerank_ms": 0.0, "other_ms": 0.0}
+    counts = {}
+
+    def walk(node):
+        op = node.get("operator_type") or ""
+        seconds = node.get("operator_timing") or 0.0
+        rows = node.get("operator_cardinality")
+        table = str((node.get("extra_info") or {}).get("Table", ""))
+        if "SCAN" in op and TABLE_NAME in table:
+            stage = "vector_scan_ms"
+            counts["scanned"] = rows
+        elif "SCAN" in op or "JOIN" in op:
+            stage = "join_ms"
+            if "JOIN" in op:
+                counts["joined"] = rows
+        elif op in ("TOP_N", "ORDER_BY"):
+            stage = "rerank_ms"
+        elif op in ("PROJECTION", "FILTER"):
+            stage = "vector_scan_ms"
+        else:
+            stage = "other_ms"
+        if op:
+            stages[stage] += seconds * 1000
+        for child in node.get("children", []):
+            walk(child)
+
+    walk(tree)
+    return {
+        "stages": {k: round(v, 3) for k, v in stages.items()},
+        "candidates": counts,
+    }
+
+
 class VectorDB:
     def __init__(self):
         logger.info("VectorDB: Initialized using DuckDB backend.")
 
     def upsert_function(self, function_name: str, vector: list, metadata: dict):
+        model_name = metadata.get("model_name", embedding_service.model_name)
+        encoded_at = datetime.now()
+
+        def _write(conn):
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO embeddings (function_name, vector, model_name, dimension, encoded_at)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+                (function_name, vector, model_name, len(vector), encoded_at),
+            )
+
         try:
-            conn = get_db_connection()
-            try:
-                model_name = metadata.get("model_name", "unknown")
-                dim = len(vector)
-                conn.execute(
-                    """
-                    INSERT OR REPLACE INTO embeddings (function_name, vector, model_name, dimension, encoded_at)
-                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-                """,
-                    (function_name, vector, model_name, dim),
-                )
-                conn.commit()
-            finally:
-                conn.close()
+            db_writer.execute(_write)
         except Exception as e:
             logger.error(f"VectorDB: Upsert failed: {e}")
 
-    def search(self, vector: list, limit: int = 10) -> list:
+    def search(
+        self,
+        vector: list,
+        limit: int = 10,
+        verified_boost: float = 1.0,
+        explain: Optional[dict] = None,
+    ) -> list:
+        """
+        Scores, boosts and ranks in one query; status, quality, call_count and
+        tags come back in the payload so callers need no follow-up lookups.
+        Pass an `explain` dict to have it filled with connection/query timings
+        and the per-stage breakdown from DuckDB's profiler.
+        """
         try:
-            conn = get_db_connection(read_only=True)
+            start = time.perf_counter()
+            conn = get_db_connection()
+            if explain is not None:
+                explain["connect_ms"] = _elapsed_ms(start)
+                conn.execute("PRAGMA enable_profiling = 'no_output'")
             try:
+                start = time.perf_counter()
                 results = conn.execute(
                     """
                     SELECT 
@@ -41,14 +106,25 @@ class VectorDB:
                         f.description,
                         f.tags,
                         f.metadata,
-                        list_cosine_similarity(e.vector, ?::FLOAT[]) as score
+                        f.status,
+                        f.call_count,
+                        CAST(json_extract(f.metadata, '$.quality_score') AS INTEGER) AS quality_score,
+                        list_cosine_similarity(e.vector, ?::FLOAT[])
+                            * CASE WHEN f.status = 'verified' THEN ? ELSE 1.0 END AS score
                     FROM embeddings e
                     JOIN functions f ON e.function_name = f.name
+                    WHERE e.model_name = ?
                     ORDER BY score DESC
                     LIMIT ?
                     """,
-                    (vector, limit),
+                    (vector, verified_boost, embedding_service.model_name, limit),
                 ).fetchall()
+                if explain is not None:
+                    explain["query_ms"] = _elapsed_ms(start)
+                    try:
+                        explain.update(_profile_breakdown(conn))
+                    except Exception as e:
+                        logger.debug(f"VectorDB: Profiling unavailable: {e}")
 
                 class ScoredPoint:
                     def __init__(self, id, score, payload):
@@ -59,12 +135,15 @@ class VectorDB:
                 return [
                     ScoredPoint(
                         id=r[0],  # function_name
-                        score=r[4],
+                        score=r[7],
                         payload={
                             "name": r[0],
                             "description": r[1],
                             "tags": r[2],
                             "metadata": r[3],
+                            "status": r[4],
+                            "call_count": r[5],
+                            "quality_score": r[6],
                         },
                     )
                     for r in results
@@ -77,14 +156,11 @@ class VectorDB:
 
     def delete(self, function_name: str):
         try:
-            conn = get_db_connection()
-            try:
-                conn.execute(
+            db_writer.execute(
+                lambda conn: conn.execute(
                     "DELETE FROM embeddings WHERE function_name = ?", (function_name,)
                 )
-                conn.commit()
-            finally:
-                conn.close()
+            )
         except Exception as e:
             logger.error(f"VectorDB: Delete failed: {e}")
 
@@ -1,15 +1,121 @@
+import json
 import logging
-import queue
 import threading
 import time
-from typing import Callable
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Optional
+
+from core.config import (
+    TASK_MAX_ATTEMPTS,
+    TASK_REPLAY_BATCH,
+    WORKER_BULK_CONCURRENCY,
+    WORKER_LANES,
+)
+from core.database import db_writer, get_db_connection
 
 logger = logging.getLogger(__name__)
 
+# Priority classes, highest first
+PRIORITIES = ("interactive", "bulk")
+
+
+class Histogram:
+    """Latency histogram with fixed millisecond buckets (upper bounds, last is open)."""
+
+    BUCKETS_MS = (10, 50, 100, 500, 1000, 5000, 30000, 120000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        idx = next(
+            (i for i, bound in enumerate(self.BUCKETS_MS) if ms <= bound),
+            len(self.BUCKETS_MS),
+        )
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+    def to_dict(self) -> dict:
+        labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [
+            f">{self.BUCKETS_MS[-1]}ms"
+        ]
+        return {**self.summary(), "buckets": dict(zip(labels, self.counts))}
+
+
+class LaneQueue:
+    """
+    Run queue of one lane. Interactive entries are always handed out before bulk
+    ones, and at most `bulk_limit` bulk entries run at a time so the remaining
+    threads stay free for interactive work.
+    """
+
+    def __init__(self, bulk_limit: int):
+        self.bulk_limit = max(1, bulk_limit)
+        self.bulk_running = 0
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def put(self, entry) -> None:
+        with self._cond:
+            self._queues[entry["priority"]].append(entry)
+            self._cond.notify()
+
+    def get(self):
+        """Blocks until an entry may be dispatched. A closed queue hands out nothing."""
+        with self._cond:
+            while True:
+                if not self.closed:
+                    if self._queues["interactive"]:
+                        return self._queues["interactive"].popleft()
+                    if self._queues["bulk"] and self.bulk_running < self.bulk_limit:
+                        self.bulk_running += 1
+                        return self._queues["bulk"].popleft()
+                self._cond.wait()
+
+    def task_done(self, entry) -> None:
+        if entry["priority"] == "bulk":
+            with self._cond:
+                self.bulk_running -= 1
+                self._cond.notify()
+
+    def qsize(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+
 
 class AsyncTaskWorker:
     """
-    Singleton Worker that serializes all background tasks to prevent DB lock contention.
+    Singleton Worker that runs background tasks on separate lanes (io, cpu, test,
+    db), each with its own queue and thread count, so a slow test run cannot hold
+    up embedding. Tasks sharing an order key run one at a time in submission
+    order, whichever lane they are on. Within a lane, interactive tasks are
+    dispatched before bulk ones (recovery, batch maintenance, compaction), and
+    bulk tasks only get WORKER_BULK_CONCURRENCY threads per lane.
+
+    Functions registered with `register_durable` are also recorded in the
+    `task_queue` table (state, attempts, timestamps) and replayed on the next
+    startup if the process exits before they finish. Row updates go through
+    the shared DBWriter, so a burst of tasks costs one commit per writer tick.
     """
 
     _instance = None
@@ -23,40 +129,437 @@ class AsyncTaskWorker:
             return cls._instance
 
     def __init__(self):
-        if self._initialized:
+        if getattr(self, "_initialized", False):
             return
-        self.task_queue = queue.Queue()
-        self.worker_thread = threading.Thread(target=self._run_loop, daemon=True)
-        self.worker_thread.start()
+        self.accepting = True
+        self.lanes = {lane: LaneQueue(WORKER_BULK_CONCURRENCY) for lane in WORKER_LANES}
+        # coalesce_key -> newest queued entry for that key
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self.superseded_count = 0
+        # priority -> queue wait of dispatched tasks, measured from add_task
+        self._wait = {priority: Histogram() for priority in PRIORITIES}
+        # task name -> {"wait", "run" histograms, "failures"}
+        self._task_stats = {}
+        # thread name -> the entry it is running
+        self._current = {}
+        # order_key -> entries waiting for the running task with that key
+        self._active_keys = set()
+        self._held = {}
+        self._unfinished = 0
+        self._idle = threading.Condition(self._pending_lock)
+        # task name -> function, for tasks that survive a restart
+        self._durable = {}
+        self.threads = []
+        for lane, concurrency in WORKER_LANES.items():
+            for i in range(max(1, concurrency)):
+                thread = threading.Thread(
+                    target=self._run_loop,
+                    args=(lane,),
+                    name=f"logichive-worker-{lane}-{i}",
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
         self._initialized = True
-        logger.info("AsyncTaskWorker: Singleton worker thread started.")
+        logger.info(
+            f"AsyncTaskWorker: Started lanes {dict(WORKER_LANES)} "
+            f"({len(self.threads)} threads)."
+        )
+
+    def register_durable(self, func: Callable) -> Callable:
+        """Marks a module-level function as replayable after a restart (usable as a decorator)."""
+        self._durable[func.__name__] = func
+        return func
+
+    def add_task(
+        self,
+        func: Callable,
+        *args,
+        lane: str = "io",
+        priority: str = "interactive",
+        coalesce_key: Optional[str] = None,
+        order_key: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Adds a task to a lane's queue. priority is "interactive" (a user is waiting
+        on the result) or "bulk" (throttled, runs when no interactive task is
+        queued). Tasks sharing a coalesce_key are latest-wins: a newer one
+        supersedes any still-queued task with the same key. Tasks sharing an
+        order_key (defaults to coalesce_key) run one at a time, in the order
+        they were added.
+        """
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown worker lane '{lane}'")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown task priority '{priority}'")
+        entry = {
+            "func": func,
+            "args": args,
+            "kwargs": kwargs,
+            "lane": lane,
+            "priority": priority,
+            "task": getattr(func, "__name__", repr(func)),
+            "key": coalesce_key,
+            "order_key": order_key or coalesce_key,
+        }
+        durable = self._durable.get(entry["task"]) is func
+        if not self.accepting:
+            if durable:
+                # Recorded as queued, so it runs after the restart.
+                self._persist(entry)
+            logger.warning(
+                f"AsyncTaskWorker: Shutting down, not running {entry['task']} now."
+            )
+            return
+        if durable:
+            self._persist(entry)
+        self._enqueue(entry)
 
-    def add_task(self, func: Callable, *args, **kwargs):
-        """Adds a task to the queue."""
-        self.task_queue.put((func, args, kwargs))
+    def shutdown(self, timeout: float) -> bool:
+        """
+        Stops intake and lets queued and running tasks finish for up to `timeout`
+        seconds, then stops dispatching. Durable tasks that did not finish keep
+        their task_queue row and are replayed on the next start. Returns True if
+        everything finished in time.
+        """
+        self.accepting = False
+        drained = self.join(timeout)
+        for lane_queue in self.lanes.values():
+            lane_queue.close()
+        if drained:
+            logger.info("AsyncTaskWorker: Drained all background tasks.")
+        else:
+            with self._pending_lock:
+                running = [entry["task"] for entry in self._current.values()]
+                left = self._unfinished
+            logger.warning(
+                f"AsyncTaskWorker: Shutdown deadline reached with {left} tasks unfinished "
+                f"(running: {running}). Persisted tasks will be replayed on next start."
+            )
+        return drained
+
+    def replay_persisted(self) -> int:
+        """
+        Re-queues durable tasks left unfinished by a previous run, oldest first,
+        TASK_REPLAY_BATCH rows at a time. Tasks that were interrupted
+        TASK_MAX_ATTEMPTS times are marked failed instead of being retried.
+        Replayed tasks run as bulk work.
+        Call once at startup, after the task functions have been registered.
+        """
+
+        def _requeue(conn):
+            conn.execute(
+                "UPDATE task_queue SET state = 'failed', updated_at = ? "
+                "WHERE state != 'failed' AND attempts >= ?",
+                (datetime.now(), TASK_MAX_ATTEMPTS),
+            )
+            conn.execute(
+                "UPDATE task_queue SET state = 'queued' "
+                "WHERE state IN ('running', 'failed') AND attempts < ?",
+                (TASK_MAX_ATTEMPTS,),
+            )
+
+        db_writer.execute(_requeue, timeout=None)
+
+        replayed = 0
+        cursor = (datetime.min, "")
+        conn = get_db_connection()
+        try:
+            while True:
+                # Keyset paging: rows finishing meanwhile must not shift the window.
+                rows = conn.execute(
+                    "SELECT id, task, payload, lane, coalesce_key, order_key, created_at "
+                    "FROM task_queue WHERE state = 'queued' "
+                    "AND (created_at > ? OR (created_at = ? AND id > ?)) "
+                    "ORDER BY created_at, id LIMIT ?",
+                    (cursor[0], cursor[0], cursor[1], TASK_REPLAY_BATCH),
+                ).fetchall()
+                if not rows:
+                    break
+                cursor = (rows[-1][6], rows[-1][0])
+                for task_id, task, payload, lane, key, order_key, _ in rows:
+                    func = self._durable.get(task)
+                    if func is None or lane not in self.lanes:
+                        logger.warning(
+                            f"AsyncTaskWorker: Cannot replay unknown task '{task}'."
+                        )
+                        continue
+                    data = json.loads(payload)
+                    self._enqueue(
+                        {
+                            "func": func,
+                            "args": tuple(data["args"]),
+                            "kwargs": data["kwargs"],
+                            "lane": lane,
+                            "priority": "bulk",
+                            "task": task,
+                            "key": key,
+                            "order_key": order_key,
+                            "task_id": task_id,
+                        }
+                    )
+                    replayed += 1
+        finally:
+            conn.close()
+        if replayed:
+            logger.info(f"AsyncTaskWorker: Replayed {replayed} persisted tasks.")
+        return replayed
+
+    def _persist(self, entry) -> None:
+        try:
+            payload = json.dumps({"args": entry["args"], "kwargs": entry["kwargs"]})
+        except (TypeError, ValueError) as e:
+            logger.warning(
+                f"AsyncTaskWorker: {entry['func'].__name__} arguments are not serialisable, "
+                f"task will not survive a restart: {e}"
+            )
+            return
+        task_id = uuid.uuid4().hex
+        now = datetime.now()
+        row = (
+            task_id,
+            entry["func"].__name__,
+            payload,
+            entry["lane"],
+            entry["key"],
+            entry["order_key"],
+            now,
+            now,
+        )
+        entry["task_id"] = task_id
+        self._write(
+            lambda conn: conn.execute(
+                "INSERT INTO task_queue (id, task, payload, lane, coalesce_key, order_key, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+        )
+
+    def _mark(self, entry, state: Optional[str], error: Optional[str] = None) -> None:
+        """Records a durable task's state change; state None removes a finished row."""
+        task_id = entry.get("task_id")
+        if task_id is None:
+            return
+        now = datetime.now()
+        if state is None:
+            self._write(
+                lambda conn: conn.execute(
+                    "DELETE FROM task_queue WHERE id = ?", (task_id,)
+                )
+            )
+        elif state == "running":
+            self._write(
+                lambda conn: conn.execute(
+                    "UPDATE task_queue SET state = 'running', attempts = attempts + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    (now, task_id),
+                )
+            )
+        else:
+            self._write(
+                lambda conn: conn.execute(
+                    "UPDATE task_queue SET state = ?, last_error = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (state, error, now, task_id),
+                )
+            )
+
+    @staticmethod
+    def _write(op) -> None:
+        # Fire-and-forget: the DBWriter folds queued row updates into one commit.
+        try:
+            db_writer.submit(op)
+        except Exception as e:
+            logger.error(f"AsyncTaskWorker: Could not record task state: {e}")
+
+    def _enqueue(self, entry) -> None:
+        lane, coalesce_key = entry["lane"], entry["key"]
+        entry["added_at"] = time.monotonic()
+        with self._pending_lock:
+            self._unfinished += 1
+            if coalesce_key is not None:
+                stale = self._pending.get(coalesce_key)
+                if stale is not None:
+                    stale["superseded"] = True
+                    self._mark(stale, None)
+                    self.superseded_count += 1
+                    logger.info(
+                        f"AsyncTaskWorker: Superseded queued task for '{coalesce_key}'."
+                    )
+                self._pending[coalesce_key] = entry
+            key = entry["order_key"]
+            if key is not None:
+                if key in self._active_keys:
+                    # Runs once every earlier task with this key has finished.
+                    self._held.setdefault(key, deque()).append(entry)
+                    return
+                self._active_keys.add(key)
+        self.lanes[lane].put(entry)
         logger.debug(
-            f"AsyncTaskWorker: Task added. Queue size: {self.task_queue.qsize()}"
+            f"AsyncTaskWorker: Task added to '{lane}'. Queue size: {self.lanes[lane].qsize()}"
         )
 
-    def _run_loop(self):
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every queued and held task has finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._unfinished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def get_wait_stats(self) -> dict:
+        """Queue wait per priority class: dispatched count, mean and max in ms."""
+        with self._pending_lock:
+            return {priority: h.summary() for priority, h in self._wait.items()}
+
+    def get_stats(self) -> dict:
+        """
+        Snapshot for sizing and spotting stuck work: depth per lane, tasks held
+        behind an order key, wait/run histograms and failures per task type,
+        and what every busy thread is running right now.
+        """
+        now = time.monotonic()
+        lanes = {
+            lane: {
+                "threads": max(1, WORKER_LANES[lane]),
+                "queued": q.qsize(),
+                "bulk_running": q.bulk_running,
+            }
+            for lane, q in self.lanes.items()
+        }
+        with self._pending_lock:
+            return {
+                "lanes": lanes,
+                "held": sum(len(held) for held in self._held.values()),
+                "unfinished": self._unfinished,
+                "superseded": self.superseded_count,
+                "wait_by_priority": {
+                    priority: h.summary() for priority, h in self._wait.items()
+                },
+                "tasks": {
+                    name: {
+                        "wait": st["wait"].to_dict(),
+                        "run": st["run"].to_dict(),
+                        "failures": st["failures"],
+                    }
+                    for name, st in self._task_stats.items()
+                },
+                "running": [
+                    {
+                        "thread": thread,
+                        "task": entry["task"],
+                        "lane": entry["lane"],
+                        "priority": entry["priority"],
+                        "key": entry["order_key"],
+                        "running_s": round(now - entry["started_at"], 1),
+                    }
+                    for thread, entry in self._current.items()
+                ],
+            }
+
+    def log_stats(self) -> None:
+        """One-line summary of get_stats() for the periodic log."""
+        stats = self.get_stats()
+        queued = {lane: s["queued"] for lane, s in stats["lanes"].items()}
+        running = stats["running"]
+        longest = max(running, key=lambda r: r["running_s"], default=None)
+        msg = (
+            f"AsyncTaskWorker: queued={queued} held={stats['held']} "
+            f"running={len(running)}"
+        )
+        if longest:
+            msg += f" longest={longest['task']} ({longest['running_s']}s on '{longest['lane']}')"
+        logger.info(msg)
+
+    def _task_stats_locked(self, task: str) -> dict:
+        st = self._task_stats.get(task)
+        if st is None:
+            st = {"wait": Histogram(), "run": Histogram(), "failures": 0}
+            self._task_stats[task] = st
+        return st
+
+    def _claim(self, entry) -> bool:
+        """False if the entry was superseded while queued."""
+        with self._pending_lock:
+            if entry.get("superseded"):
+                self._finish_locked(entry["order_key"])
+                return False
+            if entry["key"] is not None and self._pending.get(entry["key"]) is entry:
+                del self._pending[entry["key"]]
+            entry["started_at"] = time.monotonic()
+            waited = entry["started_at"] - entry["added_at"]
+            self._wait[entry["priority"]].observe(waited)
+            self._task_stats_locked(entry["task"])["wait"].observe(waited)
+            self._current[threading.current_thread().name] = entry
+        self._mark(entry, "running")
+        return True
+
+    def _release(self, entry, failed: bool) -> None:
+        with self._pending_lock:
+            self._current.pop(threading.current_thread().name, None)
+            st = self._task_stats_locked(entry["task"])
+            st["run"].observe(time.monotonic() - entry["started_at"])
+            if failed:
+                st["failures"] += 1
+            self._finish_locked(entry["order_key"])
+
+    def _finish_locked(self, key: Optional[str]) -> None:
+        """Marks one task finished and hands its key to the next parked entry."""
+        self._unfinished -= 1
+        if key is not None:
+            held = self._held.get(key)
+            while held:
+                nxt = held.popleft()
+                if nxt.get("superseded"):
+                    self._unfinished -= 1
+                    continue
+                # The key stays reserved for this entry until it has run.
+                self.lanes[nxt["lane"]].put(nxt)
+                break
+            else:
+                self._held.pop(key, None)
+                self._active_keys.discard(key)
+        if not self._unfinished:
+            self._idle.notify_all()
+
+    def _run_loop(self, lane: str):
+        lane_queue = self.lanes[lane]
         while True:
             try:
                 # Blocks until a task is available
-                func, args, kwargs = self.task_queue.get()
-                logger.info(f"AsyncTaskWorker: Executing task {func.__name__}...")
-
-                # Execute the task
+                entry = lane_queue.get()
                 try:
-                    func(*args, **kwargs)
-                except Exception as e:
-                    logger.error(
-                        f"AsyncTaskWorker: Task execution failed: {e}", exc_info=True
+                    if not self._claim(entry):
+                        continue
+                    func, args, kwargs = entry["func"], entry["args"], entry["kwargs"]
+                    logger.info(
+                        f"AsyncTaskWorker: Executing task {entry['task']} on '{lane}'..."
                     )
+
+                    # Execute the task
+                    failed = True
+                    try:
+                        func(*args, **kwargs)
+                        failed = False
+                        self._mark(entry, None)
+                    except Exception as e:
+                        logger.error(
+                            f"AsyncTaskWorker: Task execution failed: {e}",
+                            exc_info=True,
+                        )
+                        self._mark(entry, "failed", str(e))
+                    finally:
+                        self._release(entry, failed)
+                        logger.debug(
+                            f"AsyncTaskWorker: Task done. Remaining on '{lane}': {lane_queue.qsize()}"
+                        )
                 finally:
-                    self.task_queue.task_done()
-                    logger.debug(
-                        f"AsyncTaskWorker: Task done. Remaining: {self.task_queue.qsize()}"
-                    )
+                    lane_queue.task_done(entry)
             except Exception as e:
                 logger.error(f"AsyncTaskWorker: Loop error: {e}")
                 time.sleep(1)
@@ -4,8 +4,14 @@ import os
 import numpy as np
 import pytest
 from core import config as mcp_config
-from core.database import init_db
+from core.database import db_writer, init_db
 from core.embedding import embedding_service
+from core.quality import QualityReportCache
+from core.vuln_db import vuln_db
+from edge import orchestrator
+from edge.cache import HubCodeCache
+from edge.global_search import global_search
+from edge.worker import task_worker
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -29,6 +35,21 @@ def setup_db_isolation(monkeypatch, tmp_path):
     monkeypatch.setattr(mcp_config, "API_KEYS_DB_PATH", test_keys_path)
     # Disable features that are non-deterministic or slow in tests
     monkeypatch.setattr(mcp_config, "SYNC_ENABLED", False)
+    # Keep on-disk caches out of the real DATA_DIR (module singletons captured
+    # their paths at import time, so point those at tmp_path as well)
+    monkeypatch.setattr(mcp_config, "QUALITY_CACHE_DIR", tmp_path / "quality_cache")
+    monkeypatch.setattr(mcp_config, "HUB_CODE_CACHE_DIR", tmp_path / "hub_code")
+    monkeypatch.setattr(mcp_config, "VULN_DB_PATH", tmp_path / "vuln_db.json")
+    monkeypatch.setattr(
+        orchestrator.quality_gate,
+        "cache",
+        QualityReportCache(tmp_path / "quality_cache"),
+    )
+    monkeypatch.setattr(
+        global_search, "code_cache", HubCodeCache(tmp_path / "hub_code")
+    )
+    monkeypatch.setattr(vuln_db, "path", tmp_path / "vuln_db.json")
+    monkeypatch.setattr(vuln_db, "_index", None)
     # 2. Mock Embedding Service to avoid slow model loading/downloading
     monkeypatch.setattr(
         embedding_service,
@@ -59,7 +80,12 @@ def setup_db_isolation(monkeypatch, tmp_path):
 
     yield
 
-    # 5. Cleanup
+    # 6. Let background tasks and buffered writes land in this test's DB before
+    # monkeypatch restores the real paths
+    task_worker.join(timeout=30)
+    db_writer.flush()
+
+    # 7. Cleanup
     gc.collect()
     try:
         if os.path.exists(test_db_path):
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+from edge import orchestrator
+from edge.orchestrator import do_smart_get_async, run_blocking
+
+
+async def test_run_blocking_keeps_event_loop_free():
+    release = threading.Event()
+    ticks = []
+
+    async def ticker():
+        while not release.is_set():
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    # The blocking call waits on the ticker, so it only returns if the loop kept running.
+    waited = await run_blocking(lambda: release.wait(timeout=0.2) or len(ticks))
+    release.set()
+    await task
+    assert waited >= 3
+
+
+async def test_smart_get_falls_back_to_local(monkeypatch, tmp_path):
+    async def no_global(*args, **kwargs):
+        return [] if "limit" in kwargs else None
+
+    async def no_rerank(query, candidates, client):
+        return None
+
+    monkeypatch.setattr(orchestrator.global_search, "search", no_global)
+    monkeypatch.setattr(orchestrator.global_search, "get_details", no_global)
+    monkeypatch.setattr(orchestrator, "_hub_rerank", no_rerank)
+    monkeypatch.setattr(
+        orchestrator,
+        "do_search_impl",
+        lambda query, limit=5: [{"name": "local_fn", "description": ""}],
+    )
+    monkeypatch.setattr(
+        orchestrator, "do_get_impl", lambda name: "def local_fn():\n    return 1\n"
+    )
+
+    res = await do_smart_get_async("anything", target_dir=str(tmp_path))
+    assert res["status"] == "success"
+    assert res["selected_function"] == "local_fn"
+
+
+async def test_smart_get_uses_best_available_within_budget(monkeypatch, tmp_path):
+    fetched = []
+
+    async def hub_search(query, limit=5, client=None):
+        return [{"name": "fast_fn"}, {"name": "slow_fn"}]
+
+    async def hub_details(name, **kwargs):
+        fetched.append(name)
+        if name == "slow_fn":
+            await asyncio.sleep(5)
+        return {"code": f"def {name}():\n    return 1\n"}
+
+    async def slow_rerank(query, candidates, client):
+        await asyncio.sleep(5)
+        return "slow_fn"
+
+    monkeypatch.setattr(orchestrator.global_search, "search", hub_search)
+    monkeypatch.setattr(orchestrator.global_search, "get_details", hub_details)
+    monkeypatch.setattr(orchestrator, "_hub_rerank", slow_rerank)
+    monkeypatch.setattr(orchestrator, "SMART_GET_BUDGET", 0.2)
+
+    start = asyncio.get_running_loop().time()
+    res = await do_smart_get_async("anything", target_dir=str(tmp_path))
+    elapsed = asyncio.get_running_loop().time() - start
+
+    # Both candidates were prefetched while the rerank was pending.
+    assert sorted(fetched) == ["fast_fn", "slow_fn"]
+    assert res["selected_function"] == "fast_fn"
+    assert elapsed < 2
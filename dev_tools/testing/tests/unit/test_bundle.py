@@ -0,0 +1,80 @@
+import json
+
+from core.database import get_db_connection, store_code_blob
+from edge.orchestrator import bundle_cache, do_get_impl
+
+
+def _put(name, code, deps=()):
+    conn = get_db_connection()
+    try:
+        code_hash = store_code_blob(conn, code)
+        conn.execute(
+            "INSERT OR REPLACE INTO functions (name, code_hash, metadata) VALUES (?, ?, ?)",
+            (name, code_hash, json.dumps({"internal_dependencies": list(deps)})),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_bundle_is_topologically_ordered():
+    _put("leaf", "def leaf(): pass")
+    _put("mid", "def mid(): pass", ["leaf"])
+    _put("side", "def side(): pass", ["leaf", "missing"])
+    _put("root", "def root(): pass", ["mid", "side"])
+
+    bundle = do_get_impl("root", integrate_dependencies=True)
+    order = [line[6:-4] for line in bundle.splitlines() if line.startswith("# ---")]
+    assert order == ["leaf", "mid", "side", "root"]
+
+
+def test_bundle_handles_cycles():
+    _put("ping", "def ping(): pass", ["pong"])
+    _put("pong", "def pong(): pass", ["ping"])
+
+    bundle = do_get_impl("ping", integrate_dependencies=True)
+    assert bundle.count("# --- ping ---") == 1
+    assert bundle.count("# --- pong ---") == 1
+
+
+def test_bundle_cache_invalidated_on_member_change():
+    _put("leaf", "def leaf(): return 1")
+    _put("root", "def root(): pass", ["leaf"])
+
+    first = do_get_impl("root", integrate_dependencies=True)
+    hits = bundle_cache.hit_count
+    assert do_get_impl("root", integrate_dependencies=True) == first
+    assert bundle_cache.hit_count == hits + 1
+
+    _put("leaf", "def leaf(): return 2")
+    assert "return 2" in do_get_impl("root", integrate_dependencies=True)
+
+
+def test_bundle_of_shared_dependencies_visits_each_node_once():
+    # 2-wide layers where every node depends on both nodes of the next layer:
+    # 2^40 paths, 81 functions.
+    graph, prev = {}, ["root"]
+    for layer in range(40):
+        nodes = [f"n{layer}_{i}" for i in range(2)]
+        graph.update({name: nodes for name in prev})
+        prev = nodes
+    graph.update({name: [] for name in prev})
+    conn = get_db_connection()
+    try:
+        for name, deps in graph.items():
+            conn.execute(
+                "INSERT INTO functions (name, code_hash, metadata) VALUES (?, ?, ?)",
+                (
+                    name,
+                    store_code_blob(conn, f"def {name}(): pass"),
+                    json.dumps({"internal_dependencies": deps}),
+                ),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    bundle = do_get_impl("root", integrate_dependencies=True)
+    order = [line[6:-4] for line in bundle.splitlines() if line.startswith("# ---")]
+    assert len(order) == 81
+    assert order[:2] == ["n39_0", "n39_1"] and order[-1] == "root"
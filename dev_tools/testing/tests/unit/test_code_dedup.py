@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+from core.database import get_db_connection
+from edge.orchestrator import do_get_impl, do_save_impl, run_background_maintenance
+
+CODE = "def add(a, b):\n    return a + b\n"
+TESTS = [{"input": {"a": 1, "b": 2}, "expected": 3}]
+
+
+def _blob_count():
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT count(*) FROM code_blobs").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+def test_duplicate_code_is_stored_once(mock_add_task):
+    do_save_impl("add_one", CODE, description="adds", skip_test=True)
+    do_save_impl(
+        "add_two", CODE.replace("\n", "\r\n"), description="adds", skip_test=True
+    )
+
+    assert _blob_count() == 1
+    assert do_get_impl("add_one") == CODE
+    assert "return a + b" in do_get_impl("add_two")
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+def test_trailing_whitespace_inside_strings_is_significant(mock_add_task):
+    doc = 'def text():\n    return """a  \nb"""\n'
+    do_save_impl("with_spaces", doc, description="text", skip_test=True)
+    do_save_impl(
+        "without_spaces", doc.replace("a  ", "a"), description="text", skip_test=True
+    )
+
+    assert _blob_count() == 2
+    assert do_get_impl("with_spaces") == doc
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+@patch("edge.orchestrator._run_verification", return_value="verified")
+@patch("edge.orchestrator.quality_gate.check_score_only")
+def test_duplicate_save_reuses_analysis(mock_quality, mock_verify, mock_add_task):
+    mock_quality.return_value = {"final_score": 90}
+    for name in ("add_one", "add_two"):
+        do_save_impl(name, CODE, description="adds", test_cases=TESTS)
+        run_background_maintenance(name, CODE, "adds", [], [], TESTS, False)
+
+    # Other tests' background tasks may still be draining, so only count our names.
+    names = ("add_one", "add_two")
+    assert len([c for c in mock_verify.call_args_list if c.args[0] in names]) == 1
+    assert len([c for c in mock_quality.call_args_list if c.args[0] in names]) == 1
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT status FROM functions WHERE name IN ('add_one', 'add_two')"
+        ).fetchall()
+        assert [r[0] for r in rows] == ["verified", "verified"]
+    finally:
+        conn.close()
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+@patch("edge.orchestrator.quality_gate.check_score_only")
+def test_timed_out_report_is_not_stored(mock_quality, mock_add_task):
+    mock_quality.return_value = {"final_score": 100, "timed_out": ["bandit"]}
+    do_save_impl("add_one", CODE, description="adds", skip_test=True)
+    run_background_maintenance("add_one", CODE, "adds", [], [], [], True)
+
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT quality_report FROM code_blobs").fetchall() == [
+            (None,)
+        ]
+        assert conn.execute(
+            "SELECT content_fingerprint FROM functions WHERE name = 'add_one'"
+        ).fetchone() == (None,)
+    finally:
+        conn.close()
@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from core.database import get_db_connection
+from edge.orchestrator import do_save_impl, run_index_maintenance
+
+CODE = "def mul(a, b):\n    return a * b\n"
+TESTS = [{"input": {"a": 2, "b": 3}, "expected": 6}]
+
+
+def _save_and_maintain(mock_add_task, description="multiplies", tags=None):
+    before = len(mock_add_task.call_args_list)
+    msg = do_save_impl(
+        "mul", CODE, description=description, tags=tags or [], test_cases=TESTS
+    )
+    # Run the tasks this save scheduled, as the worker lanes would.
+    for call in mock_add_task.call_args_list[before:]:
+        if call.args[1] == "mul":
+            call.args[0](*call.args[1:])
+    return msg
+
+
+def _status():
+    conn = get_db_connection()
+    try:
+        return conn.execute(
+            "SELECT status FROM functions WHERE name = 'mul'"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+@patch("edge.orchestrator._run_verification", return_value="verified")
+@patch("edge.orchestrator.quality_gate.check_score_only")
+@patch("edge.orchestrator.embedding_service.get_embedding")
+def test_identical_resave_is_skipped(
+    mock_embed, mock_quality, mock_verify, mock_add_task
+):
+    mock_embed.return_value = np.zeros(768)
+    mock_quality.return_value = {"final_score": 90}
+
+    _save_and_maintain(mock_add_task)
+    msg = _save_and_maintain(mock_add_task)
+
+    assert "unchanged" in msg
+    # Only the first save scheduled work (one indexing + one checks task).
+    assert len([c for c in mock_add_task.call_args_list if c.args[1] == "mul"]) == 2
+    assert mock_embed.call_count == 1
+    assert _status() == "verified"
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+@patch("edge.orchestrator._run_verification", return_value="verified")
+@patch("edge.orchestrator.quality_gate.check_score_only")
+@patch("edge.orchestrator.embedding_service.get_embedding")
+def test_description_change_only_reembeds(
+    mock_embed, mock_quality, mock_verify, mock_add_task
+):
+    mock_embed.return_value = np.zeros(768)
+    mock_quality.return_value = {"final_score": 90}
+
+    _save_and_maintain(mock_add_task)
+    msg = _save_and_maintain(mock_add_task, description="product of two numbers")
+
+    assert "Re-indexing" in msg
+    last_save = [c for c in mock_add_task.call_args_list if c.args[1] == "mul"][2:]
+    assert [c.args[0] for c in last_save] == [run_index_maintenance]
+    assert mock_embed.call_count == 2
+    assert len([c for c in mock_verify.call_args_list if c.args[0] == "mul"]) == 1
+    assert len([c for c in mock_quality.call_args_list if c.args[0] == "mul"]) == 1
+    # The verdict survives the metadata-only save.
+    assert _status() == "verified"
@@ -0,0 +1,166 @@
+from datetime import datetime
+
+from core.database import get_db_connection, init_db
+
+
+def _create_legacy_functions_table():
+    conn = get_db_connection()
+    try:
+        conn.execute("DROP TABLE functions")
+        conn.execute("""
+            CREATE TABLE functions (
+                name VARCHAR PRIMARY KEY,
+                code VARCHAR,
+                description VARCHAR,
+                tags VARCHAR,
+                metadata VARCHAR,
+                status VARCHAR DEFAULT 'active',
+                test_cases VARCHAR,
+                call_count INTEGER DEFAULT 0,
+                last_called_at VARCHAR,
+                created_at VARCHAR,
+                updated_at VARCHAR
+            )
+        """)
+        conn.execute(
+            "INSERT INTO functions (name, code, created_at, updated_at, last_called_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                "legacy_iso",
+                "pass",
+                "2024-01-02T03:04:05.123456",
+                "2024-01-03 04:05:06.5+00",
+                None,
+            ),
+        )
+        conn.execute(
+            "INSERT INTO functions (name, code, created_at) VALUES (?, ?, ?)",
+            ("legacy_garbage", "pass", "not a date"),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_varchar_timestamps_are_migrated():
+    """Legacy VARCHAR timestamps (ISO and CURRENT_TIMESTAMP style) become TIMESTAMP."""
+    _create_legacy_functions_table()
+    init_db()
+
+    conn = get_db_connection(read_only=True)
+    try:
+        types = dict(
+            conn.execute(
+                "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'functions'"
+            ).fetchall()
+        )
+        assert types["created_at"] == "TIMESTAMP"
+        assert types["updated_at"] == "TIMESTAMP"
+        assert types["last_called_at"] == "TIMESTAMP"
+
+        row = conn.execute(
+            "SELECT created_at, updated_at, last_called_at FROM functions WHERE name = 'legacy_iso'"
+        ).fetchone()
+        assert row[0] == datetime(2024, 1, 2, 3, 4, 5, 123456)
+        assert row[1] == datetime(2024, 1, 3, 4, 5, 6, 500000)
+        assert row[2] is None
+
+        row = conn.execute(
+            "SELECT created_at FROM functions WHERE name = 'legacy_garbage'"
+        ).fetchone()
+        assert row[0] is None
+    finally:
+        conn.close()
+
+
+def test_timestamp_indexes_created():
+    conn = get_db_connection(read_only=True)
+    try:
+        names = {
+            r[0]
+            for r in conn.execute(
+                "SELECT index_name FROM duckdb_indexes() WHERE table_name = 'functions'"
+            ).fetchall()
+        }
+        assert "idx_functions_last_called_at" in names
+        assert "idx_functions_updated_at" in names
+    finally:
+        conn.close()
+
+
+def test_legacy_embeddings_deduplicated():
+    """The surrogate-key embeddings table is rebuilt keeping the newest vector per key."""
+    conn = get_db_connection()
+    try:
+        conn.execute("DROP TABLE embeddings")
+        conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_emb_id START 1")
+        conn.execute("""
+            CREATE TABLE embeddings (
+                id INTEGER PRIMARY KEY DEFAULT nextval('seq_emb_id'),
+                function_name VARCHAR,
+                vector FLOAT[],
+                model_name VARCHAR,
+                dimension INTEGER,
+                encoded_at VARCHAR
+            )
+        """)
+        for vec in ([1.0, 0.0], [0.0, 1.0]):
+            conn.execute(
+                "INSERT INTO embeddings (function_name, vector, model_name, dimension, encoded_at) VALUES ('f', ?, 'mock', 2, '2024-01-01 00:00:00+00')",
+                (vec,),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    init_db()
+
+    conn = get_db_connection(read_only=True)
+    try:
+        rows = conn.execute(
+            "SELECT vector, encoded_at FROM embeddings WHERE function_name = 'f'"
+        ).fetchall()
+        assert len(rows) == 1
+        assert rows[0][0] == [0.0, 1.0]
+        assert rows[0][1] == datetime(2024, 1, 1)
+    finally:
+        conn.close()
+
+
+def test_embedding_upsert_and_compaction():
+    from core.database import compact_store
+    from edge.vector_db import get_vector_db
+
+    conn = get_db_connection()
+    try:
+        conn.execute("INSERT INTO functions (name, code) VALUES ('keep', 'pass')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    vdb = get_vector_db()
+    vdb.upsert_function("keep", [1.0, 0.0], {"name": "keep"})
+    vdb.upsert_function("keep", [0.0, 1.0], {"name": "keep"})
+    vdb.upsert_function("gone", [1.0, 1.0], {"name": "gone"})
+
+    conn = get_db_connection(read_only=True)
+    try:
+        assert (
+            conn.execute(
+                "SELECT count(*) FROM embeddings WHERE function_name = 'keep'"
+            ).fetchone()[0]
+            == 1
+        )
+    finally:
+        conn.close()
+
+    assert "SUCCESS" in compact_store()
+
+    conn = get_db_connection(read_only=True)
+    try:
+        names = [
+            r[0]
+            for r in conn.execute("SELECT function_name FROM embeddings").fetchall()
+        ]
+        assert names == ["keep"]
+    finally:
+        conn.close()
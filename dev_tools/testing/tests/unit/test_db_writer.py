@@ -0,0 +1,94 @@
+import threading
+from concurrent import futures
+from unittest.mock import patch
+
+import pytest
+from core import database
+from core.database import DBWriter, get_db_connection
+from edge import orchestrator
+
+
+def _insert(name):
+    def _op(conn):
+        conn.execute("INSERT INTO functions (name) VALUES (?)", (name,))
+        return name
+
+    return _op
+
+
+def test_writer_commits_and_returns_results():
+    writer = DBWriter()
+    futures = [writer.submit(_insert(f"fn_{i}")) for i in range(20)]
+    assert [f.result(timeout=10) for f in futures] == [f"fn_{i}" for i in range(20)]
+
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT count(*) FROM functions").fetchone()[0] == 20
+    finally:
+        conn.close()
+
+
+def test_failing_write_does_not_fail_batch_neighbours():
+    writer = DBWriter()
+    ok = writer.submit(_insert("good"))
+    bad = writer.submit(_insert("good"))  # duplicate primary key
+    other = writer.submit(_insert("other"))
+
+    assert ok.result(timeout=10) == "good"
+    assert other.result(timeout=10) == "other"
+    with pytest.raises(Exception):
+        bad.result(timeout=10)
+
+
+def test_flush_waits_for_queued_writes():
+    writer = DBWriter()
+    assert writer.flush(timeout=1)  # nothing queued, thread never started
+
+    for i in range(5):
+        writer.submit(_insert(f"flushed_{i}"))
+    assert writer.flush(timeout=10)
+
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT count(*) FROM functions").fetchone()[0] == 5
+    finally:
+        conn.close()
+
+
+def test_writer_waits_for_busy_lock_instead_of_failing(monkeypatch):
+    attempts = []
+
+    class BusyLock:
+        def __enter__(self):
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise TimeoutError("Could not acquire internal thread lock.")
+            return self
+
+        def __exit__(self, *exc):
+            return None
+
+    monkeypatch.setattr(database, "DBWriteLock", BusyLock)
+    writer = DBWriter()
+    assert writer.execute(_insert("patient"), timeout=10) == "patient"
+    assert len(attempts) == 3
+
+
+def test_save_outliving_caller_timeout_still_gets_maintenance(monkeypatch):
+    release = threading.Event()
+    database.db_writer.submit(lambda conn: release.wait(10))  # a long bulk write
+    monkeypatch.setattr(
+        orchestrator, "wait", lambda fs, timeout: futures.wait(fs, timeout=0.1)
+    )
+
+    with patch.object(orchestrator.task_worker, "add_task") as add_task:
+        res = orchestrator.do_save_impl(
+            "late_save", "def late_save(x):\n    return x\n", skip_test=True
+        )
+        assert "queued for saving" in res
+        add_task.assert_not_called()
+
+        release.set()
+        assert database.db_writer.flush(timeout=10)
+        tasks = [c.args[0] for c in add_task.call_args_list]
+        assert orchestrator.run_check_maintenance in tasks
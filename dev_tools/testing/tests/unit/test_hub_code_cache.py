@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+
+from edge.cache import HubCodeCache
+from edge.global_search import GlobalSearchEngine
+
+
+def _engine(tmp_path, handler, **cache_kwargs):
+    engine = GlobalSearchEngine()
+    engine.code_cache = HubCodeCache(tmp_path / "hub_code", **cache_kwargs)
+    return engine, httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def test_fresh_entry_skips_the_hub(tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(
+            200, json={"code": "def f(): pass"}, headers={"ETag": "v1"}
+        )
+
+    engine, client = _engine(tmp_path, handler)
+    async with client:
+        first = await engine.get_details("f", client=client)
+        second = await engine.get_details("f", client=client)
+
+    assert first == second == {"code": "def f(): pass"}
+    assert len(calls) == 1
+
+
+async def test_stale_entry_is_revalidated_with_etag(tmp_path):
+    seen_etags = []
+
+    def handler(request):
+        seen_etags.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == "v1":
+            return httpx.Response(304)
+        return httpx.Response(
+            200, json={"code": "def f(): pass"}, headers={"ETag": "v1"}
+        )
+
+    engine, client = _engine(tmp_path, handler, ttl=0)
+    async with client:
+        await engine.get_details("f", client=client)
+        data = await engine.get_details("f", client=client)
+
+    assert seen_etags == [None, "v1"]
+    assert data == {"code": "def f(): pass"}
+
+
+async def test_version_change_bypasses_fresh_entry(tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"code": f"# {len(calls)}"})
+
+    engine, client = _engine(tmp_path, handler)
+    async with client:
+        await engine.get_details("f", client=client, version="1")
+        await engine.get_details("f", client=client, version="1")
+        data = await engine.get_details("f", client=client, version="2")
+
+    assert len(calls) == 2
+    assert data == {"code": "# 2"}
+
+
+async def test_rate_limited_hub_serves_cached_copy(tmp_path):
+    responses = [
+        httpx.Response(200, json={"code": "def f(): pass"}),
+        httpx.Response(429),
+    ]
+
+    engine, client = _engine(tmp_path, lambda request: responses.pop(0), ttl=0)
+    async with client:
+        await engine.get_details("f", client=client)
+        data = await engine.get_details("f", client=client)
+
+    assert data == {"code": "def f(): pass"}
+    assert engine.code_cache.stale_served == 1
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = HubCodeCache(tmp_path, max_bytes=250)
+    cache.put("old", {"code": "x" * 60})
+    past = time.time() - 100
+    os.utime(cache._path("old"), (past, past))
+    cache.put("new", {"code": "y" * 60})
+    cache.put("newer", {"code": "z" * 60})
+
+    assert cache.get("old") is None
+    assert cache.get("newer") is not None
+
+
+def test_concurrent_puts_use_separate_temp_files(tmp_path):
+    cache = HubCodeCache(tmp_path)
+    bodies = [str(i) * 2000 for i in range(8)]
+    threads = [
+        threading.Thread(target=cache.put, args=("f", {"code": body}))
+        for body in bodies
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert cache.get("f")["payload"]["code"] in bodies
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_directory_is_only_scanned_past_the_size_threshold(tmp_path):
+    cache = HubCodeCache(tmp_path, max_bytes=10_000)
+    with patch.object(cache._store, "_evict", wraps=cache._store._evict) as evict:
+        for i in range(5):
+            cache.put(f"f{i}", {"code": "x"})
+        assert evict.call_count == 1  # initial size scan only
+
+        cache.put("big", {"code": "x" * 20_000})
+        assert evict.call_count == 2
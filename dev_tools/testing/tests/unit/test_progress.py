@@ -0,0 +1,93 @@
+import threading
+
+import numpy as np
+import pytest
+from core import database
+from core.database import get_db_connection, recover_embeddings, store_code_blob
+from core.progress import OperationCancelled, ProgressTracker
+from edge.orchestrator import run_with_progress
+
+
+class FakeContext:
+    def __init__(self):
+        self.reports = []
+
+    async def report_progress(self, progress, total=None, message=None):
+        self.reports.append((progress, total, message))
+
+
+def _add_unembedded(count):
+    conn = get_db_connection()
+    try:
+        for i in range(count):
+            code_hash = store_code_blob(conn, f"def f{i}(): pass")
+            conn.execute(
+                "INSERT INTO functions (name, code_hash, description) VALUES (?, ?, 'x')",
+                (f"f{i}", code_hash),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def test_recovery_reports_monotonic_progress():
+    _add_unembedded(3)
+    ctx = FakeContext()
+    progress = ProgressTracker(ctx, ["recover"])
+
+    result = await run_with_progress(progress, recover_embeddings)
+
+    assert result == "SUCCESS: Re-embedded 3 functions."
+    values = [r[0] for r in ctx.reports]
+    assert len(values) == 3
+    assert values == sorted(values)
+    assert all(r[1] == 1.0 for r in ctx.reports)
+    assert ctx.reports[-1][2].startswith("recover: 2/3")
+
+
+def test_cancelled_recovery_stops_before_next_item():
+    _add_unembedded(2)
+    progress = ProgressTracker(stages=["recover"])
+    progress.cancel()
+
+    with pytest.raises(OperationCancelled):
+        recover_embeddings(progress)
+
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT count(*) FROM embeddings").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_recovery_embeds_outside_the_write_lock(monkeypatch):
+    _add_unembedded(5)
+    held = set()  # threads currently inside DBWriteLock
+
+    class RecordingLock:
+        def __init__(self, timeout=10.0):
+            pass
+
+        def __enter__(self):
+            held.add(threading.get_ident())
+            return self
+
+        def __exit__(self, *exc):
+            held.discard(threading.get_ident())
+
+    def _embed(text, **kwargs):
+        assert threading.get_ident() not in held, (
+            "embedding computed while holding DBWriteLock"
+        )
+        return np.zeros(768, dtype=np.float32)
+
+    monkeypatch.setattr(database, "DBWriteLock", RecordingLock)
+    monkeypatch.setattr(database.embedding_service, "get_embedding", _embed)
+    monkeypatch.setattr(database, "RECOVERY_CHUNK_SIZE", 2)
+
+    assert recover_embeddings() == "SUCCESS: Re-embedded 5 functions."
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT count(*) FROM embeddings").fetchone()[0] == 5
+    finally:
+        conn.close()
@@ -1,7 +1,11 @@
+import os
+import threading
+import time
 from unittest.mock import MagicMock
 
 import pytest
-from core.quality import QualityGate
+from core import config as mcp_config
+from core.quality import QualityGate, QualityReportCache
 
 
 @pytest.fixture
@@ -41,3 +45,248 @@ def test_check_score_only_formatter_fail(gate):
     assert report["final_score"] == 70
     assert report["reliability"] == "medium"
     assert report["formatter"]["passed"] is False
+
+
+def test_check_batch_matches_single_checks(gate):
+    items = [
+        {"code": "def add(a, b):\n    return a + b\n"},
+        {"code": "def a( x ):\n  return x\n"},
+        {"code": "import os\n\n\ndef c():\n    return 1\n"},
+        {"code": 'import subprocess\n\nsubprocess.call("ls", shell=True)\n'},
+    ]
+
+    batch = gate.check_batch(items)
+
+    singles = [gate.check_score_only("f", item["code"]) for item in items]
+    for report in singles:
+        report.pop("timings_ms")
+    assert batch == singles
+    assert [r["final_score"] for r in batch][:2] == [100, 70]
+
+
+def test_safety_batch_audits_each_items_own_versions(monkeypatch):
+    from core.security_audit import SecurityAuditService
+
+    def _findings(deps, timeout=None):
+        return [
+            ("django", "Dependency [django] (ID: 1): bad")
+            for d in deps
+            if d == "django==1.0"
+        ]
+
+    monkeypatch.setattr(
+        SecurityAuditService, "_safety_findings", staticmethod(_findings)
+    )
+
+    batch = SecurityAuditService.run_safety_batch([["django==1.0"], ["django==3.0"]])
+    assert [r["passed"] for r in batch] == [False, True]
+    assert batch[1] == SecurityAuditService.run_safety(["django==3.0"])
+
+
+def test_report_cache_skips_tools_until_a_version_changes(tmp_path):
+    cached_gate = QualityGate(cache=QualityReportCache(tmp_path))
+    cached_gate.processor.lint = MagicMock(return_value=(True, []))
+    cached_gate.processor.format_check = MagicMock(return_value=(True, "OK"))
+    versions = {"ruff": "ruff 1.0", "bandit": "1.0", "safety": "1.0"}
+    cached_gate.tool_versions = lambda: versions
+
+    first = cached_gate.check_score_only("f", "def hello(): pass", "desc")
+    again = QualityGate(cache=QualityReportCache(tmp_path))
+    again.tool_versions = lambda: versions
+    again.processor.lint = MagicMock()
+    assert again.check_score_only("f", "def hello(): pass", "desc") == first
+    assert again.processor.lint.call_count == 0
+
+    versions["ruff"] = "ruff 1.1"
+    cached_gate.check_score_only("f", "def hello(): pass", "desc")
+    assert cached_gate.processor.lint.call_count == 2
+
+
+def test_check_batch_only_runs_tools_for_uncached_items(tmp_path):
+    cached_gate = QualityGate(cache=QualityReportCache(tmp_path))
+    cached_gate.check_score_only("f", "def add(a, b):\n    return a + b\n")
+    cached_gate._check_batch = MagicMock(return_value=[{"final_score": 70}])
+
+    reports = cached_gate.check_batch(
+        [{"code": "def add(a, b):\n    return a + b\n"}, {"code": "x = 1\n"}]
+    )
+
+    assert [r["final_score"] for r in reports] == [100, 70]
+    assert cached_gate._check_batch.call_args.args[0] == [{"code": "x = 1\n"}]
+
+
+def test_stages_run_concurrently_and_record_timings(gate):
+    def slow(result):
+        def _stage(*args, **kwargs):
+            time.sleep(0.3)
+            return result
+
+        return _stage
+
+    gate.processor.lint = slow((True, []))
+    gate.processor.format_check = slow((True, "OK"))
+    gate.security_auditor.run_bandit = slow(
+        {"passed": True, "findings": [], "score_penalty": 0}
+    )
+    gate.security_auditor.run_safety = slow(
+        {"passed": True, "findings": [], "score_penalty": 0}
+    )
+
+    report = gate.check_score_only("test_func", "def hello(): pass", "desc")
+
+    timings = report["timings_ms"]
+    assert set(timings) == {"lint", "format", "bandit", "safety", "total"}
+    assert all(
+        timings[stage] >= 300 for stage in ("lint", "format", "bandit", "safety")
+    )
+    assert timings["total"] < 900
+    assert report["final_score"] == 100
+
+
+def test_stage_timeout_falls_back_without_waiting(gate, monkeypatch):
+    monkeypatch.setattr(mcp_config, "QUALITY_STAGE_TIMEOUT", 0.2)
+    release = threading.Event()
+    gate.processor.lint = MagicMock(return_value=(True, []))
+    gate.processor.format_check = MagicMock(return_value=(True, "OK"))
+    gate.security_auditor.run_bandit = lambda *a, **k: release.wait(5)
+    gate.security_auditor.run_safety = MagicMock(
+        return_value={"passed": True, "findings": [], "score_penalty": 0}
+    )
+
+    started = time.monotonic()
+    report = gate.check_score_only("test_func", "def hello(): pass", "desc")
+    release.set()
+
+    assert time.monotonic() - started < 2
+    assert report["timed_out"] == ["bandit"]
+    assert report["timings_ms"]["bandit"] is None
+    assert report["security"]["bandit"]["score_penalty"] == 0
+
+
+def test_queue_wait_does_not_count_against_stage_timeout(gate, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from core import quality
+
+    monkeypatch.setattr(mcp_config, "QUALITY_STAGE_TIMEOUT", 0.7)
+    monkeypatch.setattr(quality, "_stage_pool", ThreadPoolExecutor(max_workers=1))
+
+    def slow(result):
+        def _run(*args, **kwargs):
+            time.sleep(0.2)
+            return result
+
+        return _run
+
+    clean = {"passed": True, "findings": [], "score_penalty": 0}
+    gate.processor.lint = slow((True, []))
+    gate.processor.format_check = slow((True, "OK"))
+    gate.security_auditor.run_bandit = slow(clean)
+    gate.security_auditor.run_safety = slow(clean)
+
+    # Stages start at 0, 0.2, 0.4 and 0.6s: all inside the shared queue deadline,
+    # and each finishes within its own budget although the check outlasts 0.7s.
+    report = gate.check_score_only("test_func", "def hello(): pass", "desc")
+    assert "timed_out" not in report
+    assert report["timings_ms"]["total"] >= 800
+
+
+def test_queue_wait_is_capped_by_one_deadline(gate, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from core import quality
+
+    monkeypatch.setattr(mcp_config, "QUALITY_STAGE_TIMEOUT", 0.3)
+    monkeypatch.setattr(quality, "_stage_pool", ThreadPoolExecutor(max_workers=1))
+    release = threading.Event()
+    gate.processor.lint = lambda *a, **k: release.wait(5) and (True, [])
+    gate.processor.format_check = MagicMock(return_value=(True, "OK"))
+
+    started = time.monotonic()
+    report = gate.check_score_only("test_func", "def hello(): pass", "desc")
+    release.set()
+
+    # Lint holds the only thread; the queued stages share one 0.3s queue deadline.
+    assert time.monotonic() - started < 1.0
+    assert report["timed_out"] == ["lint", "format", "bandit", "safety"]
+
+
+def test_incomplete_reports_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(mcp_config, "QUALITY_STAGE_TIMEOUT", 0.2)
+    cached_gate = QualityGate(cache=QualityReportCache(tmp_path))
+    cached_gate.processor.lint = MagicMock(return_value=(True, []))
+    cached_gate.processor.format_check = MagicMock(return_value=(True, "OK"))
+    release = threading.Event()
+    cached_gate.security_auditor.run_bandit = lambda *a, **k: release.wait(5)
+    cached_gate.security_auditor.run_safety = MagicMock(
+        return_value={"passed": True, "findings": [], "score_penalty": 0, "error": "x"}
+    )
+
+    slow = cached_gate.check_score_only("f", "def hello(): pass")
+    release.set()
+    assert slow["timed_out"] == ["bandit"]
+    assert slow["tool_errors"] == ["safety"]
+    assert not QualityGate.is_complete(slow)
+    assert list(tmp_path.glob("*.json")) == []
+
+    cached_gate.security_auditor.run_bandit = MagicMock(
+        return_value={"passed": False, "findings": ["x"], "score_penalty": 40}
+    )
+    cached_gate.security_auditor.run_safety.return_value = {
+        "passed": True,
+        "findings": [],
+        "score_penalty": 0,
+    }
+    assert cached_gate.check_score_only("f", "def hello(): pass")["final_score"] == 60
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+
+RISKY = 'import subprocess\n\nsubprocess.call("ls", shell=True)\n'
+
+
+def test_bandit_runs_in_process_with_cli_results(monkeypatch):
+    from core import security_audit
+    from core.security_audit import SecurityAuditService
+
+    expected = SecurityAuditService._run_bandit_cli(RISKY)
+
+    def _no_spawn(*args, **kwargs):
+        raise AssertionError("bandit should not be spawned")
+
+    monkeypatch.setattr(security_audit.subprocess, "run", _no_spawn)
+    assert SecurityAuditService.run_bandit(RISKY) == expected
+    assert expected["score_penalty"] > 0
+
+
+def test_in_process_bandit_honours_timeout(monkeypatch):
+    from core.security_audit import SecurityAuditService
+
+    release = threading.Event()
+    monkeypatch.setattr(
+        SecurityAuditService,
+        "_bandit_scan",
+        classmethod(lambda cls, *a, **k: release.wait(5)),
+    )
+
+    started = time.monotonic()
+    result = SecurityAuditService.run_bandit(RISKY, timeout=0.2)
+    release.set()
+
+    assert time.monotonic() - started < 2
+    assert result["score_penalty"] == 0 and "timed out" in result["error"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows keeps the temp-file path")
+def test_ruff_reads_snippets_from_stdin(gate, monkeypatch):
+    from core import quality
+
+    def _no_temp_file(*args, **kwargs):
+        raise AssertionError("no temp file expected")
+
+    monkeypatch.setattr(quality.tempfile, "NamedTemporaryFile", _no_temp_file)
+
+    assert gate.processor.lint("import os\n")[1] == [
+        "Line 1 [F401]: `os` imported but unused"
+    ]
+    assert gate.processor.format_check("def a( x ):\n  return x\n")[0] is False
+    assert gate.processor.format_check("def a(x):\n    return x\n")[0] is True
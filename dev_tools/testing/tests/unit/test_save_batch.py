@@ -0,0 +1,131 @@
+from unittest.mock import patch
+
+from core.database import compute_code_hash, db_writer, get_db_connection
+from edge.orchestrator import (
+    _check_content,
+    do_save_batch_impl,
+    do_save_impl,
+    run_batch_maintenance,
+)
+
+TESTS = [{"input": {"x": 1}, "expected": 1}]
+
+
+def _item(name, body="return x", **extra):
+    return {
+        "name": name,
+        "code": f"def {name}(x):\n    {body}\n",
+        "description": f"{name} helper",
+        "test_cases": TESTS,
+        **extra,
+    }
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+@patch("edge.orchestrator._run_verification", return_value="verified")
+@patch("edge.orchestrator.quality_gate.check_batch")
+@patch("edge.orchestrator.quality_gate.check_score_only")
+@patch("edge.orchestrator.embedding_service.get_embeddings")
+def test_batch_save_reports_per_item_and_embeds_once(
+    mock_embeddings, mock_quality, mock_batch_quality, mock_verify, mock_add_task
+):
+    mock_embeddings.side_effect = lambda texts: [[0.1] * 8 for _ in texts]
+    mock_quality.return_value = {"final_score": 80}
+    mock_batch_quality.side_effect = lambda items: [{"final_score": 80} for _ in items]
+
+    results = do_save_batch_impl(
+        [
+            _item("batch_a"),
+            {"name": "batch_b"},
+            _item("batch_c"),
+            _item("batch_a", body="return x * 1"),
+        ]
+    )
+
+    assert [r["status"] for r in results] == [
+        "superseded",
+        "rejected",
+        "saved",
+        "saved",
+    ]
+    batch_calls = [
+        c for c in mock_add_task.call_args_list if c.args[0] is run_batch_maintenance
+    ]
+    assert len(batch_calls) == 1
+    jobs = batch_calls[0].args[1]
+    assert sorted(job[0] for job in jobs) == ["batch_a", "batch_c"]
+
+    run_batch_maintenance(jobs)
+    assert mock_embeddings.call_count == 1
+    assert len(mock_embeddings.call_args.args[0]) == 2
+    assert mock_batch_quality.call_count == 1
+    assert len(mock_batch_quality.call_args.args[0]) == 2
+    assert mock_quality.call_count == 0
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT f.name, f.status, e.dimension FROM functions f
+            JOIN embeddings e ON e.function_name = f.name
+            WHERE f.name LIKE 'batch_%' ORDER BY f.name
+        """
+        ).fetchall()
+    finally:
+        conn.close()
+    assert rows == [("batch_a", "verified", 8), ("batch_c", "verified", 8)]
+
+    # Saving the same content again is a no-op for every item.
+    again = do_save_batch_impl([_item("batch_c")])
+    assert again[0]["status"] == "unchanged"
+
+
+@patch("edge.orchestrator.task_worker.add_task")
+@patch("edge.orchestrator._run_verification", return_value="failed")
+@patch("edge.orchestrator.quality_gate.check_batch")
+@patch("edge.orchestrator.quality_gate.check_score_only")
+@patch("edge.orchestrator.embedding_service.get_embeddings")
+def test_later_save_supersedes_pending_batch_maintenance(
+    mock_embeddings, mock_quality, mock_batch_quality, mock_verify, mock_add_task
+):
+    mock_embeddings.side_effect = lambda texts: [[0.1] * 8 for _ in texts]
+    mock_quality.return_value = {"final_score": 40}
+    mock_batch_quality.side_effect = lambda items: [{"final_score": 40} for _ in items]
+
+    do_save_batch_impl([_item("stale_batch")])
+    jobs = next(
+        c.args[1]
+        for c in mock_add_task.call_args_list
+        if c.args[0] is run_batch_maintenance
+    )
+    # A single save of newer code lands before the bulk batch task runs.
+    do_save_impl("stale_batch", "def stale_batch(x):\n    return x + 0\n")
+
+    run_batch_maintenance(jobs)
+    assert mock_embeddings.call_count == 0
+    assert mock_batch_quality.call_count == 0
+
+    # Even a verdict computed for the old code cannot overwrite the newer row.
+    job = jobs[0]
+    write = _check_content(
+        job[0],
+        job[1],
+        job[2],
+        job[4],
+        job[5],
+        job[6],
+        compute_code_hash(job[1]),
+        "stale:fingerprint",
+        report={"final_score": 40},
+    )
+    db_writer.execute(write)
+
+    conn = get_db_connection()
+    try:
+        status, fingerprint = conn.execute(
+            "SELECT status, content_fingerprint FROM functions WHERE name = 'stale_batch'"
+        ).fetchone()
+    finally:
+        conn.close()
+    assert status == "pending"
+    assert fingerprint is None
@@ -0,0 +1,104 @@
+import json
+from unittest.mock import patch
+
+import numpy as np
+from core import database
+from core.embedding import embedding_service
+from edge import vector_db
+from edge.orchestrator import do_search_impl
+
+
+def _seed(n: int):
+    conn = database.get_db_connection()
+    try:
+        for i in range(n):
+            name = f"fn_{i}"
+            status = "verified" if i % 2 else "pending"
+            conn.execute(
+                "INSERT INTO functions (name, description, tags, metadata, status, call_count) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    f"desc {i}",
+                    json.dumps(["t"]),
+                    json.dumps({"quality_score": 80}),
+                    status,
+                    i,
+                ),
+            )
+            conn.execute(
+                "INSERT INTO embeddings (function_name, vector, model_name, dimension) VALUES (?, ?, ?, 3)",
+                (name, [1.0, float(i) / n, 0.0], embedding_service.model_name),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_search_is_a_single_db_round_trip(monkeypatch):
+    """Regression guard: status/quality/tags must come from the scoring query itself."""
+    _seed(50)
+    monkeypatch.setattr(
+        embedding_service,
+        "get_embedding",
+        lambda text, **kwargs: np.array([1.0, 0.0, 0.0], dtype=np.float32),
+    )
+
+    opened = []
+    real_connect = database.get_db_connection
+
+    def _counting_connect(*args, **kwargs):
+        conn = real_connect(*args, **kwargs)
+        opened.append(conn)
+        return conn
+
+    with (
+        patch.object(vector_db, "get_db_connection", _counting_connect),
+        patch("edge.orchestrator.get_db_connection", _counting_connect),
+    ):
+        results = do_search_impl("anything", limit=10)
+
+    assert len(opened) == 1
+    assert len(results) == 10
+    top = results[0]
+    assert top["status"] == "verified"
+    assert top["quality_score"] == 80
+    assert top["tags"] == ["t"]
+    assert [r["score"] for r in results] == sorted(
+        (r["score"] for r in results), reverse=True
+    )
+
+
+def test_explain_reports_stages_and_embedding_cache(monkeypatch):
+    from edge import orchestrator
+    from edge.cache import PopularQueryCache
+
+    _seed(20)
+    calls = []
+
+    def _embed(text, **kwargs):
+        calls.append(text)
+        return np.array([1.0, 0.0, 0.0], dtype=np.float32)
+
+    monkeypatch.setattr(embedding_service, "get_embedding", _embed)
+    monkeypatch.setattr(
+        orchestrator, "popular_cache", PopularQueryCache(popularity_threshold=2)
+    )
+
+    first = do_search_impl("explain me", limit=5, explain=True)
+    explain = first["explain"]
+    assert len(first["results"]) == 5
+    assert set(explain["timings_ms"]) >= {
+        "cache_lookup",
+        "embed",
+        "vector_scan",
+        "join",
+        "rerank",
+        "total",
+    }
+    assert explain["candidates"] == {"scanned": 20, "joined": 20, "returned": 5}
+    assert explain["cache_hits"]["query_embedding"] is False
+
+    do_search_impl("explain me", limit=5)
+    third = do_search_impl("explain me", limit=5, explain=True)
+    assert third["explain"]["cache_hits"]["query_embedding"] is True
+    assert len(calls) == 2
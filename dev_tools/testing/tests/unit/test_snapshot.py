@@ -0,0 +1,46 @@
+from core.database import get_db_connection
+from edge.orchestrator import do_get_impl, do_save_impl
+from edge.snapshot import export_store, import_store
+
+
+def _embedding_count():
+    conn = get_db_connection(read_only=True)
+    try:
+        return conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_export_import_roundtrip(tmp_path):
+    """A snapshot restores functions and vectors into an emptied store."""
+    do_save_impl("add", "def add(a, b):\n    return a + b\n", skip_test=True)
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO embeddings (function_name, vector, model_name, dimension) VALUES ('add', [0.1, 0.2], 'mock', 2)"
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    out_dir = tmp_path / "snap"
+    assert "SUCCESS" in export_store(str(out_dir))
+    assert (out_dir / "functions.parquet").exists()
+    assert (out_dir / "embeddings.parquet").exists()
+
+    conn = get_db_connection()
+    try:
+        conn.execute("DELETE FROM embeddings")
+        conn.execute("DELETE FROM functions")
+        conn.commit()
+    finally:
+        conn.close()
+
+    res = import_store(str(out_dir))
+    assert "SUCCESS" in res
+    assert "return a + b" in do_get_impl("add")
+    assert _embedding_count() >= 1
+
+
+def test_import_missing_snapshot(tmp_path):
+    assert import_store(str(tmp_path / "nope")).startswith("ERROR")
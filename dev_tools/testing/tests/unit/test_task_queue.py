@@ -0,0 +1,73 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+from core.config import TASK_MAX_ATTEMPTS
+from core.database import db_writer, get_db_connection
+from edge.worker import task_worker
+
+ran = []
+
+
+@task_worker.register_durable
+def record_task(value):
+    ran.append(value)
+
+
+def _rows():
+    db_writer.execute(lambda conn: None)  # flush queued state updates
+    conn = get_db_connection()
+    try:
+        return conn.execute(
+            "SELECT task, state, attempts FROM task_queue ORDER BY created_at"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def _insert(task_id, value, state, attempts, created_at):
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO task_queue (id, task, payload, lane, coalesce_key, order_key, "
+            "state, attempts, created_at, updated_at) VALUES (?, ?, ?, 'io', NULL, 'q', ?, ?, ?, ?)",
+            (
+                task_id,
+                "record_task",
+                json.dumps({"args": [value], "kwargs": {}}),
+                state,
+                attempts,
+                created_at,
+                created_at,
+            ),
+        )
+    finally:
+        conn.close()
+
+
+def test_durable_task_is_persisted_until_it_finishes():
+    gate = threading.Event()
+    ran.clear()
+
+    task_worker.add_task(gate.wait, 5, order_key="durable:f")
+    task_worker.add_task(record_task, "a", order_key="durable:f")
+    assert _rows() == [("record_task", "queued", 0)]
+
+    gate.set()
+    assert task_worker.join(timeout=10)
+    assert ran == ["a"]
+    assert _rows() == []
+
+
+def test_replay_requeues_interrupted_tasks_in_order():
+    ran.clear()
+    start = datetime.now() - timedelta(minutes=5)
+    _insert("t1", "first", "running", 1, start)
+    _insert("t2", "second", "queued", 0, start + timedelta(seconds=1))
+    _insert("t3", "poison", "running", TASK_MAX_ATTEMPTS, start + timedelta(seconds=2))
+
+    assert task_worker.replay_persisted() == 2
+    assert task_worker.join(timeout=10)
+
+    assert ran == ["first", "second"]
+    assert _rows() == [("record_task", "failed", TASK_MAX_ATTEMPTS)]
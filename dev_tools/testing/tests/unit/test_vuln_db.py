@@ -0,0 +1,81 @@
+import json
+from unittest.mock import patch
+
+import httpx
+from core import security_audit
+from core.security_audit import SecurityAuditService
+from core.vuln_db import VulnerabilityDB
+
+SNAPSHOT = {
+    "$meta": {"timestamp": 1700000000},
+    "django": [
+        {
+            "id": "pyup.io-1",
+            "advisory": "SQL injection",
+            "specs": ["<1.11.29", ">=2.0a1,<2.2.10"],
+        }
+    ],
+    "python-jose": [{"id": "pyup.io-2", "advisory": "JWT bypass", "specs": ["<3.3.0"]}],
+}
+
+
+def _db(tmp_path, snapshot=SNAPSHOT):
+    path = tmp_path / "insecure_full.json"
+    path.write_text(json.dumps(snapshot), encoding="utf-8")
+    return VulnerabilityDB(path, "http://example.invalid/db.json")
+
+
+def test_pinned_versions_are_checked_against_specs(tmp_path):
+    db = _db(tmp_path)
+    assert db.version() == "1700000000"
+    assert db.check("Django==2.1.0") == [
+        ("django", "Dependency [django] (ID: pyup.io-1): SQL injection")
+    ]
+    assert db.check("django==3.0") == []
+    # Names are normalised for lookup; unpinned specs say nothing about the install
+    assert db.check("python_jose==3.0.0")[0][1].startswith("Dependency [python-jose]")
+    assert db.check("django>=1.0") == []
+    assert db.check("not a spec ===") == []
+
+
+def test_lookups_are_memoised_until_reload(tmp_path):
+    db = _db(tmp_path)
+    with patch.object(db, "_lookup", wraps=db._lookup) as lookup:
+        db.check("django==1.0")
+        db.check("django==1.0")
+        db.check("Django == 1.0")
+        assert lookup.call_count == 1
+
+        db._load(force=True)
+        db.check("django==1.0")
+        assert lookup.call_count == 2
+
+
+def test_missing_snapshot_and_refresh(tmp_path):
+    db = VulnerabilityDB(
+        tmp_path / "vuln" / "db.json", "http://example.invalid/db.json"
+    )
+    assert not db.available()
+    assert db.is_stale()
+
+    failing = httpx.Client(transport=httpx.MockTransport(lambda r: httpx.Response(500)))
+    assert db.refresh(failing).startswith("ERROR:")
+    assert not db.available()
+
+    ok = httpx.Client(
+        transport=httpx.MockTransport(lambda r: httpx.Response(200, json=SNAPSHOT))
+    )
+    assert db.refresh(ok) == "SUCCESS: Vulnerability DB refreshed (2 packages)."
+    assert db.available() and not db.is_stale()
+    assert len(db.check("django==1.0")) == 1
+
+
+def test_run_safety_uses_snapshot_without_subprocess(tmp_path, monkeypatch):
+    monkeypatch.setattr(security_audit, "vuln_db", _db(tmp_path))
+    with patch.object(security_audit.subprocess, "run") as run:
+        result = SecurityAuditService.run_safety(["django==1.0", "requests==2.31.0"])
+        batch = SecurityAuditService.run_safety_batch([["django==1.0"], ["requests"]])
+
+    run.assert_not_called()
+    assert not result["passed"] and result["score_penalty"] == 30
+    assert [r["passed"] for r in batch] == [False, True]
@@ -0,0 +1,145 @@
+import threading
+import time
+
+from edge.worker import AsyncTaskWorker, task_worker
+
+
+def test_queued_tasks_with_same_key_are_latest_wins():
+    gate = threading.Event()
+    ran = []
+    before = task_worker.superseded_count
+
+    # Hold the key so the keyed tasks pile up behind this one.
+    task_worker.add_task(gate.wait, 5, order_key="maintenance:f")
+    for version in range(4):
+        task_worker.add_task(ran.append, version, coalesce_key="maintenance:f")
+    task_worker.add_task(ran.append, "other", coalesce_key="maintenance:g")
+    gate.set()
+    assert task_worker.join(timeout=10)
+
+    assert sorted(ran, key=str) == [3, "other"]
+    assert task_worker.superseded_count - before == 3
+
+
+def test_slow_lane_does_not_block_other_lanes():
+    gate = threading.Event()
+    done = threading.Event()
+
+    task_worker.add_task(gate.wait, 5, lane="test")
+    task_worker.add_task(done.set, lane="io")
+
+    assert done.wait(2)
+    gate.set()
+    assert task_worker.join(timeout=10)
+
+
+def test_order_key_serialises_across_lanes():
+    gate = threading.Event()
+    ran = []
+
+    def first():
+        gate.wait(5)
+        ran.append("first")
+
+    task_worker.add_task(first, lane="test", order_key="fn:x")
+    task_worker.add_task(ran.append, "second", lane="io", order_key="fn:x")
+    gate.set()
+    assert task_worker.join(timeout=10)
+
+    assert ran == ["first", "second"]
+
+
+def test_interactive_tasks_jump_queued_bulk_work():
+    gate = threading.Event()
+    ran = []
+    before = task_worker.get_wait_stats()
+
+    task_worker.add_task(gate.wait, 5, lane="db")
+    task_worker.add_task(ran.append, "bulk", lane="db", priority="bulk")
+    task_worker.add_task(ran.append, "interactive", lane="db")
+    gate.set()
+    assert task_worker.join(timeout=10)
+
+    assert ran == ["interactive", "bulk"]
+    stats = task_worker.get_wait_stats()
+    assert stats["bulk"]["count"] == before["bulk"]["count"] + 1
+    assert stats["interactive"]["count"] == before["interactive"]["count"] + 2
+
+
+def test_bulk_tasks_are_throttled_per_lane():
+    gate = threading.Event()
+    done = threading.Event()
+
+    for _ in range(3):
+        task_worker.add_task(gate.wait, 5, lane="io", priority="bulk")
+    task_worker.add_task(done.set, lane="io")
+
+    assert done.wait(2)
+    assert task_worker.lanes["io"].bulk_running == 1
+    gate.set()
+    assert task_worker.join(timeout=10)
+
+
+def test_stats_report_running_task_histograms_and_failures():
+    gate = threading.Event()
+
+    def stats_probe():
+        gate.wait(5)
+
+    def stats_boom():
+        raise RuntimeError("boom")
+
+    task_worker.add_task(stats_probe, lane="test")
+    task_worker.add_task(stats_boom, lane="cpu")
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        running = [r["task"] for r in task_worker.get_stats()["running"]]
+        if "stats_probe" in running:
+            break
+        time.sleep(0.01)
+    assert "stats_probe" in running
+
+    gate.set()
+    assert task_worker.join(timeout=10)
+    stats = task_worker.get_stats()
+    assert set(stats["lanes"]) == {"io", "cpu", "test", "db"}
+    assert stats["tasks"]["stats_probe"]["run"]["count"] == 1
+    assert sum(stats["tasks"]["stats_probe"]["wait"]["buckets"].values()) == 1
+    assert stats["tasks"]["stats_boom"]["failures"] == 1
+    assert not any(r["task"] == "stats_probe" for r in stats["running"])
+
+
+def _fresh_worker():
+    # Bypasses the singleton so shutting down does not affect other tests.
+    worker = object.__new__(AsyncTaskWorker)
+    worker.__init__()
+    return worker
+
+
+def test_shutdown_drains_queued_tasks_then_stops_intake():
+    worker = _fresh_worker()
+    ran = []
+    worker.add_task(time.sleep, 0.2, lane="db")
+    worker.add_task(ran.append, "queued", lane="db", priority="bulk")
+
+    assert worker.shutdown(timeout=5)
+    worker.add_task(ran.append, "late", lane="io")
+    time.sleep(0.1)
+
+    assert ran == ["queued"]
+
+
+def test_shutdown_gives_up_at_deadline():
+    worker = _fresh_worker()
+    gate = threading.Event()
+    ran = []
+    worker.add_task(gate.wait, 5, lane="db")
+    worker.add_task(ran.append, "never", lane="db")
+
+    started = time.monotonic()
+    assert not worker.shutdown(timeout=0.2)
+    assert time.monotonic() - started < 2
+    gate.set()
+    time.sleep(0.1)
+
+    assert ran == []